@@ -0,0 +1,280 @@
+import os
+import shutil
+import tempfile
+import time
+import tensorflow as tf
+from typing import List
+
+from ned.data import ExampleWriter, NormalizedExampleWriter, NormalizedExampleReader
+from ned.estimator import _parse_example, _normalized_pipeline
+
+
+def _read_examples(data_path: str, subset_name: str, max_examples: int) -> (List[bytes], str):
+	"""
+	Reads up to `max_examples` serialized examples of a subset written by `ExampleWriter` or, if it only has a normalized
+	database, by `NormalizedExampleWriter`.
+	"""
+	db_path = NormalizedExampleWriter.database_path(os.path.join(data_path, subset_name), subset_name)
+	file_pattern, compression_type = ExampleWriter.find_files(os.path.join(data_path, subset_name), subset_name)
+	file_paths = sorted(tf.gfile.Glob(file_pattern))
+
+	if len(file_paths) == 0 and os.path.exists(db_path):
+		examples = []
+		for serialized_example in NormalizedExampleReader(db_path).serialized_examples():
+			examples.append(serialized_example)
+
+			if len(examples) >= max_examples:
+				break
+
+		return examples, "normalized"
+
+	if len(file_paths) == 0:
+		raise FileNotFoundError("No files matching '{}'".format(file_pattern))
+
+	file_options = tf.python_io.TFRecordOptions(compression_type=compression_type)
+
+	examples = []
+	for file_path in file_paths:
+		for serialized_example in tf.python_io.tf_record_iterator(path=file_path, options=file_options):
+			examples.append(serialized_example)
+
+			if len(examples) >= max_examples:
+				return examples, compression_type
+
+	return examples, compression_type
+
+
+def _write_shards(examples: List[bytes], path: str, compression_type: str, shard_count: int) -> (List[str], int):
+	"""
+	Writes examples round-robin to `shard_count` files. Returns file paths and total file size in bytes.
+	"""
+	file_options = tf.python_io.TFRecordOptions(compression_type=compression_type)
+	extension = ExampleWriter.FILE_EXTENSIONS[compression_type]
+
+	file_paths = [os.path.join(path, "bench.{:03d}{}".format(i, extension)) for i in range(shard_count)]
+	writers = [tf.python_io.TFRecordWriter(file_path, options=file_options) for file_path in file_paths]
+
+	for i, serialized_example in enumerate(examples):
+		writers[i % shard_count].write(serialized_example)
+
+	for writer in writers:
+		writer.close()
+
+	return file_paths, sum(os.path.getsize(file_path) for file_path in file_paths)
+
+
+def _time_dataset(
+		file_paths: List[str],
+		compression_type: str,
+		batch_size: int,
+		parallelism: int,
+		parse: bool
+) -> (float, int):
+	"""
+	Runs the input pipeline without a model and returns duration and number of examples.
+
+	Files are read with `parallelism` parallel readers and batches are parsed with `parallelism` parallel calls, like
+	the 'autotune' pipeline of `file_input_fn`, but with fixed values. Without `parse`, only records are read.
+	"""
+	with tf.Graph().as_default():
+		files = tf.data.Dataset.from_tensor_slices(file_paths)
+
+		dataset = files.apply(tf.data.experimental.parallel_interleave(
+			lambda f: tf.data.TFRecordDataset(f, compression_type=compression_type, buffer_size=8 * 1024 * 1024),
+			cycle_length=min(parallelism, len(file_paths)),
+			block_length=4
+		))
+		dataset = dataset.batch(batch_size=batch_size)
+
+		if parse:
+			dataset = dataset.map(_parse_example, num_parallel_calls=parallelism)
+			dataset = dataset.map(lambda *parsed: tf.size(parsed[-1]))
+		else:
+			dataset = dataset.map(tf.size)
+
+		return _run_dataset(dataset)
+
+
+def _time_normalized_dataset(
+		db_path: str,
+		max_examples: int,
+		batch_size: int,
+		parallelism: int,
+		parse: bool
+) -> (float, int):
+	"""
+	Runs the pipeline of `normalized_input_fn` on the first `max_examples` examples of a normalized database without a
+	model and returns duration and number of examples. Without `parse`, only the batches of the reader are produced.
+	"""
+	with tf.Graph().as_default():
+		reader = NormalizedExampleReader(db_path)
+
+		if parse:
+			dataset = _normalized_pipeline(reader, epochs=1, batch_size=batch_size, shuffle=False, parallelism=parallelism)
+			dataset = dataset.map(lambda *parsed: tf.size(parsed[-1]))
+		else:
+			def generator():
+				yield from reader.serialized_batches(batch_size=batch_size)
+
+			dataset = tf.data.Dataset.from_generator(generator, output_types=tf.string, output_shapes=tf.TensorShape([None]))
+			dataset = dataset.map(tf.size)
+
+		dataset = dataset.take(-(-max_examples // batch_size))
+
+		return _run_dataset(dataset)
+
+
+def _run_dataset(dataset: tf.data.Dataset) -> (float, int):
+	"""
+	Iterates over a dataset of batch sizes and returns duration and number of examples.
+	"""
+	dataset = dataset.prefetch(4)
+	next_batch_size = dataset.make_one_shot_iterator().get_next()
+
+	example_count = 0
+
+	with tf.Session() as session:
+		start_time = time.perf_counter()
+
+		try:
+			while True:
+				example_count += int(session.run(next_batch_size))
+		except tf.errors.OutOfRangeError:
+			pass
+
+		duration = time.perf_counter() - start_time
+
+	return duration, example_count
+
+
+def benchmark_input_pipeline(
+		data_path: str,
+		subset_name: str = "train",
+		max_examples: int = 500000,
+		batch_sizes: List[int] = (256, 1024),
+		parallelisms: List[int] = (1, 8),
+		compression_types: List[str] = ("GZIP", "ZLIB", ""),
+		shard_counts: List[int] = (4, 16)
+):
+	"""
+	Measures the throughput of the input pipeline without a model attached.
+
+	A sample of the subset is rewritten for every compression type and shard count to a temporary folder. For every
+	combination with batch size and parallelism, reading alone and reading plus parsing are timed. Decompression cost
+	is the read time in excess of the read time of uncompressed files with the same settings.
+
+	If the subset was exported with --normalized, the pipeline of `normalized_input_fn` is timed on the same number of
+	examples first ('sqlite' rows, file MB is the size of the whole database). Its read time includes joining the
+	examples with their segments and possible senses.
+
+	:param data_path: Path to dataset folder written by ned-wiki-export, e.g. 'output/p_out'
+	:param subset_name: Name of subset
+	:param max_examples: Size of sample
+	:param batch_sizes: Batch sizes to sweep
+	:param parallelisms: Number of parallel readers and parse calls to sweep
+	:param compression_types: Compression types to sweep. See `ExampleWriter.FILE_EXTENSIONS`.
+	:param shard_counts: Number of files to sweep
+	"""
+	print("Reading examples...")
+	examples, source_compression_type = _read_examples(data_path, subset_name, max_examples)
+	example_bytes = sum(len(e) for e in examples)
+
+	print("{:,d} examples, {:,.1f} MB serialized, {:,.0f} bytes per example, source compression: {}".format(
+		len(examples),
+		example_bytes / 1e6,
+		example_bytes / max(len(examples), 1),
+		source_compression_type or "none"
+	))
+	print("")
+	print("{:<6} {:>6} {:>6} {:>5} {:>9} {:>11} {:>11} {:>11} {:>9} {:>9} {:>9}".format(
+		"compr.",
+		"shards",
+		"batch",
+		"par.",
+		"file MB",
+		"examples/s",
+		"MB/s",
+		"file MB/s",
+		"read s",
+		"parse s",
+		"decomp. s"
+	))
+
+	db_path = NormalizedExampleWriter.database_path(os.path.join(data_path, subset_name), subset_name)
+
+	if os.path.exists(db_path):
+		for batch_size in batch_sizes:
+			for parallelism in parallelisms:
+				read_duration, _ = _time_normalized_dataset(db_path, len(examples), batch_size, parallelism, parse=False)
+				total_duration, example_count = _time_normalized_dataset(
+					db_path,
+					len(examples),
+					batch_size,
+					parallelism,
+					parse=True
+				)
+
+				print("{:<6} {:>6} {:>6d} {:>5d} {:>9,.1f} {:>11,.0f} {:>11,.1f} {:>11} {:>9.2f} {:>9.2f} {:>9}".format(
+					"sqlite",
+					"-",
+					batch_size,
+					parallelism,
+					os.path.getsize(db_path) / 1e6,
+					example_count / total_duration,
+					example_bytes / 1e6 / total_duration,
+					"-",
+					read_duration,
+					total_duration - read_duration,
+					"-"
+				))
+
+	temp_path = tempfile.mkdtemp(prefix="ned-bench-input-")
+
+	try:
+		for shard_count in shard_counts:
+			uncompressed_read_durations = {}
+
+			# Uncompressed first, as reference for decompression cost
+			for compression_type in sorted(compression_types, key=lambda c: c != ""):
+				shard_path = os.path.join(temp_path, "{}-{:d}".format(compression_type or "none", shard_count))
+				os.makedirs(shard_path)
+
+				file_paths, file_bytes = _write_shards(examples, shard_path, compression_type, shard_count)
+
+				for batch_size in batch_sizes:
+					for parallelism in parallelisms:
+						read_duration, _ = _time_dataset(file_paths, compression_type, batch_size, parallelism, parse=False)
+						total_duration, example_count = _time_dataset(
+							file_paths,
+							compression_type,
+							batch_size,
+							parallelism,
+							parse=True
+						)
+
+						if compression_type == "":
+							uncompressed_read_durations[(batch_size, parallelism)] = read_duration
+
+						uncompressed_read_duration = uncompressed_read_durations.get((batch_size, parallelism), None)
+						if uncompressed_read_duration is not None:
+							decompression_duration = "{:>9.2f}".format(read_duration - uncompressed_read_duration)
+						else:
+							decompression_duration = "{:>9}".format("-")
+
+						print("{:<6} {:>6d} {:>6d} {:>5d} {:>9,.1f} {:>11,.0f} {:>11,.1f} {:>11,.1f} {:>9.2f} {:>9.2f} {}".format(
+							compression_type or "none",
+							shard_count,
+							batch_size,
+							parallelism,
+							file_bytes / 1e6,
+							example_count / total_duration,
+							example_bytes / 1e6 / total_duration,
+							file_bytes / 1e6 / total_duration,
+							read_duration,
+							total_duration - read_duration,
+							decompression_duration
+						))
+
+				shutil.rmtree(shard_path)
+	finally:
+		shutil.rmtree(temp_path, ignore_errors=True)
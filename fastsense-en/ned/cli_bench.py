@@ -0,0 +1,93 @@
+import argparse
+
+
+def titles():
+	arg_parser = argparse.ArgumentParser(
+		description="Benchmarks title normalization on a sample of links extracted by ned-wiki-prepare."
+	)
+	arg_parser.add_argument(
+		"--links",
+		type=str,
+		required=True,
+		help="Path to links.gz in intermediate output of ned-wiki-prepare."
+	)
+	arg_parser.add_argument(
+		"--sample_size",
+		type=int,
+		default=1000000,
+		help="Number of links to read."
+	)
+	args = arg_parser.parse_args()
+
+	# Imported here, so the title benchmark does not load the TensorFlow input pipeline benchmark
+	from ned.wiki.benchmark import benchmark_title_normalization
+
+	benchmark_title_normalization(args.links, args.sample_size)
+
+
+def input_pipeline():
+	arg_parser = argparse.ArgumentParser(
+		description=(
+			"Benchmarks the training input pipeline without a model on a sample of a dataset written by "
+			"ned-wiki-export. Sweeps compression, shard count, batch size and parallelism. Subsets exported with "
+			"--normalized are also read from their database for comparison."
+		)
+	)
+	arg_parser.add_argument(
+		"--data",
+		type=str,
+		required=True,
+		help="Path to dataset folder, e.g. 'output/p_out'."
+	)
+	arg_parser.add_argument(
+		"--subset",
+		type=str,
+		default="train",
+		help="Name of subset."
+	)
+	arg_parser.add_argument(
+		"--sample_size",
+		type=int,
+		default=500000,
+		help="Number of examples to read."
+	)
+	arg_parser.add_argument(
+		"--batch_sizes",
+		type=int,
+		nargs="+",
+		default=[256, 1024]
+	)
+	arg_parser.add_argument(
+		"--parallelism",
+		type=int,
+		nargs="+",
+		default=[1, 8],
+		help="Number of parallel readers and parse calls."
+	)
+	arg_parser.add_argument(
+		"--compression",
+		type=str,
+		nargs="+",
+		choices=["gzip", "zlib", "none"],
+		default=["gzip", "zlib", "none"]
+	)
+	arg_parser.add_argument(
+		"--shards",
+		type=int,
+		nargs="+",
+		default=[4, 16],
+		help="Number of files."
+	)
+	args = arg_parser.parse_args()
+
+	from ned.benchmark import benchmark_input_pipeline
+
+	benchmark_input_pipeline(
+		data_path=args.data,
+		subset_name=args.subset,
+		max_examples=args.sample_size,
+		batch_sizes=args.batch_sizes,
+		parallelisms=args.parallelism,
+		compression_types=[{"gzip": "GZIP", "zlib": "ZLIB", "none": ""}[c] for c in args.compression],
+		shard_counts=args.shards
+	)
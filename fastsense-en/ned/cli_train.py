@@ -33,7 +33,46 @@ def train():
 		required=True,
 		help=(
 			"Path to JSON file containing list of jobs. A job is a dict with the following keys: dataset_name (string), "
-			"model_name (string), params (dict), epochs (int), batch_size (int), and only_test (bool, optional)"
+			"model_name (string), params (dict), epochs (int), batch_size (int), and only_test (bool, optional). "
+			"Set number_of_workers (int, optional) to train with multiple processes on a local parameter server cluster. "
+			"Besides the estimator params, params may contain input_pipeline ('default' or 'autotune') and trainer "
+			"('estimator' or 'native')."
+		)
+	)
+	arg_parser.add_argument(
+		"--parallel_jobs",
+		type=int,
+		default=1,
+		help="Maximum number of jobs running concurrently in separate processes."
+	)
+	arg_parser.add_argument(
+		"--cores",
+		type=int,
+		default=None,
+		help=(
+			"Number of cores shared by parallel jobs. Defaults to all cores. A job uses its 'cores' key (int, optional) "
+			"or an equal share of the cores as TensorFlow threads. Jobs with number_of_workers > 1 are charged at least "
+			"one core per worker plus one for the parameter server. Jobs needing more than the budget are rejected."
+		)
+	)
+	arg_parser.add_argument(
+		"--memory_gb",
+		type=float,
+		default=None,
+		help=(
+			"Memory budget of parallel jobs in GB. Jobs declare their peak memory with the 'memory_gb' key (float, "
+			"optional). The declared values decide when a job may start; actual memory use is not monitored. Jobs "
+			"declaring more than the budget are rejected."
+		)
+	)
+	arg_parser.add_argument(
+		"--state",
+		type=str,
+		default=None,
+		help=(
+			"Path to JSON file with job states for restarting. Finished jobs are skipped, unfinished jobs train all their "
+			"epochs again on top of their last checkpoint. Defaults to 'jobs_state.json' in models_dir. A summary table "
+			"is written to 'jobs_summary.tsv' in the same folder."
 		)
 	)
 	args = arg_parser.parse_args()
@@ -43,7 +82,11 @@ def train():
 	job_runner = TrainJobRunner(
 		dataset_base_path=args.data,
 		models_dir=args.models_dir,
-		final_models_dir=args.final_models_dir
+		final_models_dir=args.final_models_dir,
+		max_parallel_jobs=args.parallel_jobs,
+		total_cores=args.cores,
+		total_memory_gb=args.memory_gb,
+		state_path=args.state
 	)
 	job_runner.load_jobs(args.jobs)
 	job_runner.run()
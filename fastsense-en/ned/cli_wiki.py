@@ -4,6 +4,7 @@ import os
 
 from ned.wiki import WikiConverter, ExampleExporter
 from ned.data import DataDescriptor
+from ned.storage import Storage
 
 
 def prepare():
@@ -41,7 +42,10 @@ def prepare():
 		"--db",
 		type=str,
 		required=True,
-		help="Path to sqlite3 database. Should not already exist. SSD recommended."
+		help=(
+			"Path to sqlite3 database. SSD recommended. If the database already exists, completed stages of the previous "
+			"run are skipped."
+		)
 	)
 	arg_parser.add_argument(
 		"--intermediate_output",
@@ -49,6 +53,42 @@ def prepare():
 		required=True,
 		help="Path for storing intermediate files."
 	)
+	arg_parser.add_argument(
+		"--incremental",
+		action="store_true",
+		help=(
+			"Update database and intermediate files of a previous run with a newer dump. Only added, changed, and "
+			"deleted pages are re-processed. Use the same --db and --intermediate_output as before."
+		)
+	)
+	stage_group = arg_parser.add_mutually_exclusive_group()
+	stage_group.add_argument(
+		"--from-stage",
+		type=str,
+		choices=WikiConverter.STAGES,
+		default=None,
+		help=(
+			"Recompute this stage and all following stages, even if they were completed before. By default, completed "
+			"stages of a previous run with the same --db are skipped."
+		)
+	)
+	stage_group.add_argument(
+		"--only-stage",
+		type=str,
+		choices=WikiConverter.STAGES,
+		default=None,
+		help="Recompute only this stage. Following stages will be recomputed by the next run."
+	)
+	arg_parser.add_argument(
+		"--storage",
+		type=str,
+		choices=Storage.NAMES,
+		default="sqlite",
+		help=(
+			"Engine for aggregation queries. 'duckdb' requires the duckdb package. The database is a sqlite file "
+			"either way."
+		)
+	)
 	args = arg_parser.parse_args()
 
 	start_time = datetime.datetime.now()
@@ -64,7 +104,11 @@ def prepare():
 		output_file_count=4,
 		corenlp_classpath=os.path.join(args.corenlp, "*"),
 		test_set_sizes=test_set_sizes,
-		print_progress=True
+		print_progress=True,
+		incremental=args.incremental,
+		from_stage=args.from_stage,
+		only_stage=args.only_stage,
+		storage=args.storage
 	)
 
 	end_time = datetime.datetime.now()
@@ -105,6 +149,31 @@ def export():
 			"[Uses Lemma],[Uses Sentences]. E.g.: \"-f p_out,1,0,0,1,1,0 s_out,1,0,0,1,1,1\""
 		)
 	)
+	arg_parser.add_argument(
+		"--storage",
+		type=str,
+		choices=Storage.NAMES,
+		default="sqlite",
+		help="Engine for reading the database. 'duckdb' requires the duckdb package."
+	)
+	arg_parser.add_argument(
+		"--normalized",
+		action="store_true",
+		help="Write examples to a normalized sqlite database, which stores the tokens of each paragraph only once."
+	)
+	arg_parser.add_argument(
+		"--compression",
+		type=str,
+		choices=["gzip", "zlib", "none"],
+		default="gzip",
+		help="Compression of TFRecord files. Uncompressed files are larger, but faster to read."
+	)
+	arg_parser.add_argument(
+		"--compression_level",
+		type=int,
+		default=None,
+		help="zlib compression level (0-9) for gzip and zlib compression."
+	)
 	args = arg_parser.parse_args()
 
 	start_time = datetime.datetime.now()
@@ -142,7 +211,11 @@ def export():
 		file_count=4,
 		output_path=args.output,
 		data_descriptors=data_descriptors,
-		subset_names=subset_names
+		subset_names=subset_names,
+		storage=args.storage,
+		normalized=args.normalized,
+		compression_type={"gzip": "GZIP", "zlib": "ZLIB", "none": ""}[args.compression],
+		compression_level=args.compression_level
 	)
 
 	end_time = datetime.datetime.now()
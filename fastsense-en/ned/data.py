@@ -1,10 +1,15 @@
-from typing import List, Iterator
+from typing import Dict, List, Iterator, Optional
 import tensorflow as tf
+import numpy as np
 import os
 import json
+import glob
+import sqlite3
 import multiprocessing as mp
+from collections import Counter
 
 from .token import Token
+from .storage import SqliteStorage
 
 
 class DataDescriptor:
@@ -111,6 +116,78 @@ class DataDescriptor:
 		)
 
 
+class DatasetMetadata:
+	"""
+	Statistics of a dataset, written next to its files by `ExampleWriter` and `NormalizedExampleWriter`, so they can be
+	looked up without reading the examples.
+	"""
+
+	def __init__(
+			self,
+			shard_example_counts: Dict[str, int] = None,
+			sense_counts: Dict[int, int] = None,
+			group_counts: Dict[int, int] = None,
+			possible_senses_counts: Dict[int, int] = None
+	):
+		"""
+		:param shard_example_counts: Filename -> number of examples
+		:param sense_counts: Sense -> number of examples
+		:param group_counts: Sense group id -> number of examples
+		:param possible_senses_counts: Number of possible senses -> number of examples
+		"""
+		self.shard_example_counts = Counter(shard_example_counts or {})
+		self.sense_counts = Counter(sense_counts or {})
+		self.group_counts = Counter(group_counts or {})
+		self.possible_senses_counts = Counter(possible_senses_counts or {})
+
+	@staticmethod
+	def file_path(path: str, file_prefix: str) -> str:
+		return os.path.join(path, file_prefix + ".metadata.json")
+
+	@property
+	def example_count(self) -> int:
+		return sum(self.shard_example_counts.values())
+
+	@property
+	def max_sense(self) -> Optional[int]:
+		return max(self.sense_counts.keys()) if len(self.sense_counts) > 0 else None
+
+	def add(self, shard: str, sense: int, group_id: Optional[int], possible_senses_count: int):
+		self.shard_example_counts[shard] += 1
+		self.sense_counts[sense] += 1
+		if group_id is not None:
+			self.group_counts[group_id] += 1
+		self.possible_senses_counts[possible_senses_count] += 1
+
+	def save(self, file_path: str):
+		info_dict = {
+			"example_count": self.example_count,
+			"max_sense": self.max_sense,
+			"shard_example_counts": dict(self.shard_example_counts),
+			"sense_counts": dict(self.sense_counts),
+			"group_counts": dict(self.group_counts),
+			"possible_senses_counts": dict(self.possible_senses_counts)
+		}
+
+		with open(file_path, "wt", encoding="utf8") as f:
+			json.dump(info_dict, f)
+
+	@staticmethod
+	def load(file_path: str) -> "DatasetMetadata":
+		with open(file_path, "r") as f:
+			info_dict = json.load(f)
+
+		def int_keys(d: dict) -> Dict[int, int]:
+			return {int(key): value for key, value in d.items()}
+
+		return DatasetMetadata(
+			shard_example_counts=info_dict["shard_example_counts"],
+			sense_counts=int_keys(info_dict["sense_counts"]),
+			group_counts=int_keys(info_dict["group_counts"]),
+			possible_senses_counts=int_keys(info_dict["possible_senses_counts"])
+		)
+
+
 class ExampleWriter:
 	"""
 	Writes examples to file on disk.
@@ -118,7 +195,22 @@ class ExampleWriter:
 
 	MAX_EXAMPLES_PER_FILE = 3000000
 
-	def __init__(self, path: str, file_prefix: str, data_descriptor: DataDescriptor, number_of_workers: int = 4):
+	# Compression type -> file extension
+	FILE_EXTENSIONS = {
+		"GZIP": ".tfrecords.gz",
+		"ZLIB": ".tfrecords.zz",
+		"": ".tfrecords"
+	}
+
+	def __init__(
+			self,
+			path: str,
+			file_prefix: str,
+			data_descriptor: DataDescriptor,
+			number_of_workers: int = 4,
+			compression_type: str = "GZIP",
+			compression_level: Optional[int] = None
+	):
 		"""
 		Creates writer.
 
@@ -126,8 +218,15 @@ class ExampleWriter:
 		:param file_prefix: Prefix for filenames.
 		:param data_descriptor: Instance of `DataDescriptor`. Will be used to prepare tokens.
 		:param number_of_workers: Number of processes used for preparing tokens.
+		:param compression_type: One of the keys of `FILE_EXTENSIONS`. Uncompressed files are larger, but cheaper to
+			read.
+		:param compression_level: zlib compression level (0-9) for GZIP and ZLIB. Lower levels are faster to write,
+			decompression speed is about the same. None uses the zlib default.
 		"""
 
+		if compression_type not in ExampleWriter.FILE_EXTENSIONS:
+			raise ValueError("Unknown compression type '{}'".format(compression_type))
+
 		self.input_queue = mp.Queue(1000)
 		self.serialized_examples_queue = mp.Queue(1000)
 
@@ -138,7 +237,9 @@ class ExampleWriter:
 			args=(
 				path,
 				file_prefix,
-				self.serialized_examples_queue
+				self.serialized_examples_queue,
+				compression_type,
+				compression_level
 			)
 		)
 		self.writer_process.start()
@@ -154,6 +255,22 @@ class ExampleWriter:
 
 		self.worker_processes = worker_processes
 
+	@staticmethod
+	def find_files(path: str, file_prefix: str) -> (str, str):
+		"""
+		Finds the files of a dataset written by `ExampleWriter`.
+
+		:param path: Path to dataset folder
+		:param file_prefix: Prefix of filenames
+		:return: Tuple of file pattern and compression type. Defaults to the GZIP pattern if no files exist.
+		"""
+		for compression_type, extension in ExampleWriter.FILE_EXTENSIONS.items():
+			file_pattern = os.path.join(path, file_prefix + ".*" + extension)
+			if len(glob.glob(file_pattern)) > 0:
+				return file_pattern, compression_type
+
+		return os.path.join(path, file_prefix + ".*" + ExampleWriter.FILE_EXTENSIONS["GZIP"]), "GZIP"
+
 	def close(self):
 		"""
 		Closes any open files. Call this after writing the last example or use a `with` statement.
@@ -167,17 +284,18 @@ class ExampleWriter:
 		self.serialized_examples_queue.put(None)
 		self.writer_process.join()
 
-	def write(self, tokens: List[Token], possible_senses: List[int], sense: int):
+	def write(self, tokens: List[Token], possible_senses: List[int], sense: int, group_id: Optional[int] = None):
 		"""
 		Writes example.
 
 		:param tokens: List of `Token` instances.
 		:param possible_senses: List of possible senses. Sorted ascending.
 		:param sense: Sense. Must also be in possible senses!
+		:param group_id: Sense group id. Only used for metadata.
 		:return:
 		"""
 
-		self.input_queue.put((tokens, possible_senses, sense))
+		self.input_queue.put((tokens, possible_senses, sense, group_id))
 		self.example_count += 1
 
 	@staticmethod
@@ -187,7 +305,7 @@ class ExampleWriter:
 			if write_task is None:
 				break
 
-			tokens, possible_senses, sense = write_task
+			tokens, possible_senses, sense, group_id = write_task
 			assert sense in possible_senses
 
 			prepared_tokens = data_descriptor.prepare_tokens(tokens=tokens)
@@ -206,26 +324,41 @@ class ExampleWriter:
 			example = tf.train.Example(features=tf.train.Features(feature=feature))
 			serialized_example = example.SerializeToString()
 
-			out_queue.put(serialized_example)
+			out_queue.put((serialized_example, sense, group_id, len(possible_senses)))
 
 	@staticmethod
-	def _write_task(path: str, file_prefix: str, queue: mp.Queue):
+	def _write_task(
+			path: str,
+			file_prefix: str,
+			queue: mp.Queue,
+			compression_type: str = "GZIP",
+			compression_level: Optional[int] = None
+	):
 		os.makedirs(path, exist_ok=False)
 
-		file_options = tf.python_io.TFRecordOptions(compression_type=tf.python_io.TFRecordCompressionType.GZIP)
+		file_options = tf.python_io.TFRecordOptions(
+			compression_type=compression_type,
+			compression_level=compression_level
+		)
+		extension = ExampleWriter.FILE_EXTENSIONS[compression_type]
 
 		writer = None
+		filename = None
 		next_file_index = 0
 
 		examples_in_current_file = 0
 
+		metadata = DatasetMetadata()
+
 		while True:
-			serialized_example = queue.get()
-			if serialized_example is None:
+			message = queue.get()
+			if message is None:
 				break
 
+			serialized_example, sense, group_id, possible_senses_count = message
+
 			if writer is None or examples_in_current_file >= ExampleWriter.MAX_EXAMPLES_PER_FILE:
-				filename = file_prefix + "." + str(next_file_index).rjust(3, "0") + ".tfrecords.gz"
+				filename = file_prefix + "." + str(next_file_index).rjust(3, "0") + extension
 				next_file_index += 1
 
 				if writer is not None:
@@ -238,15 +371,363 @@ class ExampleWriter:
 				examples_in_current_file = 0
 
 			writer.write(serialized_example)
+			metadata.add(filename, sense, group_id, possible_senses_count)
 
 			examples_in_current_file += 1
 
 		if writer is not None:
 			writer.close()
 
+		metadata.save(DatasetMetadata.file_path(path, file_prefix))
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_val, exc_tb):
+		self.close()
+		return False
+
+
+class NormalizedExampleWriter:
+	"""
+	Writes examples in normalized form to a sqlite database instead of TFRecord files. The tokens of each paragraph or
+	sentence (segment) are stored once in the 'segments' table, the possible senses of each sense group once in the
+	'possible_senses' table, and each example only references its segment and sense group. Read with
+	`NormalizedExampleReader`.
+
+	Has the same interface as `ExampleWriter`, but `write` additionally takes a segment key and a group id. Tokens may
+	be None if they were already written for the same segment key.
+	"""
+
+	def __init__(self, path: str, file_prefix: str, data_descriptor: DataDescriptor, number_of_workers: int = 4):
+		"""
+		Creates writer.
+
+		:param path: Path to output folder. May not already exist!
+		:param file_prefix: Prefix for filenames.
+		:param data_descriptor: Instance of `DataDescriptor`. Will be used to prepare tokens.
+		:param number_of_workers: Number of processes used for preparing tokens.
+		"""
+
+		self.input_queue = mp.Queue(1000)
+		self.output_queue = mp.Queue(1000)
+
+		self.example_count = 0
+
+		self.writer_process = mp.Process(
+			target=NormalizedExampleWriter._write_task,
+			args=(
+				path,
+				file_prefix,
+				self.output_queue
+			)
+		)
+		self.writer_process.start()
+
+		worker_processes = []
+		for _ in range(number_of_workers):
+			worker_process = mp.Process(
+				target=NormalizedExampleWriter._worker_task,
+				args=(data_descriptor, self.input_queue, self.output_queue)
+			)
+			worker_process.start()
+			worker_processes.append(worker_process)
+
+		self.worker_processes = worker_processes
+
+	@staticmethod
+	def database_path(path: str, file_prefix: str) -> str:
+		return os.path.join(path, file_prefix + ".examples.sqlite3")
+
+	def close(self):
+		"""
+		Closes any open files. Call this after writing the last example or use a `with` statement.
+		"""
+		for _ in range(len(self.worker_processes)):
+			self.input_queue.put(None)
+
+		for p in self.worker_processes:
+			p.join()
+
+		self.output_queue.put(None)
+		self.writer_process.join()
+
+	def write(self, tokens: Optional[List[Token]], possible_senses: List[int], sense: int, segment_key: tuple, group_id: int):
+		"""
+		Writes example.
+
+		:param tokens: List of `Token` instances or None, if tokens for segment_key were written before.
+		:param possible_senses: List of possible senses. Sorted ascending.
+		:param sense: Sense. Must also be in possible senses!
+		:param segment_key: (article_id, section_index, paragraph_index, sentence_index or -1)
+		:param group_id: Sense group id
+		"""
+
+		self.input_queue.put((tokens, possible_senses, sense, segment_key, group_id))
+		self.example_count += 1
+
+	@staticmethod
+	def _worker_task(data_descriptor: DataDescriptor, in_queue: mp.Queue, out_queue: mp.Queue):
+		written_group_ids = set()
+
+		while True:
+			write_task = in_queue.get()
+			if write_task is None:
+				break
+
+			tokens, possible_senses, sense, segment_key, group_id = write_task
+			assert sense in possible_senses
+
+			if tokens is not None:
+				prepared_tokens = data_descriptor.prepare_tokens(tokens=tokens)
+				if len(prepared_tokens) == 0:
+					print("Skipped empty segment:", segment_key)
+					continue
+
+				encoded_tokens = list(map(lambda s: s.encode("utf8"), prepared_tokens))
+				tokens_feature = tf.train.Feature(bytes_list=tf.train.BytesList(value=encoded_tokens))
+
+				out_queue.put(("segment", segment_key + (tokens_feature.SerializeToString(),)))
+
+			if group_id not in written_group_ids:
+				possible_senses_feature = tf.train.Feature(int64_list=tf.train.Int64List(value=possible_senses))
+				out_queue.put(("group", (group_id, possible_senses_feature.SerializeToString())))
+				written_group_ids.add(group_id)
+
+			out_queue.put(("example", segment_key + (group_id, sense)))
+
+	@staticmethod
+	def _write_task(path: str, file_prefix: str, queue: mp.Queue):
+		os.makedirs(path, exist_ok=False)
+
+		conn = sqlite3.connect(NormalizedExampleWriter.database_path(path, file_prefix))
+		conn.executescript("""
+			PRAGMA journal_mode = OFF;
+			PRAGMA synchronous = OFF;
+			
+			CREATE TABLE "segments" (
+				"article_id" INTEGER,
+				"section_index" INTEGER,
+				"paragraph_index" INTEGER,
+				"sentence_index" INTEGER,
+				"tokens" BLOB,  -- serialized tf.train.Feature
+				PRIMARY KEY ("article_id", "section_index", "paragraph_index", "sentence_index")
+			) WITHOUT ROWID;
+			
+			CREATE TABLE "possible_senses" (
+				"group_id" INTEGER PRIMARY KEY,
+				"possible_senses" BLOB  -- serialized tf.train.Feature
+			);
+			
+			CREATE TABLE "examples" (
+				"article_id" INTEGER,
+				"section_index" INTEGER,
+				"paragraph_index" INTEGER,
+				"sentence_index" INTEGER,
+				"group_id" INTEGER,
+				"sense" INTEGER
+			);
+		""")
+
+		insert_sql = {
+			"segment": "INSERT OR IGNORE INTO segments VALUES (?,?,?,?,?)",
+			"group": "INSERT OR IGNORE INTO possible_senses VALUES (?,?)",
+			"example": "INSERT INTO examples VALUES (?,?,?,?,?,?)"
+		}
+		buffers = {kind: [] for kind in insert_sql.keys()}
+
+		metadata = DatasetMetadata()
+		shard = os.path.basename(NormalizedExampleWriter.database_path(path, file_prefix))
+		group_sizes = {}
+
+		while True:
+			message = queue.get()
+			if message is None:
+				break
+
+			kind, row = message
+
+			if kind == "group" and row[0] not in group_sizes:
+				group_sizes[row[0]] = len(tf.train.Feature.FromString(row[1]).int64_list.value)
+
+			buffer = buffers[kind]
+			buffer.append(row)
+
+			if len(buffer) >= 10000:
+				conn.executemany(insert_sql[kind], buffer)
+				buffer.clear()
+
+		for kind, buffer in buffers.items():
+			if len(buffer) > 0:
+				conn.executemany(insert_sql[kind], buffer)
+
+		# Examples of other workers may arrive before their segment, so only count examples whose segment was written
+		# (not empty after preparing tokens) once everything is inserted
+		for sense, group_id in conn.execute("""
+			select e.sense, e.group_id
+			from examples e
+			cross join segments s
+			on s.article_id = e.article_id
+				and s.section_index = e.section_index
+				and s.paragraph_index = e.paragraph_index
+				and s.sentence_index = e.sentence_index
+		"""):
+			metadata.add(shard, sense, group_id, group_sizes[group_id])
+
+		conn.commit()
+		conn.close()
+
+		metadata.save(DatasetMetadata.file_path(path, file_prefix))
+
 	def __enter__(self):
 		return self
 
 	def __exit__(self, exc_type, exc_val, exc_tb):
 		self.close()
 		return False
+
+
+def _varint(value: int) -> bytes:
+	encoded = bytearray()
+	while value > 0x7f:
+		encoded.append((value & 0x7f) | 0x80)
+		value >>= 7
+	encoded.append(value)
+	return bytes(encoded)
+
+
+def _length_delimited(field_number: int, payload: bytes) -> bytes:
+	"""
+	Encodes a bytes, string or message field in protobuf wire format.
+	"""
+	return _varint(field_number << 3 | 2) + _varint(len(payload)) + payload
+
+
+class NormalizedExampleReader:
+	"""
+	Reads examples written by `NormalizedExampleWriter` and joins them with their segment and possible senses again.
+
+	Examples are read in chunks of consecutive rows of the 'examples' table, each with a single query that joins them
+	with their segments. Only one chunk is in memory at a time. The serialized `tf.train.Example`s are concatenated from
+	the stored serialized features in protobuf wire format, so neither the tokens nor the possible senses are parsed
+	again.
+	"""
+
+	def __init__(self, db_path: str, chunk_size: int = 100000):
+		"""
+		:param db_path: Path to examples database
+		:param chunk_size: Number of examples per chunk. Bounds memory and, when shuffling, how far examples are mixed.
+		"""
+		self.db_path = db_path
+		self.chunk_size = chunk_size
+
+		conn = SqliteStorage(db_path).connect(read_only=True)
+
+		# group id -> encoded map entry of Features.feature
+		self.possible_senses_entries = {}
+		for group_id, serialized_feature in conn.execute("select group_id, possible_senses from possible_senses"):
+			self.possible_senses_entries[group_id] = self._feature_entry(b"possible_senses", serialized_feature)
+
+		self.max_rowid = conn.execute("select ifnull(max(rowid), 0) from examples").fetchone()[0]
+
+		conn.close()
+
+	def __len__(self):
+		"""
+		Number of example rows, including examples of empty segments, which are skipped while reading.
+		"""
+		return self.max_rowid
+
+	@staticmethod
+	def _feature_entry(name: bytes, serialized_feature: bytes) -> bytes:
+		return _length_delimited(1, _length_delimited(1, name) + _length_delimited(2, serialized_feature))
+
+	@staticmethod
+	def _sense_entry(sense: int) -> bytes:
+		# tf.train.Feature with int64_list (field 3) containing a single packed value
+		serialized_feature = _length_delimited(3, _length_delimited(1, _varint(sense)))
+		return NormalizedExampleReader._feature_entry(b"sense", serialized_feature)
+
+	def _chunks(self, shuffle: bool, random_state: np.random.RandomState) -> Iterator[List[bytes]]:
+		chunk_starts = np.arange(1, self.max_rowid + 1, self.chunk_size)
+		if shuffle:
+			chunk_starts = chunk_starts[random_state.permutation(len(chunk_starts))]
+
+		conn = SqliteStorage(self.db_path).connect(read_only=True)
+
+		try:
+			for chunk_start in chunk_starts.tolist():
+				# Examples of segments that were empty after preparing tokens have no segment and are skipped
+				rows = conn.execute(
+					"""
+						select s.tokens, e.group_id, e.sense
+						from examples e
+						cross join segments s
+						on s.article_id = e.article_id
+							and s.section_index = e.section_index
+							and s.paragraph_index = e.paragraph_index
+							and s.sentence_index = e.sentence_index
+						where e.rowid between ? and ?
+					""",
+					(chunk_start, chunk_start + self.chunk_size - 1)
+				).fetchall()
+
+				if shuffle:
+					rows = [rows[i] for i in random_state.permutation(len(rows))]
+
+				yield [
+					_length_delimited(
+						1,
+						self._feature_entry(b"tokens", serialized_tokens)
+						+ self.possible_senses_entries[group_id]
+						+ self._sense_entry(sense)
+					)
+					for serialized_tokens, group_id, sense in rows
+				]
+		finally:
+			conn.close()
+
+	def serialized_examples(self, shuffle: bool = False, seed: Optional[int] = None) -> Iterator[bytes]:
+		"""
+		Returns serialized `tf.train.Example`s in the same format as `ExampleWriter`.
+
+		:param shuffle: Shuffle order of chunks and order of examples inside each chunk
+		:param seed: Seed for shuffling
+		"""
+		for chunk in self._chunks(shuffle, np.random.RandomState(seed)):
+			yield from chunk
+
+	def serialized_batches(
+			self,
+			batch_size: int,
+			epochs: int = 1,
+			shuffle: bool = False,
+			seed: Optional[int] = None
+	) -> Iterator[List[bytes]]:
+		"""
+		Returns lists of `batch_size` serialized examples, like `serialized_examples`. Only the last list may be
+		shorter. Batches span chunks and epochs.
+
+		:param batch_size: Number of examples per list
+		:param epochs: Number of passes over the examples. Each epoch is shuffled differently.
+		:param shuffle: Shuffle order of chunks and order of examples inside each chunk
+		:param seed: Seed for shuffling
+		"""
+		random_state = np.random.RandomState(seed)
+		batch = []
+
+		for _ in range(epochs):
+			for chunk in self._chunks(shuffle, random_state):
+				position = 0
+
+				while position < len(chunk):
+					missing_count = batch_size - len(batch)
+					batch.extend(chunk[position:position + missing_count])
+					position += missing_count
+
+					if len(batch) == batch_size:
+						yield batch
+						batch = []
+
+		if len(batch) > 0:
+			yield batch
@@ -1,6 +1,5 @@
 from typing import List, Tuple, Optional
 import os
-import sqlite3
 import tensorflow as tf
 import re
 from bisect import bisect_left
@@ -9,6 +8,7 @@ import multiprocessing as mp
 from .token import Token
 from .corenlp import CoreNlpBridge
 from .data import DataDescriptor
+from .storage import SqliteStorage
 
 
 class Disambiguator:
@@ -30,7 +30,7 @@ class Disambiguator:
 		db_path = os.path.join(model_path, "assets.extra", "senses.sqlite3")
 		self.db_path = db_path
 
-		db_conn = sqlite3.connect(db_path)
+		db_conn = SqliteStorage(db_path).connect(read_only=True)
 		c = db_conn.cursor()
 
 		c.execute("""
@@ -145,7 +145,7 @@ class Disambiguator:
 		config = tf.ConfigProto()
 		config.gpu_options.allow_growth = True
 
-		db_conn = sqlite3.connect(db_path)
+		db_conn = SqliteStorage(db_path).connect(read_only=True)
 		c = db_conn.cursor()
 
 		cache = {}
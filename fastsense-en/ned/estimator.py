@@ -1,5 +1,6 @@
 import tensorflow as tf
-from typing import Dict
+import time
+from typing import Dict, List, Union
 
 
 def _parse_example(serialized_examples):
@@ -32,14 +33,52 @@ def _parse_example(serialized_examples):
 	)
 
 
-def file_input_fn(file_pattern: str, epochs: int, batch_size: int, shuffle: bool = True):
+INPUT_PIPELINES = ["default", "autotune"]
+
+
+def file_input_fn(
+		file_pattern: Union[str, List[str]],
+		epochs: int,
+		batch_size: int,
+		shuffle: bool = True,
+		pipeline: str = "default",
+		compression_type: str = "GZIP"
+):
+	"""
+	Input function for TFRecord files written by `ExampleWriter`.
+
+	:param file_pattern: Glob pattern of TFRecord files or list of patterns
+	:param epochs: Number of epochs
+	:param batch_size: Batch size
+	:param shuffle: Shuffle files and examples
+	:param pipeline: One of INPUT_PIPELINES. 'default' reads files with a sequential interleave and fixed parallelism.
+		'autotune' reads files in parallel and lets tf.data tune the parallelism of parsing and the prefetch buffer.
+	:param compression_type: Compression type of the files. "GZIP", "ZLIB" or "" for uncompressed files.
+	"""
+	if pipeline == "default":
+		dataset = _default_pipeline(file_pattern, epochs, batch_size, shuffle, compression_type)
+	elif pipeline == "autotune":
+		dataset = _autotune_pipeline(file_pattern, epochs, batch_size, shuffle, compression_type)
+	else:
+		raise ValueError("Unknown input pipeline '{}'. Valid values: {}".format(pipeline, ", ".join(INPUT_PIPELINES)))
+
+	return _features_and_labels(dataset)
+
+
+def _default_pipeline(
+		file_pattern: Union[str, List[str]],
+		epochs: int,
+		batch_size: int,
+		shuffle: bool,
+		compression_type: str
+):
 	files = tf.data.Dataset.list_files(file_pattern=file_pattern)
 	if shuffle:
 		files = files.shuffle(1000)
 	files = files.repeat(epochs)
 
 	dataset = files.interleave(
-		lambda f: tf.data.TFRecordDataset(f, compression_type="GZIP"),
+		lambda f: tf.data.TFRecordDataset(f, compression_type=compression_type),
 		cycle_length=32,
 		block_length=4
 	)
@@ -48,6 +87,144 @@ def file_input_fn(file_pattern: str, epochs: int, batch_size: int, shuffle: bool
 	dataset = dataset.batch(batch_size=batch_size)
 	dataset = dataset.map(_parse_example, num_parallel_calls=8).prefetch(512)
 
+	return dataset
+
+
+def _autotune_pipeline(
+		file_pattern: Union[str, List[str]],
+		epochs: int,
+		batch_size: int,
+		shuffle: bool,
+		compression_type: str,
+		cycle_length: int = 16,
+		read_buffer_size: int = 8 * 1024 * 1024
+):
+	"""
+	Reads `cycle_length` files in parallel, so decompression is spread over multiple cores. Examples are batched
+	before parsing, so each batch is parsed with a single vectorized `parse_example` call.
+	"""
+	autotune = tf.data.experimental.AUTOTUNE
+
+	files = tf.data.Dataset.list_files(file_pattern=file_pattern, shuffle=shuffle)
+	files = files.repeat(epochs)
+
+	dataset = files.apply(tf.data.experimental.parallel_interleave(
+		lambda f: tf.data.TFRecordDataset(f, compression_type=compression_type, buffer_size=read_buffer_size),
+		cycle_length=cycle_length,
+		block_length=4,
+		sloppy=shuffle  # do not wait for slow files, unless the order matters
+	))
+	if shuffle:
+		dataset = dataset.shuffle(100000)
+	dataset = dataset.batch(batch_size=batch_size)
+	dataset = dataset.map(_parse_example, num_parallel_calls=autotune)
+	dataset = dataset.prefetch(autotune)
+
+	return dataset
+
+
+def normalized_input_fn(db_path: str, epochs: int, batch_size: int, shuffle: bool = True):
+	"""
+	Input function for databases written by `NormalizedExampleWriter`. Examples are joined with their tokens and
+	possible senses while reading. The generator yields whole batches of serialized examples, so the Python overhead
+	of `Dataset.from_generator` is paid once per batch. Shuffling happens inside chunks of the reader.
+	"""
+	from .data import NormalizedExampleReader
+
+	return _features_and_labels(_normalized_pipeline(NormalizedExampleReader(db_path), epochs, batch_size, shuffle))
+
+
+def _normalized_pipeline(reader, epochs: int, batch_size: int, shuffle: bool, parallelism: int = 8) -> tf.data.Dataset:
+	def generator():
+		yield from reader.serialized_batches(batch_size=batch_size, epochs=epochs, shuffle=shuffle)
+
+	dataset = tf.data.Dataset.from_generator(generator, output_types=tf.string, output_shapes=tf.TensorShape([None]))
+	dataset = dataset.map(_parse_example, num_parallel_calls=parallelism).prefetch(512)
+
+	return dataset
+
+
+class ExamplesPerSecondHook(tf.train.SessionRunHook):
+	"""
+	Prints the number of training examples per second and the fraction of wall time spent outside of session runs.
+
+	Compare examples/sec with the throughput of the input pipeline alone (ned-bench-input) to tell whether training is
+	input-bound.
+	"""
+
+	def __init__(self, batch_size_tensor: tf.Tensor, every_n_steps: int = 10000):
+		"""
+		:param batch_size_tensor: Scalar tensor with the size of the current batch
+		:param every_n_steps: Print interval
+		"""
+		self.batch_size_tensor = batch_size_tensor
+		self.every_n_steps = every_n_steps
+
+		self.steps = 0
+		self.examples = 0
+		self.run_time = 0.0
+		self.start_time = None
+		self.run_start_time = None
+
+	def begin(self):
+		self.steps = 0
+		self.examples = 0
+		self.run_time = 0.0
+		self.start_time = None
+
+	def before_run(self, run_context):
+		self.run_start_time = time.time()
+		if self.start_time is None:
+			self.start_time = self.run_start_time
+
+		return tf.train.SessionRunArgs(self.batch_size_tensor)
+
+	def after_run(self, run_context, run_values):
+		self.run_time += time.time() - self.run_start_time
+		self.steps += 1
+		self.examples += int(run_values.results)
+
+		if self.steps % self.every_n_steps == 0:
+			self._print()
+			self.steps = 0
+			self.examples = 0
+			self.run_time = 0.0
+			self.start_time = None
+
+	def end(self, session):
+		if self.steps > 0:
+			self._print()
+
+	def _print(self):
+		duration = time.time() - self.start_time
+		if duration <= 0.0:
+			return
+
+		print("examples/sec = {:,.0f} ({:,d} steps, {:.1%} of time outside of session runs)".format(
+			self.examples / duration,
+			self.steps,
+			1.0 - self.run_time / duration
+		))
+
+
+def memory_input_fn(serialized_examples: List[bytes], batch_size: int):
+	"""
+	Input function for serialized examples that are already in memory, e.g. a cached evaluation set. Skips reading
+	and decompressing files. Examples are not shuffled. The generator yields whole batches, so the Python overhead of
+	`Dataset.from_generator` is paid once per batch instead of once per example.
+	"""
+	def generator():
+		for batch_start in range(0, len(serialized_examples), batch_size):
+			yield serialized_examples[batch_start:batch_start + batch_size]
+
+	dataset = tf.data.Dataset.from_generator(generator, output_types=tf.string, output_shapes=tf.TensorShape([None]))
+	dataset = dataset.map(_parse_example, num_parallel_calls=tf.data.experimental.AUTOTUNE)
+	dataset = dataset.prefetch(tf.data.experimental.AUTOTUNE)
+
+	return _features_and_labels(dataset)
+
+
+def _features_and_labels(dataset: tf.data.Dataset):
 	dataset_iterator = dataset.make_one_shot_iterator()
 
 	t_indices, t_values, t_dense_shape, ps_indices, ps_values, ps_dense_shape, sense = dataset_iterator.get_next()
@@ -67,17 +244,179 @@ def file_input_fn(file_pattern: str, epochs: int, batch_size: int, shuffle: bool
 	return features, labels
 
 
+OPTIMIZERS = ["sgd", "adagrad", "lazy_adam"]
+
+
+def _create_optimizer(name: str, learning_rate) -> tf.train.Optimizer:
+	"""
+	All optimizers apply `IndexedSlices` gradients as sparse updates of the touched rows. Adam is only available in
+	its lazy variant, which updates the moments of touched rows only.
+	"""
+	if name == "sgd":
+		return tf.train.GradientDescentOptimizer(learning_rate=learning_rate)
+	elif name == "adagrad":
+		return tf.train.AdagradOptimizer(learning_rate=learning_rate)
+	elif name == "lazy_adam":
+		return tf.contrib.opt.LazyAdamOptimizer(learning_rate=learning_rate)
+	else:
+		raise ValueError("Unknown optimizer '{}'. Valid values: {}".format(name, ", ".join(OPTIMIZERS)))
+
+
+def _clip_gradients_per_slice(grads_and_vars: list, clip_norm: float) -> list:
+	"""
+	Clips each row of sparse gradients and each dense gradient separately to `clip_norm`. Gradients of duplicate rows
+	are summed first, so the clipped update of a row is bounded no matter how often the batch touches it.
+
+	Clipping by global norm keeps `IndexedSlices` as well, but scales all gradients by one factor, so a large gradient
+	of one row also shrinks the updates of all other rows in the batch. Here each row is only limited by its own norm.
+	"""
+	clipped_grads_and_vars = []
+
+	for grad, var in grads_and_vars:
+		if grad is None:
+			clipped_grads_and_vars.append((grad, var))
+		elif isinstance(grad, tf.IndexedSlices):
+			# Sum gradients of duplicate rows before clipping, like the optimizers do before applying them
+			unique_indices, unique_positions = tf.unique(grad.indices)
+			summed_values = tf.unsorted_segment_sum(grad.values, unique_positions, tf.size(unique_indices))
+
+			# Rows of bias gradients are scalars and are clipped by their absolute value
+			row_axes = list(range(1, grad.values.shape.ndims))
+			clipped_values = tf.clip_by_norm(summed_values, clip_norm, axes=row_axes)
+			clipped_grads_and_vars.append((tf.IndexedSlices(clipped_values, unique_indices, grad.dense_shape), var))
+		else:
+			clipped_grads_and_vars.append((tf.clip_by_norm(grad, clip_norm), var))
+
+	return clipped_grads_and_vars
+
+
+CANDIDATE_SCORINGS = ["batch", "segment"]
+
+
+def _batch_scoring(
+		hidden_batch: tf.Tensor,
+		possible_senses_batch: tf.SparseTensor,
+		senses_batch: tf.Tensor,
+		out_weights_transposed: tf.Variable,
+		out_biases: tf.Variable
+) -> (tf.Tensor, tf.Tensor):
+	"""
+	Scores every example against the possible senses of the whole batch. The softmax of the loss covers all of them,
+	predictions are restricted to the possible senses of each example with a dense [batch, unique senses] mask.
+
+	:return: Tuple of loss and predicted senses
+	"""
+	unique_possible_senses, relative_possible_senses_idx = tf.unique(possible_senses_batch.values)
+
+	relative_senses_batch = tf.argmax(
+		tf.cast(
+			tf.equal(
+				tf.expand_dims(senses_batch, axis=-1),
+				unique_possible_senses
+			),
+			tf.float32
+		),
+		axis=1
+	)
+
+	relevant_weights_transposed = tf.gather(out_weights_transposed, unique_possible_senses)
+	relevant_biases = tf.gather(out_biases, unique_possible_senses)
+
+	out_layer = tf.matmul(
+		hidden_batch,
+		relevant_weights_transposed,
+		transpose_b=True
+	) + relevant_biases
+
+	loss = tf.reduce_mean(
+		tf.nn.sparse_softmax_cross_entropy_with_logits(
+			logits=out_layer,
+			labels=relative_senses_batch
+		)
+	)
+
+	identity_matrix = tf.eye(tf.size(unique_possible_senses), dtype=tf.float32)
+	relative_possible_senses_one_hot = tf.gather(identity_matrix, relative_possible_senses_idx)
+	segment_ids = tf.cast(possible_senses_batch.indices, tf.int32)[:, 0]
+	mask = tf.segment_sum(relative_possible_senses_one_hot, segment_ids)
+
+	masked_out_layer = out_layer + (tf.reduce_max(out_layer) - tf.reduce_min(out_layer) + 1.0) * mask
+	relative_predictions = tf.argmax(masked_out_layer, axis=1)
+
+	predictions = tf.nn.embedding_lookup(unique_possible_senses, relative_predictions)
+
+	return loss, predictions
+
+
+def _segment_scoring(
+		hidden_batch: tf.Tensor,
+		possible_senses_batch: tf.SparseTensor,
+		senses_batch: tf.Tensor,
+		out_weights_transposed: tf.Variable,
+		out_biases: tf.Variable
+) -> (tf.Tensor, tf.Tensor):
+	"""
+	Scores every example only against its own possible senses, with one logit per (example, possible sense) pair and
+	a softmax per example. Memory is linear in the total number of possible senses of the batch. This matches the
+	restricted softmax of prediction.
+
+	:return: Tuple of loss and predicted senses
+	"""
+	batch_size = tf.shape(hidden_batch)[0]
+
+	candidate_senses = possible_senses_batch.values
+	candidate_examples = tf.cast(possible_senses_batch.indices[:, 0], tf.int32)
+
+	logits = tf.reduce_sum(
+		tf.gather(out_weights_transposed, candidate_senses) * tf.gather(hidden_batch, candidate_examples),
+		axis=1
+	) + tf.gather(out_biases, candidate_senses)
+
+	# Softmax per example
+	max_logits = tf.unsorted_segment_max(logits, candidate_examples, num_segments=batch_size)
+	shifted_logits = logits - tf.gather(max_logits, candidate_examples)
+	sum_exp_logits = tf.unsorted_segment_sum(tf.exp(shifted_logits), candidate_examples, num_segments=batch_size)
+	log_probabilities = shifted_logits - tf.log(tf.gather(sum_exp_logits, candidate_examples))
+
+	# The sense of each example is one of its possible senses
+	is_label = tf.equal(candidate_senses, tf.gather(senses_batch, candidate_examples))
+	loss = -tf.reduce_sum(tf.where(is_label, log_probabilities, tf.zeros_like(log_probabilities)))
+	loss = loss / tf.cast(batch_size, tf.float32)
+
+	# First candidate with the highest logit of each example
+	candidate_positions = tf.range(tf.size(candidate_senses))
+	is_max = tf.equal(shifted_logits, 0.0)
+	best_positions = tf.unsorted_segment_min(
+		tf.where(is_max, candidate_positions, tf.fill(tf.shape(candidate_positions), tf.int32.max)),
+		candidate_examples,
+		num_segments=batch_size
+	)
+	predictions = tf.gather(candidate_senses, best_positions)
+
+	return loss, predictions
+
+
 def _model_fn(features, labels, mode, params, config):
 	number_of_senses = params["number_of_senses"]
 	hash_bucket_size = params["hash_bucket_size"]
 	embedding_size = params["embedding_size"]
 	use_sqrtn_combiner = params["use_sqrtn_combiner"]
 	clip_gradients = params["clip_gradients"]
+	sparse_updates = params.get("sparse_updates", False)
+	optimizer_name = params.get("optimizer", "sgd")
 	learning_rate = params["learning_rate"]
 	decay_rate = params["decay_rate"]
 	decay_steps = params["decay_steps"]
 	hidden_layer_sizes = params.get("hidden_layer_sizes", [])
 	dropout_keep_prob = params.get("dropout_keep_prob", 1.0)
+	examples_per_second_steps = params.get("examples_per_second_steps", 0)
+	candidate_scoring = params.get("candidate_scoring", "batch")
+
+	if candidate_scoring not in CANDIDATE_SCORINGS:
+		raise ValueError("Unknown candidate scoring '{}'. Valid values: {}".format(
+			candidate_scoring,
+			", ".join(CANDIDATE_SCORINGS)
+		))
 
 	tf_random_seed = config.tf_random_seed if config is not None else None
 
@@ -192,49 +531,29 @@ def _model_fn(features, labels, mode, params, config):
 			combiner="sqrtn" if use_sqrtn_combiner else "mean"
 		)
 
-		unique_possible_senses, relative_possible_senses_idx = tf.unique(possible_senses_batch.values)
-
 		for w, b in zip(hidden_layer_weights, hidden_layer_biases):
 			embedded_tokens_batch = tf.matmul(embedded_tokens_batch, w) + b
 			embedded_tokens_batch = tf.nn.relu(embedded_tokens_batch)
 
-		relative_senses_batch = tf.argmax(
-			tf.cast(
-				tf.equal(
-					tf.expand_dims(senses_batch, axis=-1),
-					unique_possible_senses
-				),
-				tf.float32
-			),
-			axis=1
-		)
-
 		if dropout_keep_prob < 1.0 and mode == tf.estimator.ModeKeys.TRAIN:
 			embedded_tokens_batch = tf.nn.dropout(embedded_tokens_batch, dropout_keep_prob, name="dropout")
 
-		relevant_weights_transposed = tf.gather(out_weights_transposed, unique_possible_senses)
-		relevant_biases = tf.gather(out_biases, unique_possible_senses)
-
-		out_layer = tf.matmul(
-			embedded_tokens_batch,
-			relevant_weights_transposed,
-			transpose_b=True
-		) + relevant_biases
-
-		loss = tf.reduce_mean(
-			tf.nn.sparse_softmax_cross_entropy_with_logits(
-				logits=out_layer,
-				labels=relative_senses_batch
+		if candidate_scoring == "segment":
+			loss, predictions = _segment_scoring(
+				embedded_tokens_batch,
+				possible_senses_batch,
+				senses_batch,
+				out_weights_transposed,
+				out_biases
+			)
+		else:
+			loss, predictions = _batch_scoring(
+				embedded_tokens_batch,
+				possible_senses_batch,
+				senses_batch,
+				out_weights_transposed,
+				out_biases
 			)
-		)
-
-		identity_matrix = tf.eye(tf.size(unique_possible_senses), dtype=tf.float32)
-		relative_possible_senses_one_hot = tf.gather(identity_matrix, relative_possible_senses_idx)
-		segment_ids = tf.cast(possible_senses_batch.indices, tf.int32)[:, 0]
-		mask = tf.segment_sum(relative_possible_senses_one_hot, segment_ids)
-
-		masked_out_layer = out_layer + (tf.reduce_max(out_layer) - tf.reduce_min(out_layer) + 1.0) * mask
-		relative_predictions = tf.argmax(masked_out_layer, axis=1)
 
 		if mode == tf.estimator.ModeKeys.TRAIN:
 			global_step_var = tf.train.get_global_step()
@@ -250,9 +569,12 @@ def _model_fn(features, labels, mode, params, config):
 			else:
 				actual_learning_rate = learning_rate
 
-			optimizer = tf.train.GradientDescentOptimizer(learning_rate=actual_learning_rate)
+			optimizer = _create_optimizer(optimizer_name, actual_learning_rate)
 
-			if clip_gradients:
+			if clip_gradients and sparse_updates:
+				grads_and_vars = _clip_gradients_per_slice(optimizer.compute_gradients(loss), clip_norm=1.0)
+				optimizer = optimizer.apply_gradients(grads_and_vars, global_step=global_step_var)
+			elif clip_gradients:
 				grads_and_vars = optimizer.compute_gradients(loss)
 				grads = list(map(lambda x: x[0], grads_and_vars))
 				variables = list(map(lambda x: x[1], grads_and_vars))
@@ -262,20 +584,22 @@ def _model_fn(features, labels, mode, params, config):
 			else:
 				optimizer = optimizer.minimize(loss, global_step=global_step_var)
 
-			correct_predictions = tf.cast(tf.equal(relative_predictions, relative_senses_batch), tf.float32)
+			correct_predictions = tf.cast(tf.equal(predictions, senses_batch), tf.float32)
 			accuracy = tf.reduce_mean(correct_predictions)
 
 			tf.summary.scalar("accuracy", accuracy)
 			tf.summary.scalar("loss", loss)
 			tf.summary.scalar("learning_rate", actual_learning_rate)
 
-			return tf.estimator.EstimatorSpec(mode=mode, loss=loss, train_op=optimizer)
-		elif mode == tf.estimator.ModeKeys.EVAL:
-			predictions = tf.nn.embedding_lookup(unique_possible_senses, relative_predictions)
+			training_hooks = []
+			if examples_per_second_steps > 0:
+				training_hooks.append(ExamplesPerSecondHook(tf.size(senses_batch), every_n_steps=examples_per_second_steps))
 
+			return tf.estimator.EstimatorSpec(mode=mode, loss=loss, train_op=optimizer, training_hooks=training_hooks)
+		elif mode == tf.estimator.ModeKeys.EVAL:
 			accuracy = tf.metrics.accuracy(
-				labels=relative_senses_batch,
-				predictions=relative_predictions
+				labels=senses_batch,
+				predictions=predictions
 			)
 
 			mean_per_class_acc = tf.metrics.mean_per_class_accuracy(
@@ -306,6 +630,16 @@ class WordSenseEstimator(tf.estimator.Estimator):
 		"decay_rate": 0.98,
 		"decay_steps": 100000
 	}
+
+	"optimizer" is one of OPTIMIZERS (default "sgd"). All of them only update the rows of sparse gradients that the batch
+	touched. With "sparse_updates": True, "clip_gradients" clips the gradient of every embedding, output weight and
+	output bias row and every dense gradient separately (see `_clip_gradients_per_slice`) instead of scaling all
+	gradients by their global norm. This changes how updates are limited, not which rows are updated.
+
+	"candidate_scoring" is one of CANDIDATE_SCORINGS. "batch" (default) scores every example against the possible senses
+	of the whole batch, "segment" only against its own possible senses (see `_segment_scoring`).
+
+	Set "examples_per_second_steps" to print training throughput every n steps (see `ExamplesPerSecondHook`).
 	"""
 
 	def __init__(
@@ -0,0 +1,363 @@
+import os
+import time
+import numpy as np
+import tensorflow as tf
+from typing import Dict, Iterator, List, Optional
+
+
+class NativeExamples:
+	"""
+	Examples with hashed tokens in flat NumPy arrays (CSR layout), so minibatches can be assembled without TensorFlow.
+	"""
+
+	def __init__(
+			self,
+			token_offsets: np.ndarray,
+			token_ids: np.ndarray,
+			possible_sense_offsets: np.ndarray,
+			possible_senses: np.ndarray,
+			senses: np.ndarray
+	):
+		"""
+		:param token_offsets: Array of shape [n + 1]. Tokens of example i are token_ids[token_offsets[i]:token_offsets[i + 1]].
+		:param token_ids: Hashed tokens
+		:param possible_sense_offsets: Array of shape [n + 1], like token_offsets
+		:param possible_senses: Possible senses
+		:param senses: Array of shape [n] with the sense of each example
+		"""
+		self.token_offsets = token_offsets
+		self.token_ids = token_ids
+		self.possible_sense_offsets = possible_sense_offsets
+		self.possible_senses = possible_senses
+		self.senses = senses
+
+	def __len__(self):
+		return len(self.senses)
+
+	@staticmethod
+	def load(serialized_examples: Iterator[bytes], hash_bucket_size: int, hash_batch_size: int = 100000) -> "NativeExamples":
+		"""
+		Parses serialized `tf.train.Example`s and hashes their tokens like `_model_fn`. TensorFlow is only used for
+		hashing, so the hashes match the ones of the estimator. Examples without tokens or without possible senses are
+		skipped, because their averaged embedding and softmax are undefined.
+
+		:param serialized_examples: Serialized examples, e.g. from TFRecord files or `NormalizedExampleReader`
+		:param hash_bucket_size: Number of hash buckets
+		:param hash_batch_size: Number of examples hashed per session run
+		"""
+		id_dtype = np.int32 if hash_bucket_size <= np.iinfo(np.int32).max else np.int64
+
+		with tf.Graph().as_default():
+			tokens_placeholder = tf.placeholder(tf.string, shape=[None])
+			hashed_tokens = tf.string_to_hash_bucket_fast(tokens_placeholder, num_buckets=hash_bucket_size)
+
+			with tf.Session() as session:
+				token_counts = []
+				token_id_chunks = []
+				possible_sense_counts = []
+				possible_sense_chunks = []
+				senses = []
+
+				batch_tokens = []
+				skipped_count = 0
+
+				def hash_batch():
+					if len(batch_tokens) > 0:
+						token_id_chunks.append(
+							session.run(hashed_tokens, feed_dict={tokens_placeholder: batch_tokens}).astype(id_dtype)
+						)
+						batch_tokens.clear()
+
+				for i, serialized_example in enumerate(serialized_examples):
+					feature = tf.train.Example.FromString(serialized_example).features.feature
+
+					tokens = feature["tokens"].bytes_list.value
+					possible_senses = feature["possible_senses"].int64_list.value
+
+					if len(tokens) == 0 or len(possible_senses) == 0:
+						skipped_count += 1
+						continue
+
+					batch_tokens.extend(tokens)
+					token_counts.append(len(tokens))
+					possible_sense_chunks.append(np.array(possible_senses, dtype=np.int32))
+					possible_sense_counts.append(len(possible_senses))
+					senses.append(feature["sense"].int64_list.value[0])
+
+					if (i + 1) % hash_batch_size == 0:
+						hash_batch()
+
+				hash_batch()
+
+		if skipped_count > 0:
+			print("Skipped {:,d} examples without tokens or possible senses".format(skipped_count))
+
+		def offsets(counts: List[int]) -> np.ndarray:
+			result = np.zeros(len(counts) + 1, dtype=np.int64)
+			np.cumsum(counts, out=result[1:])
+			return result
+
+		def concatenate(chunks: List[np.ndarray], dtype) -> np.ndarray:
+			return np.concatenate(chunks) if len(chunks) > 0 else np.zeros(0, dtype=dtype)
+
+		return NativeExamples(
+			token_offsets=offsets(token_counts),
+			token_ids=concatenate(token_id_chunks, id_dtype),
+			possible_sense_offsets=offsets(possible_sense_counts),
+			possible_senses=concatenate(possible_sense_chunks, np.int32),
+			senses=np.array(senses, dtype=np.int32)
+		)
+
+	@staticmethod
+	def _gather_ranges(offsets: np.ndarray, values: np.ndarray, indexes: np.ndarray) -> (np.ndarray, np.ndarray):
+		"""
+		Returns the concatenated values of the given examples and new offsets.
+		"""
+		starts = offsets[indexes]
+		lengths = offsets[indexes + 1] - starts
+
+		new_offsets = np.zeros(len(indexes) + 1, dtype=np.int64)
+		np.cumsum(lengths, out=new_offsets[1:])
+
+		positions = np.arange(new_offsets[-1]) - np.repeat(new_offsets[:-1] - starts, lengths)
+
+		return values[positions], new_offsets
+
+	def batch(self, indexes: np.ndarray) -> (np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray):
+		"""
+		:return: Tuple of token ids, token offsets, possible senses, possible sense offsets and senses
+		"""
+		token_ids, token_offsets = self._gather_ranges(self.token_offsets, self.token_ids, indexes)
+		possible_senses, possible_sense_offsets = self._gather_ranges(
+			self.possible_sense_offsets,
+			self.possible_senses,
+			indexes
+		)
+
+		return token_ids, token_offsets, possible_senses, possible_sense_offsets, self.senses[indexes]
+
+
+class NativeTrainer:
+	"""
+	Trains the model of `WordSenseEstimator` with vectorized NumPy minibatch SGD instead of a TensorFlow graph.
+
+	The model is a linear classifier over the averaged embeddings of hashed tokens. Each example's softmax is restricted
+	to its own possible senses, like the "segment" candidate scoring of the estimator. Variables are read from and
+	written to TensorFlow checkpoints in `model_dir` with the names used by `_model_fn`, so the estimator can evaluate,
+	export or continue training the model.
+
+	"clip_gradients" always clips every embedding row and every dense gradient separately, like the estimator with
+	"sparse_updates": True, and the softmax is always per example. "sparse_updates" and "candidate_scoring" are
+	therefore ignored.
+
+	Only supports models without hidden layers and dropout that are trained with the "sgd" optimizer, since the
+	checkpoint has no slot variables for other optimizers.
+	"""
+
+	VARIABLE_NAMES = ["embeddings", "out_weights_transposed", "out_biases"]
+
+	def __init__(self, model_dir: str, number_of_senses: int, params: Dict[str, any], seed: Optional[int] = None):
+		"""
+		:param model_dir: Model folder of `WordSenseEstimator`
+		:param number_of_senses: Number of senses
+		:param params: Params of `WordSenseEstimator` with defaults applied
+		:param seed: Seed for initialization and shuffling
+		"""
+		if len(params.get("hidden_layer_sizes", [])) > 0:
+			raise ValueError("Native trainer does not support hidden layers")
+
+		if params.get("optimizer", "sgd") != "sgd":
+			raise ValueError("Native trainer only supports the 'sgd' optimizer")
+
+		if params.get("dropout_keep_prob", 1.0) < 1.0:
+			raise ValueError("Native trainer does not support dropout")
+
+		self.model_dir = model_dir
+		self.number_of_senses = number_of_senses
+		self.hash_bucket_size = params["hash_bucket_size"]
+		self.embedding_size = params["embedding_size"]
+		self.use_sqrtn_combiner = params["use_sqrtn_combiner"]
+		self.clip_gradients = params["clip_gradients"]
+		self.learning_rate = params["learning_rate"]
+		self.decay_rate = params["decay_rate"]
+		self.decay_steps = params["decay_steps"]
+
+		self.random_state = np.random.RandomState(seed)
+
+		checkpoint_path = tf.train.latest_checkpoint(model_dir) if os.path.isdir(model_dir) else None
+
+		if checkpoint_path is not None:
+			self.embeddings = tf.train.load_variable(checkpoint_path, "embeddings")
+			self.out_weights_transposed = tf.train.load_variable(checkpoint_path, "out_weights_transposed")
+			self.out_biases = tf.train.load_variable(checkpoint_path, "out_biases")
+			self.global_step = int(tf.train.load_variable(checkpoint_path, "global_step"))
+		else:
+			self.embeddings = self._xavier_uniform([self.hash_bucket_size, self.embedding_size])
+			self.out_weights_transposed = self._xavier_uniform([number_of_senses, self.embedding_size])
+			self.out_biases = np.zeros(number_of_senses, dtype=np.float32)
+			self.global_step = 0
+
+	def _xavier_uniform(self, shape: List[int]) -> np.ndarray:
+		limit = np.sqrt(6.0 / (shape[0] + shape[1]))
+		return self.random_state.uniform(-limit, limit, size=shape).astype(np.float32)
+
+	def train(self, examples: NativeExamples, epochs: int, batch_size: int, log_every_n_steps: int = 10000):
+		"""
+		Trains for `epochs` epochs and saves a checkpoint.
+		"""
+		start_time = time.time()
+		interval_start_time = start_time
+		interval_loss = 0.0
+		interval_steps = 0
+		example_count = 0
+
+		for _ in range(epochs):
+			permutation = self.random_state.permutation(len(examples))
+
+			for batch_start in range(0, len(examples), batch_size):
+				loss = self._step(examples.batch(permutation[batch_start:batch_start + batch_size]))
+
+				example_count += min(batch_size, len(examples) - batch_start)
+				interval_loss += loss
+				interval_steps += 1
+
+				if self.global_step % log_every_n_steps == 0:
+					now = time.time()
+					print("step = {:d}, loss = {:.4f}, steps/sec = {:.1f}".format(
+						self.global_step,
+						interval_loss / interval_steps,
+						interval_steps / max(now - interval_start_time, 1e-9)
+					))
+					interval_start_time = now
+					interval_loss = 0.0
+					interval_steps = 0
+
+		duration = time.time() - start_time
+		print("Native training done. {:,d} examples in {:.1f} s, examples/sec = {:,.0f}".format(
+			example_count,
+			duration,
+			example_count / max(duration, 1e-9)
+		))
+
+		self.save()
+
+	def _current_learning_rate(self) -> float:
+		if self.decay_rate == 1.0:
+			return self.learning_rate
+
+		return self.learning_rate * self.decay_rate ** (self.global_step / self.decay_steps)
+
+	@staticmethod
+	def _clip_rows(gradients: np.ndarray, clip_norm: float = 1.0) -> np.ndarray:
+		norms = np.sqrt(np.sum(gradients * gradients, axis=1, keepdims=True))
+		return gradients * np.minimum(1.0, clip_norm / np.maximum(norms, 1e-12))
+
+	@staticmethod
+	def _sum_duplicate_rows(ids: np.ndarray, gradients: np.ndarray) -> (np.ndarray, np.ndarray):
+		unique_ids, positions = np.unique(ids, return_inverse=True)
+		summed_gradients = np.zeros((len(unique_ids), gradients.shape[1]), dtype=np.float32)
+		np.add.at(summed_gradients, positions, gradients)
+		return unique_ids, summed_gradients
+
+	def _step(self, batch: tuple) -> float:
+		"""
+		One SGD step with the mean cross entropy of the batch. Only rows of touched tokens and senses are updated.
+		Gradients are clipped per row, like the sparse update mode of the estimator.
+		"""
+		token_ids, token_offsets, possible_senses, possible_sense_offsets, senses = batch
+		batch_size = len(senses)
+
+		token_counts = np.diff(token_offsets)
+		possible_sense_counts = np.diff(possible_sense_offsets)
+
+		# Hidden layer: combined token embeddings
+		embedded_tokens = np.add.reduceat(self.embeddings[token_ids], token_offsets[:-1], axis=0)
+		if self.use_sqrtn_combiner:
+			scale = 1.0 / np.sqrt(token_counts)
+		else:
+			scale = 1.0 / token_counts
+		scale = scale.astype(np.float32)[:, np.newaxis]
+		embedded_tokens *= scale
+
+		# Restricted softmax over the possible senses of each example
+		candidate_examples = np.repeat(np.arange(batch_size), possible_sense_counts)
+		candidate_weights = self.out_weights_transposed[possible_senses]
+
+		logits = np.sum(candidate_weights * embedded_tokens[candidate_examples], axis=1) + self.out_biases[possible_senses]
+		logits -= np.repeat(np.maximum.reduceat(logits, possible_sense_offsets[:-1]), possible_sense_counts)
+
+		exp_logits = np.exp(logits)
+		probabilities = exp_logits / np.repeat(np.add.reduceat(exp_logits, possible_sense_offsets[:-1]), possible_sense_counts)
+
+		is_label = possible_senses == senses[candidate_examples]
+		loss = -np.sum(np.log(np.maximum(probabilities[is_label], 1e-30))) / batch_size
+
+		# Backward pass
+		logit_gradients = ((probabilities - is_label) / batch_size).astype(np.float32)
+
+		out_weight_gradients = logit_gradients[:, np.newaxis] * embedded_tokens[candidate_examples]
+		embedded_token_gradients = np.add.reduceat(
+			logit_gradients[:, np.newaxis] * candidate_weights,
+			possible_sense_offsets[:-1],
+			axis=0
+		)
+		embedding_gradients = np.repeat(embedded_token_gradients * scale, token_counts, axis=0)
+
+		# Sparse updates
+		learning_rate = self._current_learning_rate()
+
+		sense_ids, out_weight_gradients = self._sum_duplicate_rows(possible_senses, out_weight_gradients)
+		out_bias_gradients = np.bincount(
+			np.searchsorted(sense_ids, possible_senses),
+			weights=logit_gradients,
+			minlength=len(sense_ids)
+		).astype(np.float32)
+		token_ids, embedding_gradients = self._sum_duplicate_rows(token_ids, embedding_gradients)
+
+		if self.clip_gradients:
+			out_weight_gradients = self._clip_rows(out_weight_gradients)
+			out_bias_gradients = np.clip(out_bias_gradients, -1.0, 1.0)
+			embedding_gradients = self._clip_rows(embedding_gradients)
+
+		self.out_weights_transposed[sense_ids] -= learning_rate * out_weight_gradients
+		self.out_biases[sense_ids] -= learning_rate * out_bias_gradients
+		self.embeddings[token_ids] -= learning_rate * embedding_gradients
+
+		self.global_step += 1
+
+		return float(loss)
+
+	def save(self) -> str:
+		"""
+		Writes a checkpoint that `WordSenseEstimator` can restore.
+
+		:return: Checkpoint path
+		"""
+		os.makedirs(self.model_dir, exist_ok=True)
+
+		with tf.Graph().as_default():
+			values = {
+				"embeddings": self.embeddings,
+				"out_weights_transposed": self.out_weights_transposed,
+				"out_biases": self.out_biases
+			}
+
+			# Placeholders avoid embedding the large arrays as constants in the graph
+			placeholders = {}
+			for name in NativeTrainer.VARIABLE_NAMES:
+				placeholders[name] = tf.placeholder(tf.float32, shape=values[name].shape)
+				tf.get_variable(name, initializer=placeholders[name], trainable=True)
+
+			global_step = tf.train.get_or_create_global_step()
+			assign_global_step = tf.assign(global_step, self.global_step)
+
+			saver = tf.train.Saver()
+
+			with tf.Session() as session:
+				session.run(
+					tf.global_variables_initializer(),
+					feed_dict={placeholders[name]: values[name] for name in NativeTrainer.VARIABLE_NAMES}
+				)
+				session.run(assign_global_step)
+
+				return saver.save(session, os.path.join(self.model_dir, "model.ckpt"), global_step=self.global_step)
@@ -0,0 +1,136 @@
+import sqlite3
+import pathlib
+from abc import ABC, abstractmethod
+from typing import Iterator
+
+try:
+	import duckdb
+except ImportError:
+	duckdb = None
+
+
+class Storage(ABC):
+	"""
+	Query engine for a sqlite database file.
+
+	The database file is always a sqlite database, so every stage and the serving databases keep their schema. The
+	storage only decides which engine runs the queries of a stage. Use `Storage.create` to get an instance.
+	"""
+
+	NAMES = ["sqlite", "duckdb"]
+
+	name = None
+
+	def __init__(self, db_path: str):
+		self.db_path = db_path
+
+	@staticmethod
+	def create(name: str, db_path: str) -> "Storage":
+		"""
+		:param name: One of Storage.NAMES
+		:param db_path: Path to sqlite database
+		"""
+		if name == "sqlite":
+			return SqliteStorage(db_path)
+		elif name == "duckdb":
+			return DuckDbStorage(db_path)
+		else:
+			raise ValueError("Unknown storage '{}'. Valid values: {}".format(name, ", ".join(Storage.NAMES)))
+
+	@abstractmethod
+	def connect(self, read_only: bool = False):
+		"""
+		Returns a new DB-API connection.
+		"""
+
+	@abstractmethod
+	def execute_script(self, conn, script: str):
+		"""
+		Executes multiple statements separated by semicolons and commits.
+		"""
+
+	@staticmethod
+	def query(conn, sql: str, parameters: tuple = (), chunk_size: int = 10000) -> Iterator[tuple]:
+		"""
+		Streams the rows of a query.
+		"""
+		cursor = conn.execute(sql, parameters)
+
+		while True:
+			rows = cursor.fetchmany(chunk_size)
+			if len(rows) == 0:
+				break
+
+			yield from rows
+
+
+class SqliteStorage(Storage):
+	"""
+	Runs queries with sqlite itself.
+	"""
+
+	name = "sqlite"
+
+	def connect(self, read_only: bool = False) -> sqlite3.Connection:
+		if read_only:
+			return sqlite3.connect(SqliteStorage.read_only_uri(self.db_path), uri=True)
+
+		return sqlite3.connect(self.db_path)
+
+	@staticmethod
+	def read_only_uri(db_path: str) -> str:
+		"""
+		Returns a URI that opens the database read-only. Characters like '#', '?' and '%' in the path are escaped.
+		"""
+		return pathlib.Path(db_path).resolve().as_uri() + "?mode=ro"
+
+	def execute_script(self, conn: sqlite3.Connection, script: str):
+		conn.executescript(script)
+		conn.commit()
+
+
+class DuckDbStorage(Storage):
+	"""
+	Runs queries with DuckDB's columnar, multi-threaded engine on the tables of the sqlite database, which is attached
+	with DuckDB's sqlite extension. Tables created through DuckDB are written to the sqlite file.
+
+	Requires the optional 'duckdb' package. The sqlite extension is installed once when the storage is created, which
+	needs network access unless it is already installed. DuckDB cannot create sqlite indexes, so only use it for
+	aggregation queries and create indexes with sqlite. SQL must be portable between both engines.
+	"""
+
+	name = "duckdb"
+
+	def __init__(self, db_path: str, threads: int = None):
+		"""
+		:param db_path: Path to sqlite database
+		:param threads: Number of DuckDB threads. Defaults to the number of CPU cores.
+		"""
+		super().__init__(db_path)
+
+		if duckdb is None:
+			raise ImportError("DuckDB storage requires the 'duckdb' package (pip install duckdb)")
+
+		self.threads = threads
+
+		conn = duckdb.connect()
+		conn.execute("INSTALL sqlite")
+		conn.close()
+
+	def connect(self, read_only: bool = False):
+		conn = duckdb.connect()
+
+		if self.threads is not None:
+			conn.execute("SET threads = {:d}".format(self.threads))
+
+		conn.execute("LOAD sqlite")
+		conn.execute("ATTACH '{}' AS db (TYPE SQLITE{})".format(
+			self.db_path.replace("'", "''"),
+			", READ_ONLY" if read_only else ""
+		))
+		conn.execute("USE db")
+
+		return conn
+
+	def execute_script(self, conn, script: str):
+		conn.execute(script)
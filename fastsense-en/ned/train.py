@@ -1,32 +1,122 @@
 import os
 import tensorflow as tf
-from typing import Dict, List
+from typing import Dict, List, Iterator, Optional
 import sqlite3
 import json
 import datetime
 import glob
+import socket
+import traceback
+import queue
+import time
+import multiprocessing as mp
 
-from ned.estimator import WordSenseEstimator, file_input_fn
+from ned.estimator import WordSenseEstimator, file_input_fn, normalized_input_fn, memory_input_fn
+from ned.data import ExampleWriter, NormalizedExampleWriter, NormalizedExampleReader, DatasetMetadata
+from ned.native import NativeExamples, NativeTrainer
+
+
+class WorkersDoneHook(tf.train.SessionRunHook):
+	"""
+	Synchronizes the end of training on a local cluster with a queue on the parameter server. Every worker enqueues a
+	token when its input is exhausted and the chief waits for the tokens of all other workers, so updates of workers
+	that finish after the chief are not lost. Must be placed before the checkpoint saver hook of the chief.
+	"""
+
+	def __init__(self, is_chief: bool, number_of_workers: int):
+		"""
+		:param is_chief: Waits for the other workers if True, otherwise signals that this worker is done
+		:param number_of_workers: Number of workers including the chief
+		"""
+		self.is_chief = is_chief
+		self.number_of_workers = number_of_workers
+		self.done_op = None
+
+	def begin(self):
+		with tf.device("/job:ps/task:0"):
+			done_queue = tf.FIFOQueue(self.number_of_workers, tf.int32, shapes=[[]], shared_name="workers_done_queue")
+
+		if self.is_chief:
+			self.done_op = done_queue.dequeue_many(self.number_of_workers - 1)
+		else:
+			self.done_op = done_queue.enqueue(1)
+
+	def end(self, session):
+		if self.is_chief:
+			print("Waiting for {:d} other workers...".format(self.number_of_workers - 1))
+
+		session.run(self.done_op)
 
 
 class ModelTrainer:
-	def __init__(self, model_dir: str, dataset_base_path: str, dataset_name: str, parameters: Dict[str, any]):
+	def __init__(
+			self,
+			model_dir: str,
+			dataset_base_path: str,
+			dataset_name: str,
+			parameters: Dict[str, any],
+			number_of_senses: int = None,
+			session_threads: int = None,
+			batch_size: int = None,
+			device_filters: List[str] = None
+	):
+		"""
+		:param model_dir: Path to model folder
+		:param dataset_base_path: Path to output folder of ned-wiki-export
+		:param dataset_name: Name of dataset in dataset_base_path
+		:param parameters: Params of `WordSenseEstimator`. "decay_epochs" is converted to "decay_steps" with the
+			example count of the train set.
+		:param number_of_senses: Skips counting senses if given
+		:param session_threads: Number of intra-op and inter-op threads. None lets TensorFlow decide.
+		:param batch_size: Training batch size. Required for "decay_epochs".
+		:param device_filters: Tasks the sessions may use when training on a cluster, so they do not depend on other
+			workers
+		"""
+		self.dataset_base_path = dataset_base_path
+		self.dataset_name = dataset_name
 		self.dataset_path = os.path.join(dataset_base_path, dataset_name)
 		self.db_path = os.path.join(dataset_base_path, "additional_data.sqlite3")
 		self.data_descriptor_path = os.path.join(self.dataset_path, "data_descriptor.json")
 		self.model_dir = model_dir
+		self.input_pipeline = parameters.get("input_pipeline", "default")
+		self.trainer = parameters.get("trainer", "estimator")
+		self.native_examples = {}  # dataset name -> NativeExamples
+		self.cached_examples = {}  # dataset name -> list of serialized examples
+
+		train_metadata = self.metadata("train")
+
+		if "decay_epochs" in parameters:
+			parameters = dict(parameters)
+			decay_epochs = parameters.pop("decay_epochs")
+
+			if train_metadata is None or batch_size is None:
+				print("Ignoring decay_epochs, because metadata of the train set or the batch size is missing")
+			else:
+				parameters["decay_steps"] = max(int(round(decay_epochs * train_metadata.example_count / batch_size)), 1)
+				print("decay_steps = {:,d}".format(parameters["decay_steps"]))
 
-		if os.path.exists(self.data_descriptor_path) and os.path.exists(self.db_path):
+		self.parameters = parameters
+
+		if number_of_senses is not None:
+			pass
+		elif os.path.exists(self.data_descriptor_path) and os.path.exists(self.db_path):
 			conn = sqlite3.connect(self.db_path)
 			c = conn.execute("select count(*) from senses")
 			number_of_senses = c.fetchone()[0]
 			conn.close()
+		elif train_metadata is not None:
+			number_of_senses = train_metadata.max_sense + 1 if train_metadata.max_sense is not None else 0
+		elif os.path.exists(self._normalized_db_path("train")):
+			conn = sqlite3.connect(self._normalized_db_path("train"))
+			c = conn.execute("select ifnull(max(sense) + 1, 0) from examples")
+			number_of_senses = c.fetchone()[0]
+			conn.close()
 		else:
 			print("Counting senses...")
 			number_of_senses = 0
 
-			file_options = tf.python_io.TFRecordOptions(compression_type=tf.python_io.TFRecordCompressionType.GZIP)
-			file_pattern = os.path.join(self.dataset_path, "train", "train.*.tfrecords.gz")
+			file_pattern, compression_type = ExampleWriter.find_files(os.path.join(self.dataset_path, "train"), "train")
+			file_options = tf.python_io.TFRecordOptions(compression_type=compression_type)
 
 			for train_file_path in glob.glob(file_pattern):
 				for serializedExample in tf.python_io.tf_record_iterator(path=train_file_path, options=file_options):
@@ -42,6 +132,13 @@ class ModelTrainer:
 		session_config.allow_soft_placement = False
 		session_config.gpu_options.allow_growth = True
 
+		if session_threads is not None:
+			session_config.intra_op_parallelism_threads = session_threads
+			session_config.inter_op_parallelism_threads = session_threads
+
+		if device_filters is not None:
+			session_config.device_filters.extend(device_filters)
+
 		config = tf.estimator.RunConfig(
 			save_summary_steps=60000,
 			save_checkpoints_secs=1800,
@@ -56,20 +153,271 @@ class ModelTrainer:
 			params=parameters,
 			config=config
 		)
+		self.number_of_senses = number_of_senses
 
-	def train(self, dataset_name: str, epochs: int, batch_size: int):
-		file_pattern = os.path.join(self.dataset_path, dataset_name, dataset_name + ".*.tfrecords.gz")
+	def _normalized_db_path(self, dataset_name: str) -> str:
+		return NormalizedExampleWriter.database_path(os.path.join(self.dataset_path, dataset_name), dataset_name)
 
-		def input_fn():
-			return file_input_fn(file_pattern=file_pattern, epochs=epochs, batch_size=batch_size, shuffle=True)
+	def _input_fn(self, dataset_name: str, epochs: int, batch_size: int, shuffle: bool):
+		"""
+		Returns an input function for the TFRecord files or, if the dataset was exported with --normalized, the
+		normalized database of a dataset.
+		"""
+		db_path = self._normalized_db_path(dataset_name)
+
+		if os.path.exists(db_path):
+			print("Reading '{}' from normalized database {} instead of TFRecord files".format(dataset_name, db_path))
+
+			def input_fn():
+				return normalized_input_fn(db_path=db_path, epochs=epochs, batch_size=batch_size, shuffle=shuffle)
+		else:
+			file_pattern, compression_type = ExampleWriter.find_files(
+				os.path.join(self.dataset_path, dataset_name),
+				dataset_name
+			)
+
+			def input_fn():
+				return file_input_fn(
+					file_pattern=file_pattern,
+					epochs=epochs,
+					batch_size=batch_size,
+					shuffle=shuffle,
+					pipeline=self.input_pipeline,
+					compression_type=compression_type
+				)
+
+		return input_fn
+
+	def metadata(self, dataset_name: str) -> Optional[DatasetMetadata]:
+		"""
+		Returns metadata written by ned-wiki-export or None for older datasets.
+		"""
+		metadata_path = DatasetMetadata.file_path(os.path.join(self.dataset_path, dataset_name), dataset_name)
+
+		if os.path.exists(metadata_path):
+			return DatasetMetadata.load(metadata_path)
+
+		return None
+
+	def train(self, dataset_name: str, epochs: int, batch_size: int, number_of_workers: int = 1):
+		"""
+		:param number_of_workers: Number of training processes. More than one trains on a local cluster, see
+			`_train_on_local_cluster`.
+		"""
+		metadata = self.metadata(dataset_name)
+		if metadata is not None:
+			print("{:,d} examples, {:,d} steps per epoch".format(
+				metadata.example_count,
+				-(-metadata.example_count // batch_size)
+			))
+
+		if self.trainer == "native":
+			self._train_native(dataset_name, epochs, batch_size)
+			return
+
+		if number_of_workers > 1:
+			if os.path.exists(self._normalized_db_path(dataset_name)):
+				print("Normalized datasets can only be trained by a single worker")
+			elif len(self._train_files(dataset_name)[0]) < 2:
+				# Every worker needs its own files
+				print("Less than 2 files, training in a single process")
+			else:
+				self._train_on_local_cluster(dataset_name, epochs, batch_size, number_of_workers)
+				return
+
+		input_fn = self._input_fn(dataset_name, epochs=epochs, batch_size=batch_size, shuffle=True)
 
 		self.estimator.train(input_fn=input_fn)
 
-	def test(self, dataset_name: str) -> dict:
-		file_pattern = os.path.join(self.dataset_path, dataset_name, dataset_name + ".*.tfrecords.gz")
+	def _serialized_examples(self, dataset_name: str) -> Iterator[bytes]:
+		db_path = self._normalized_db_path(dataset_name)
+
+		if os.path.exists(db_path):
+			yield from NormalizedExampleReader(db_path).serialized_examples()
+		else:
+			file_pattern, compression_type = ExampleWriter.find_files(
+				os.path.join(self.dataset_path, dataset_name),
+				dataset_name
+			)
+			file_options = tf.python_io.TFRecordOptions(compression_type=compression_type)
+
+			for file_path in sorted(glob.glob(file_pattern)):
+				yield from tf.python_io.tf_record_iterator(path=file_path, options=file_options)
+
+	def _train_native(self, dataset_name: str, epochs: int, batch_size: int):
+		"""
+		Trains with `NativeTrainer` instead of the estimator. Examples are loaded once and kept in memory.
+		"""
+		if dataset_name not in self.native_examples:
+			print("Loading examples for native training...")
+			self.native_examples[dataset_name] = NativeExamples.load(
+				self._serialized_examples(dataset_name),
+				hash_bucket_size=self.estimator.params["hash_bucket_size"]
+			)
+
+		native_trainer = NativeTrainer(
+			self.model_dir,
+			number_of_senses=self.number_of_senses,
+			params=self.estimator.params,
+			seed=self.estimator.config.tf_random_seed
+		)
+		native_trainer.train(self.native_examples[dataset_name], epochs=epochs, batch_size=batch_size)
+
+	def _train_files(self, dataset_name: str) -> (List[str], str):
+		"""
+		Returns the sorted TFRecord files of a dataset and their compression type.
+		"""
+		file_pattern, compression_type = ExampleWriter.find_files(os.path.join(self.dataset_path, dataset_name), dataset_name)
+		return sorted(glob.glob(file_pattern)), compression_type
+
+	def _train_on_local_cluster(self, dataset_name: str, epochs: int, batch_size: int, number_of_workers: int):
+		"""
+		Trains with a parameter server and `number_of_workers` worker processes on localhost (between-graph
+		replication with asynchronous updates). Every worker reads its own subset of the TFRecord files and runs
+		single-threaded sessions, so throughput scales with the number of cores instead of the intra-op parallelism
+		of a single session. The parameter server applies the updates of all workers and is not restricted to one
+		thread.
+
+		The chief saves the final checkpoint after all workers are done. If any task fails, the whole cluster is
+		stopped. Needs at least two files, `train` trains in a single process otherwise.
+		"""
+		file_paths, compression_type = self._train_files(dataset_name)
+
+		if len(file_paths) < number_of_workers:
+			print("Only {:d} files, using {:d} workers".format(len(file_paths), len(file_paths)))
+			number_of_workers = len(file_paths)
+
+		def free_address() -> str:
+			with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+				s.bind(("localhost", 0))
+				return "localhost:{:d}".format(s.getsockname()[1])
+
+		cluster = {
+			"ps": [free_address()],
+			"chief": [free_address()],
+			"worker": [free_address() for _ in range(number_of_workers - 1)]
+		}
+
+		tasks = [("ps", 0, [])]
+		for i in range(number_of_workers):
+			task = ("chief", 0) if i == 0 else ("worker", i - 1)
+			tasks.append(task + (file_paths[i::number_of_workers],))
+
+		# Processes are spawned, so they don't inherit TensorFlow state of this process
+		context = mp.get_context("spawn")
+		processes = {}
+
+		for task_type, task_index, task_file_paths in tasks:
+			tf_config = {
+				"cluster": cluster,
+				"task": {"type": task_type, "index": task_index}
+			}
+
+			p = context.Process(
+				target=ModelTrainer._cluster_task,
+				args=(
+					tf_config,
+					self.model_dir,
+					self.dataset_base_path,
+					self.dataset_name,
+					self.parameters,
+					self.number_of_senses,
+					task_file_paths,
+					compression_type,
+					epochs,
+					batch_size,
+					number_of_workers
+				)
+			)
+			p.start()
+			processes[(task_type, task_index)] = p
+
+		# Parameter servers never stop by themselves, a failed task would leave the others waiting for it
+		while any(p.is_alive() for task, p in processes.items() if task[0] != "ps"):
+			if any(p.exitcode not in (None, 0) for p in processes.values()):
+				break
+
+			time.sleep(1.0)
+
+		for p in processes.values():
+			if p.is_alive():
+				p.terminate()
+			p.join()
+
+		failed_tasks = [task for task, p in processes.items() if task[0] != "ps" and p.exitcode != 0]
+		if len(failed_tasks) > 0:
+			raise RuntimeError("Training failed in tasks: {}".format(failed_tasks))
+
+	@staticmethod
+	def _cluster_task(
+			tf_config: dict,
+			model_dir: str,
+			dataset_base_path: str,
+			dataset_name: str,
+			parameters: Dict[str, any],
+			number_of_senses: int,
+			file_paths: List[str],
+			compression_type: str,
+			epochs: int,
+			batch_size: int,
+			number_of_workers: int
+	):
+		os.environ["TF_CONFIG"] = json.dumps(tf_config)
+		task_type = tf_config["task"]["type"]
+		task_index = tf_config["task"]["index"]
+
+		# Workers exit when their files are done, so sessions must only connect to the parameter server
+		trainer = ModelTrainer(
+			model_dir,
+			dataset_base_path,
+			dataset_name,
+			parameters,
+			number_of_senses=number_of_senses,
+			session_threads=None if task_type == "ps" else 1,
+			device_filters=["/job:ps", "/job:{}/task:{:d}".format(task_type, task_index)]
+		)
 
 		def input_fn():
-			return file_input_fn(file_pattern=file_pattern, epochs=1, batch_size=256, shuffle=False)
+			return file_input_fn(
+				file_pattern=file_paths,
+				epochs=epochs,
+				batch_size=batch_size,
+				shuffle=True,
+				pipeline=trainer.input_pipeline,
+				compression_type=compression_type
+			)
+
+		hooks = []
+		if task_type != "ps" and number_of_workers > 1:
+			hooks.append(WorkersDoneHook(is_chief=task_type == "chief", number_of_workers=number_of_workers))
+
+		if task_type == "chief":
+			# Replaces the default saver hook of the estimator, which ends before the hooks of the train spec
+			hooks.append(tf.train.CheckpointSaverHook(model_dir, save_secs=trainer.estimator.config.save_checkpoints_secs))
+
+		# Only starts the servers and trains, there is no evaluator task
+		tf.estimator.train_and_evaluate(
+			trainer.estimator,
+			train_spec=tf.estimator.TrainSpec(input_fn=input_fn, hooks=hooks),
+			eval_spec=tf.estimator.EvalSpec(input_fn=input_fn)
+		)
+
+	def test(self, dataset_name: str, batch_size: int = 256, cache: bool = False) -> dict:
+		"""
+		:param batch_size: Evaluation batch size. Larger batches need fewer session runs.
+		:param cache: Keep the serialized examples in memory after the first call, so repeated evaluations of the same
+			dataset do not read and decompress its files again.
+		"""
+		if cache:
+			if dataset_name not in self.cached_examples:
+				self.cached_examples[dataset_name] = list(self._serialized_examples(dataset_name))
+
+			examples = self.cached_examples[dataset_name]
+
+			def input_fn():
+				return memory_input_fn(examples, batch_size=batch_size)
+		else:
+			input_fn = self._input_fn(dataset_name, epochs=1, batch_size=batch_size, shuffle=False)
 
 		results = self.estimator.evaluate(input_fn=input_fn, name=dataset_name)
 
@@ -102,7 +450,19 @@ class ModelTrainer:
 
 
 class TrainJob:
-	def __init__(self, dataset_name: str, model_name: str, params: dict, epochs: int, batch_size: int, train_sets: List[str], test_sets: List[str]):
+	def __init__(
+			self,
+			dataset_name: str,
+			model_name: str,
+			params: dict,
+			epochs: int,
+			batch_size: int,
+			train_sets: List[str],
+			test_sets: List[str],
+			number_of_workers: int = 1,
+			cores: int = None,
+			memory_gb: float = 0.0
+	):
 		self.dataset_name = dataset_name
 		self.model_name = model_name
 		self.params = params
@@ -110,17 +470,27 @@ class TrainJob:
 		self.batch_size = batch_size
 		self.train_sets = train_sets
 		self.test_sets = test_sets
+		self.number_of_workers = number_of_workers
+		self.cores = cores
+		self.memory_gb = memory_gb
 
-	def run(self, job_runner: "TrainJobRunner"):
+	def run(self, job_runner: "TrainJobRunner") -> dict:
 		model_dir = os.path.join(job_runner.models_dir, self.model_name)
-		trainer = ModelTrainer(model_dir, job_runner.dataset_base_path, self.dataset_name, self.params)
+		trainer = ModelTrainer(
+			model_dir,
+			job_runner.dataset_base_path,
+			self.dataset_name,
+			self.params,
+			session_threads=self.cores,
+			batch_size=self.batch_size
+		)
 
 		if len(self.train_sets) > 0:
 			train_duration = 0.0
 			for train_set in self.train_sets:
 				print(("\033[0;34m" + "[{}-{}]" + "\033[m" + " Starting training...").format(self.model_name, train_set))
 				train_start_time = datetime.datetime.now()
-				trainer.train(train_set, self.epochs, self.batch_size)
+				trainer.train(train_set, self.epochs, self.batch_size, self.number_of_workers)
 				train_duration += (datetime.datetime.now() - train_start_time).total_seconds()
 		else:
 			train_duration = None
@@ -147,15 +517,30 @@ class TrainJob:
 				"params": self.params,
 				"epochs": self.epochs,
 				"batch_size": self.batch_size,
+				"number_of_workers": self.number_of_workers,
 				"results": all_results
 			}
 
 			with open(os.path.join(final_model_path, "info.json"), "w") as f:
 				json.dump(info_dict, f)
 
+		return {"train_duration": train_duration, "results": all_results}
+
 
 class AutoTrainJob:
-	def __init__(self, dataset_name: str, model_name: str, params: dict, target: Dict[str, any], batch_size: int, train_sets: List[str], test_sets: List[str]):
+	def __init__(
+			self,
+			dataset_name: str,
+			model_name: str,
+			params: dict,
+			target: Dict[str, any],
+			batch_size: int,
+			train_sets: List[str],
+			test_sets: List[str],
+			number_of_workers: int = 1,
+			cores: int = None,
+			memory_gb: float = 0.0
+	):
 		self.dataset_name = dataset_name
 		self.model_name = model_name
 		self.params = params
@@ -165,16 +550,29 @@ class AutoTrainJob:
 		self.end_if_slope_less_than = target["end_if_slope_less_than"]
 		self.epochs_to_avg_over = target.get("epochs_to_avg_over", 1)
 		self.test_after_epochs = target["test_after_epochs"]
+		self.cache_eval_data = target.get("cache_eval_data", False)
+		self.eval_batch_size = target.get("eval_batch_size", 256)
+		self.export_only_on_improvement = target.get("export_only_on_improvement", False)
 
 		assert self.epochs_to_avg_over >= 1
 
 		self.batch_size = batch_size
 		self.train_sets = train_sets
 		self.test_sets = test_sets
+		self.number_of_workers = number_of_workers
+		self.cores = cores
+		self.memory_gb = memory_gb
 
-	def run(self, job_runner: "TrainJobRunner"):
+	def run(self, job_runner: "TrainJobRunner") -> dict:
 		model_dir = os.path.join(job_runner.models_dir, self.model_name)
-		trainer = ModelTrainer(model_dir, job_runner.dataset_base_path, self.dataset_name, self.params)
+		trainer = ModelTrainer(
+			model_dir,
+			job_runner.dataset_base_path,
+			self.dataset_name,
+			self.params,
+			session_threads=self.cores,
+			batch_size=self.batch_size
+		)
 
 		assert len(self.train_sets) > 0
 		assert len(self.test_sets) > 0
@@ -185,6 +583,8 @@ class AutoTrainJob:
 		for test_set in self.test_sets:
 			metric_history[test_set] = []
 
+		best_metric = None  # of first test set
+
 		while max_avg_slope is None or max_avg_slope >= self.end_if_slope_less_than:
 			max_avg_slope = None
 
@@ -192,14 +592,14 @@ class AutoTrainJob:
 			for train_set in self.train_sets:
 				print(("\033[0;34m" + "[{}-{}]" + "\033[m" + " Starting training...").format(self.model_name, train_set))
 				train_start_time = datetime.datetime.now()
-				trainer.train(train_set, self.test_after_epochs, self.batch_size)
+				trainer.train(train_set, self.test_after_epochs, self.batch_size, self.number_of_workers)
 				train_duration += (datetime.datetime.now() - train_start_time).total_seconds()
 
 			all_results = {}
 			for test_set in self.test_sets:
 				print(("\033[0;34m" + "[{}-{}]" + "\033[m" + " Starting test...").format(self.model_name, test_set))
 				start_time = datetime.datetime.now()
-				results = trainer.test(test_set)
+				results = trainer.test(test_set, batch_size=self.eval_batch_size, cache=self.cache_eval_data)
 				results["duration"] = (datetime.datetime.now() - start_time).total_seconds()
 
 				all_results[test_set] = results
@@ -223,7 +623,17 @@ class AutoTrainJob:
 
 				print(("\033[0;34m" + "[{}-{}]" + "\033[m" + " results = {}").format(self.model_name, test_set, results))
 
-			if job_runner.final_models_dir is not None:
+			metric = all_results[self.test_sets[0]][self.metric_key] * (-1.0 if self.flip_sign_of_metric else 1.0)
+			improved = best_metric is None or metric > best_metric
+			if improved:
+				best_metric = metric
+
+			if self.export_only_on_improvement and not improved:
+				print(("\033[0;34m" + "[{}]" + "\033[m" + " No improvement on {}, not exporting").format(
+					self.model_name,
+					self.test_sets[0]
+				))
+			elif job_runner.final_models_dir is not None:
 				final_model_path = trainer.export(job_runner.final_models_dir)
 				final_model_path = final_model_path.decode("utf8")
 
@@ -234,22 +644,60 @@ class AutoTrainJob:
 					"params": self.params,
 					"epochs": self.test_after_epochs,
 					"batch_size": self.batch_size,
+					"number_of_workers": self.number_of_workers,
 					"results": all_results
 				}
 
 				with open(os.path.join(final_model_path, "info.json"), "w") as f:
 					json.dump(info_dict, f)
 
+		return {"train_duration": train_duration, "results": all_results}
+
 
 class TrainJobRunner:
 	"""
 	Class for loading and running train and test jobs. Not intented for use outside of CLI script.
+
+	With `max_parallel_jobs` > 1, jobs run concurrently in separate processes. A job starts when enough cores and
+	memory of the budget are free. Jobs are charged the cores and memory they declare; a job that trains on a local
+	cluster is charged at least one core per process it starts. Memory is not measured while a job runs, so the
+	memory budget only holds if jobs declare their peak usage. Jobs that do not fit into the whole budget are rejected
+	before any job starts. Jobs start strictly in queue order, so a large job is never overtaken by smaller jobs
+	behind it. Jobs that share a model name, and therefore a model directory, never run at the same time; they
+	run one after another in queue order.
+
+	The status of every job is saved to a state file, keyed by the position of the job in the queue and its model
+	name. When an interrupted run is restarted, finished jobs are skipped and all other jobs run again from the start.
+	They restore their last checkpoint but still train their full number of epochs on top of it, so an interrupted job
+	ends up trained for more epochs than configured.
 	"""
 
-	def __init__(self, dataset_base_path: str, models_dir: str, final_models_dir: str):
+	def __init__(
+			self,
+			dataset_base_path: str,
+			models_dir: str,
+			final_models_dir: str,
+			max_parallel_jobs: int = 1,
+			total_cores: int = None,
+			total_memory_gb: float = None,
+			state_path: str = None
+	):
+		"""
+		:param dataset_base_path: Path to output folder of ned-wiki-export
+		:param models_dir: Path to folder containing models
+		:param final_models_dir: Path to output folder for exported models or None
+		:param max_parallel_jobs: Maximum number of concurrent jobs
+		:param total_cores: Core budget. Defaults to the number of CPU cores.
+		:param total_memory_gb: Memory budget. None disables the memory limit.
+		:param state_path: Path to JSON file with job states. Defaults to 'jobs_state.json' in models_dir.
+		"""
 		self.dataset_base_path = dataset_base_path
 		self.models_dir = models_dir
 		self.final_models_dir = final_models_dir
+		self.max_parallel_jobs = max_parallel_jobs
+		self.total_cores = total_cores if total_cores is not None else os.cpu_count()
+		self.total_memory_gb = total_memory_gb
+		self.state_path = state_path if state_path is not None else os.path.join(models_dir, "jobs_state.json")
 
 		self.jobs = []
 
@@ -271,7 +719,10 @@ class TrainJobRunner:
 					target=target,
 					batch_size=job_dict["batch_size"],
 					train_sets=job_dict.get("train_sets", ["train"]),
-					test_sets=job_dict.get("test_sets", ["dev", "test"])
+					test_sets=job_dict.get("test_sets", ["dev", "test"]),
+					number_of_workers=job_dict.get("number_of_workers", 1),
+					cores=job_dict.get("cores", None),
+					memory_gb=job_dict.get("memory_gb", 0.0)
 				)
 			else:
 				job = TrainJob(
@@ -281,17 +732,234 @@ class TrainJobRunner:
 					epochs=job_dict["epochs"],
 					batch_size=job_dict["batch_size"],
 					train_sets=job_dict.get("train_sets", ["train"]),
-					test_sets=job_dict.get("test_sets", ["dev", "test"])
+					test_sets=job_dict.get("test_sets", ["dev", "test"]),
+					number_of_workers=job_dict.get("number_of_workers", 1),
+					cores=job_dict.get("cores", None),
+					memory_gb=job_dict.get("memory_gb", 0.0)
 				)
 
 			self.add_job(job)
 
+	def _load_state(self) -> Dict[str, dict]:
+		if os.path.exists(self.state_path):
+			with open(self.state_path, "r") as f:
+				return json.load(f)
+
+		return {}
+
+	def _save_state(self, state: Dict[str, dict]):
+		os.makedirs(os.path.dirname(os.path.abspath(self.state_path)), exist_ok=True)
+
+		temp_path = self.state_path + ".tmp"
+		with open(temp_path, "w") as f:
+			json.dump(state, f, indent="\t")
+		os.replace(temp_path, self.state_path)
+
+	@staticmethod
+	def _job_key(index: int, job) -> str:
+		return "{:d}:{}".format(index, job.model_name)
+
+	def _job_cores(self, job) -> int:
+		if job.cores is not None:
+			cores = job.cores
+		else:
+			cores = max(self.total_cores // self.max_parallel_jobs, 1)
+
+		if job.number_of_workers > 1:
+			# Each worker and the parameter server run in their own process
+			cores = max(cores, job.number_of_workers + 1)
+
+		return cores
+
 	def run(self):
-		while len(self.jobs) > 0:
-			job = self.jobs.pop(0)
+		state = self._load_state()
+
+		pending_jobs = []
+		for index, job in enumerate(self.jobs):
+			job_key = self._job_key(index, job)
+			status = state.get(job_key, {}).get("status", None)
+
+			if status == "done":
+				print("\033[0;34m" + "=>" + "\033[m" + " Skipping finished job {}".format(job_key))
+			else:
+				if status in ("running", "failed"):
+					print("\033[0;33m" + "=>" + "\033[m" + " Job {} was interrupted and trains all its epochs again".format(job_key))
+
+				state[job_key] = {"status": "pending"}
+				pending_jobs.append((job_key, job))
 
-			print("\033[0;34m" + "=>" + "\033[m" + " Starting job for model '{}'...".format(job.model_name))
+		self.jobs = []
+		self._save_state(state)
+
+		if self.max_parallel_jobs > 1:
+			self._run_parallel(pending_jobs, state)
+		else:
+			for job_key, job in pending_jobs:
+				print("\033[0;34m" + "=>" + "\033[m" + " Starting job {}...".format(job_key))
 
-			job.run(job_runner=self)
+				state[job_key] = {"status": "running", "start_time": datetime.datetime.now().isoformat()}
+				self._save_state(state)
 
-			print("\033[0;34m" + "=>" + "\033[m" + " Job for model '{}' done!".format(job.model_name))
+				start_time = datetime.datetime.now()
+				job_result = job.run(job_runner=self)
+
+				state[job_key].update(job_result)
+				state[job_key]["status"] = "done"
+				state[job_key]["duration"] = (datetime.datetime.now() - start_time).total_seconds()
+				self._save_state(state)
+
+				print("\033[0;34m" + "=>" + "\033[m" + " Job {} done!".format(job_key))
+
+		self._write_summary(state)
+
+	def _run_parallel(self, pending_jobs: List[tuple], state: Dict[str, dict]):
+		context = mp.get_context("spawn")
+		result_queue = context.Queue()
+
+		# Only configuration is passed to job processes
+		job_runner = TrainJobRunner(self.dataset_base_path, self.models_dir, self.final_models_dir)
+
+		for job_key, job in pending_jobs:
+			if self._job_cores(job) > self.total_cores:
+				raise ValueError("Job {} needs {:d} cores, but the budget is {:d} cores".format(
+					job_key,
+					self._job_cores(job),
+					self.total_cores
+				))
+
+			if self.total_memory_gb is not None and job.memory_gb > self.total_memory_gb:
+				raise ValueError("Job {} needs {:.1f} GB, but the budget is {:.1f} GB".format(
+					job_key,
+					job.memory_gb,
+					self.total_memory_gb
+				))
+
+		running = {}  # job key -> (process, job, cores)
+		free_cores = self.total_cores
+		free_memory_gb = self.total_memory_gb
+
+		while len(pending_jobs) > 0 or len(running) > 0:
+			# Start jobs in queue order while resources are available
+			while len(pending_jobs) > 0 and len(running) < self.max_parallel_jobs:
+				job_key, job = pending_jobs[0]
+				cores = self._job_cores(job)
+
+				fits_cores = cores <= free_cores
+				fits_memory = free_memory_gb is None or job.memory_gb <= free_memory_gb
+				# Jobs of the same model share a checkpoint directory
+				model_dir_free = all(job.model_name != running_job.model_name for _, running_job, _ in running.values())
+				if not (fits_cores and fits_memory and model_dir_free):
+					break
+
+				pending_jobs.pop(0)
+				job.cores = cores
+
+				p = context.Process(
+					target=TrainJobRunner._job_task,
+					args=(job_key, job, job_runner, result_queue)
+				)
+				p.start()
+
+				running[job_key] = (p, job, cores)
+				free_cores -= cores
+				if free_memory_gb is not None:
+					free_memory_gb -= job.memory_gb
+
+				state[job_key] = {
+					"status": "running",
+					"start_time": datetime.datetime.now().isoformat(),
+					"cores": cores
+				}
+				self._save_state(state)
+
+				print("\033[0;34m" + "=>" + "\033[m" + " Started job {} with {:d} cores (PID {:d})".format(
+					job_key,
+					cores,
+					p.pid
+				))
+
+			try:
+				job_key, job_result, duration = result_queue.get(timeout=10)
+			except queue.Empty:
+				# Processes killed without reporting a result
+				crashed = [job_key for job_key, (p, _, _) in running.items() if p.exitcode not in (None, 0)]
+				if len(crashed) == 0:
+					continue
+
+				job_key = crashed[0]
+				job_result = None
+				duration = None
+
+			p, job, cores = running.pop(job_key)
+			p.join()
+
+			free_cores += cores
+			if free_memory_gb is not None:
+				free_memory_gb += job.memory_gb
+
+			if job_result is not None:
+				state[job_key].update(job_result)
+				state[job_key]["status"] = "done"
+				print("\033[0;34m" + "=>" + "\033[m" + " Job {} done!".format(job_key))
+			else:
+				state[job_key]["status"] = "failed"
+				print("\033[0;31m" + "=>" + "\033[m" + " Job {} failed!".format(job_key))
+
+			state[job_key]["duration"] = duration
+			self._save_state(state)
+
+	@staticmethod
+	def _job_task(job_key: str, job, job_runner: "TrainJobRunner", result_queue: mp.Queue):
+		start_time = datetime.datetime.now()
+
+		try:
+			job_result = job.run(job_runner=job_runner)
+		except Exception:
+			traceback.print_exc()
+			job_result = None
+
+		result_queue.put((job_key, job_result, (datetime.datetime.now() - start_time).total_seconds()))
+
+	def _write_summary(self, state: Dict[str, dict]):
+		"""
+		Prints a table of status, duration and test results of all jobs and writes it to 'jobs_summary.tsv' next to the
+		state file.
+		"""
+		metric_columns = []
+		for job_state in state.values():
+			for test_set, results in (job_state.get("results", None) or {}).items():
+				for key, value in results.items():
+					column = test_set + "." + key
+					if isinstance(value, (int, float)) and key != "duration" and column not in metric_columns:
+						metric_columns.append(column)
+
+		rows = []
+		for job_key, job_state in state.items():
+			results = job_state.get("results", None) or {}
+
+			row = [
+				job_key,
+				job_state.get("status", ""),
+				"{:.1f}".format(job_state["duration"] / 60.0) if job_state.get("duration", None) is not None else "",
+				"{:.1f}".format(job_state["train_duration"] / 60.0) if job_state.get("train_duration", None) is not None else ""
+			]
+
+			for column in metric_columns:
+				test_set, key = column.split(".", 1)
+				value = results.get(test_set, {}).get(key, None)
+				row.append("{:.4f}".format(value) if value is not None else "")
+
+			rows.append(row)
+
+		header = ["job", "status", "duration_min", "train_duration_min"] + metric_columns
+
+		summary_path = os.path.join(os.path.dirname(os.path.abspath(self.state_path)), "jobs_summary.tsv")
+		with open(summary_path, "w") as f:
+			for row in [header] + rows:
+				f.write("\t".join(row) + "\n")
+
+		widths = [max(len(row[i]) for row in [header] + rows) for i in range(len(header))]
+
+		print("")
+		for row in [header] + rows:
+			print("  ".join(value.ljust(width) for value, width in zip(row, widths)))
@@ -1,3 +1,4 @@
 from .extractor import WikiExtractor
 from .prepare import WikiConverter
+from .categories import CategoryGraph
 from .export import ExampleExporter
\ No newline at end of file
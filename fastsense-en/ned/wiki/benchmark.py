@@ -0,0 +1,92 @@
+import gzip
+import time
+from typing import Callable, List
+
+from . import utils
+
+
+def _time_calls(function: Callable, values: list) -> float:
+	start_time = time.perf_counter()
+	for value in values:
+		function(value)
+	return time.perf_counter() - start_time
+
+
+def _time_batch(function: Callable, values: list) -> float:
+	start_time = time.perf_counter()
+	function(values)
+	return time.perf_counter() - start_time
+
+
+def _print_result(name: str, count: int, duration: float, baseline_duration: float):
+	print("  {:<24} {:>12,.0f} titles/s  {:>6.2f}x".format(
+		name,
+		count / duration if duration > 0 else 0.0,
+		baseline_duration / duration if duration > 0 else 0.0
+	))
+
+
+def _read_link_titles(links_path: str, sample_size: int) -> (List[str], List[str]):
+	"""
+	Reads linked article titles and link texts of the first `sample_size` links of links.gz (see WikiConverter).
+	"""
+	linked_articles = []
+	link_titles = []
+
+	with gzip.open(links_path, "rt", encoding="utf8") as f:
+		for line in f:
+			if len(link_titles) >= sample_size:
+				break
+
+			columns = line[:-1].split("\t")
+			linked_articles.append(columns[6])
+			link_titles.append(columns[8])
+
+	return linked_articles, link_titles
+
+
+def benchmark_title_normalization(links_path: str, sample_size: int = 1000000):
+	"""
+	Compares uncached, cached, and batch title normalization on a sample of real link titles.
+
+	:param links_path: Path to links.gz in intermediate output of ned-wiki-prepare
+	:param sample_size: Number of links to read
+	"""
+	print("Reading link titles...")
+	linked_articles, link_titles = _read_link_titles(links_path, sample_size)
+
+	print("{:,d} links, {:,d} distinct link titles, {:,d} distinct linked articles".format(
+		len(link_titles),
+		len(set(link_titles)),
+		len(set(linked_articles))
+	))
+
+	benchmarks = [
+		("group_title", link_titles, utils._group_title, utils.group_title, utils.group_titles),
+		("normalize_page_title", linked_articles, utils._normalize_page_title, utils.normalize_page_title, utils.normalize_page_titles)
+	]
+
+	for name, titles, cached_function, function, batch_function in benchmarks:
+		print("")
+		print(name + ":")
+
+		baseline_duration = _time_calls(cached_function.__wrapped__, titles)
+		_print_result("uncached", len(titles), baseline_duration, baseline_duration)
+
+		cached_function.cache_clear()
+		cold_duration = _time_calls(function, titles)
+		cache_info = cached_function.cache_info()
+		_print_result("cached (cold)", len(titles), cold_duration, baseline_duration)
+
+		warm_duration = _time_calls(function, titles)
+		_print_result("cached (warm)", len(titles), warm_duration, baseline_duration)
+
+		cached_function.cache_clear()
+		batch_duration = _time_batch(batch_function, titles)
+		_print_result("batch", len(titles), batch_duration, baseline_duration)
+
+		print("  cache hit rate (cold): {:.1%}, cache entries: {:,d} / {:,d}".format(
+			cache_info.hits / max(cache_info.hits + cache_info.misses, 1),
+			cache_info.currsize,
+			cache_info.maxsize
+		))
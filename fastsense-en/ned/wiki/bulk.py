@@ -0,0 +1,165 @@
+import re
+import sqlite3
+import time
+import numpy as np
+from typing import List
+
+
+class BulkWriter:
+	"""
+	Loads large amounts of rows into an sqlite database.
+
+	Rows for the same insert statement are coalesced into large `executemany` batches, the connection is tuned for
+	bulk loading (big page cache, memory-mapped I/O, and by default no journal and no syncing), and index creation is
+	deferred until all rows are loaded. Without journal, a crash during the load may leave the database corrupt, so
+	only disable it for databases that are rebuilt from scratch anyway.
+	"""
+
+	INSERT_TABLE_PATTERN = re.compile(r"^\s*insert\s+(?:or\s+\w+\s+)?into\s+['\"`\[]?([^\s'\"`\]()]+)", re.IGNORECASE)
+	CREATE_INDEX_PATTERN = re.compile(r"^\s*create\s+(?:unique\s+)?index\s", re.IGNORECASE)
+
+	def __init__(self, conn: sqlite3.Connection, batch_size: int = 50000, cache_size_mb: int = 2048, mmap_size_mb: int = 8192, disable_journal: bool = True, print_report: bool = True):
+		"""
+		:param conn: sqlite3 connection. Will be committed, but not closed, by `close`.
+		:param batch_size: Number of rows per `executemany` call.
+		:param cache_size_mb: Size of sqlite page cache during the load.
+		:param mmap_size_mb: Maximum size of memory-mapped I/O during the load.
+		:param disable_journal: Turn off journal and syncing during the load.
+		:param print_report: Print rows/sec per table when closing.
+		"""
+		self.conn = conn
+		self.cursor = conn.cursor()
+		self.batch_size = batch_size
+		self.disable_journal = disable_journal
+		self.print_report = print_report
+
+		self.buffers = {}  # sql -> list of rows
+		self.deferred_statements = []  # index creation
+		self.table_stats = {}  # table name -> [row count, seconds spent in executemany]
+
+		if disable_journal:
+			self.cursor.execute("PRAGMA journal_mode = OFF")
+			self.cursor.execute("PRAGMA synchronous = OFF")
+
+		self.cursor.execute("PRAGMA temp_store = MEMORY")
+		self.cursor.execute("PRAGMA cache_size = {:d}".format(-cache_size_mb * 1024))  # negative value is in KiB
+		self.cursor.execute("PRAGMA mmap_size = {:d}".format(mmap_size_mb * 1024 * 1024))
+
+		self.start_time = time.time()
+
+	def execute(self, sql: str, parameters: tuple = ()):
+		"""
+		Executes a single statement. Pending rows are written first. Index creation is deferred until `close`.
+		"""
+		if self.CREATE_INDEX_PATTERN.match(sql) is not None:
+			self.deferred_statements.append((sql, parameters))
+			return
+
+		self.flush()
+		self.cursor.execute(sql, parameters)
+
+	def insert(self, sql: str, rows: List[tuple]):
+		"""
+		Buffers rows for an insert statement and writes them once the batch is full.
+		"""
+		buffer = self.buffers.get(sql, None)
+		if buffer is None:
+			buffer = []
+			self.buffers[sql] = buffer
+
+		buffer.extend(rows)
+
+		if len(buffer) >= self.batch_size:
+			self._write(sql, buffer)
+			buffer.clear()
+
+	def flush(self):
+		for sql, buffer in self.buffers.items():
+			if len(buffer) > 0:
+				self._write(sql, buffer)
+				buffer.clear()
+
+	def _write(self, sql: str, rows: List[tuple]):
+		table_match = self.INSERT_TABLE_PATTERN.match(sql)
+		table_name = table_match.group(1) if table_match is not None else sql
+
+		start_time = time.time()
+		self.cursor.executemany(sql, rows)
+		duration = time.time() - start_time
+
+		stats = self.table_stats.get(table_name, None)
+		if stats is None:
+			stats = [0, 0.0]
+			self.table_stats[table_name] = stats
+
+		stats[0] += len(rows)
+		stats[1] += duration
+
+	def close(self):
+		"""
+		Writes pending rows, creates deferred indexes, commits, and restores default settings of the connection.
+		"""
+		self.flush()
+
+		index_start_time = time.time()
+		for sql, parameters in self.deferred_statements:
+			self.cursor.execute(sql, parameters)
+		index_duration = time.time() - index_start_time
+		self.deferred_statements = []
+
+		self.conn.commit()
+
+		if self.disable_journal:
+			self.cursor.execute("PRAGMA journal_mode = DELETE")
+			self.cursor.execute("PRAGMA synchronous = FULL")
+
+		self.cursor.execute("PRAGMA mmap_size = 0")
+
+		# The pragma returns a row, closing the cursor finishes the statement, so e.g. VACUUM can run afterwards
+		self.cursor.close()
+
+		if self.print_report:
+			self.report(index_duration)
+
+	def report(self, index_duration: float = 0.0):
+		total_duration = time.time() - self.start_time
+
+		print("Bulk load finished after {:.1f} s (index creation: {:.1f} s):".format(total_duration, index_duration))
+		for table_name, (row_count, duration) in sorted(self.table_stats.items()):
+			print("  {}: {:,d} rows, {:,.0f} rows/s (write time {:.1f} s)".format(
+				table_name,
+				row_count,
+				row_count / duration if duration > 0 else 0.0,
+				duration
+			))
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_val, exc_tb):
+		if exc_type is None:
+			self.close()
+		return False
+
+
+def fetch_array(conn: sqlite3.Connection, sql: str, column_count: int, dtype=np.int64, parameters: tuple = (), chunk_size: int = 1000000) -> np.ndarray:
+	"""
+	Reads the result of a query into a 2D NumPy array. Rows are fetched in chunks, so the full result never exists as
+	a list of Python tuples. Columns must not contain NULL values (use ifnull).
+
+	:return: Array of shape [row count, column_count]
+	"""
+	cursor = conn.execute(sql, parameters)
+
+	chunks = []
+	while True:
+		rows = cursor.fetchmany(chunk_size)
+		if len(rows) == 0:
+			break
+
+		chunks.append(np.array(rows, dtype=dtype).reshape(-1, column_count))
+
+	if len(chunks) == 0:
+		return np.zeros((0, column_count), dtype=dtype)
+
+	return np.concatenate(chunks)
@@ -0,0 +1,123 @@
+import sqlite3
+import numpy as np
+from typing import Iterable
+
+from .bulk import fetch_array
+
+
+class CategoryGraph:
+	"""
+	Wikipedia category graph in compressed sparse row (CSR) form. Loaded from the 'subcategories' and
+	'article_categories' tables created by `WikiConverter.update_disambig_page_flags`.
+
+	Categories are mapped to dense indexes. For every category, its subcategories and its articles are stored as
+	contiguous ranges of a target array, so whole BFS frontiers can be expanded with a few NumPy operations.
+	"""
+
+	def __init__(self, subcategory_edges: np.ndarray, article_category_edges: np.ndarray):
+		"""
+		:param subcategory_edges: Array of shape [n, 2] with (category id, subcategory id) rows
+		:param article_category_edges: Array of shape [m, 2] with (article id, category id) rows
+		"""
+		self.category_ids = np.unique(np.concatenate([
+			subcategory_edges[:, 0],
+			subcategory_edges[:, 1],
+			article_category_edges[:, 1]
+		]))  # category index -> category id
+
+		category_count = len(self.category_ids)
+
+		self.subcategory_offsets, self.subcategory_targets = self._build_csr(
+			np.searchsorted(self.category_ids, subcategory_edges[:, 0]),
+			np.searchsorted(self.category_ids, subcategory_edges[:, 1]),
+			category_count
+		)  # targets are category indexes
+
+		self.article_offsets, self.article_targets = self._build_csr(
+			np.searchsorted(self.category_ids, article_category_edges[:, 1]),
+			article_category_edges[:, 0],
+			category_count
+		)  # targets are article ids
+
+	@staticmethod
+	def load(conn: sqlite3.Connection) -> "CategoryGraph":
+		subcategory_edges = fetch_array(conn, "SELECT category_id, subcategory_id FROM subcategories", 2)
+		article_category_edges = fetch_array(conn, "SELECT article_id, category_id FROM article_categories", 2)
+
+		return CategoryGraph(subcategory_edges, article_category_edges)
+
+	@staticmethod
+	def _build_csr(sources: np.ndarray, targets: np.ndarray, node_count: int) -> (np.ndarray, np.ndarray):
+		order = np.argsort(sources, kind="stable")
+
+		offsets = np.zeros(node_count + 1, dtype=np.int64)
+		np.cumsum(np.bincount(sources, minlength=node_count), out=offsets[1:])
+
+		return offsets, targets[order]
+
+	@staticmethod
+	def _gather(offsets: np.ndarray, targets: np.ndarray, nodes: np.ndarray) -> np.ndarray:
+		"""
+		Returns concatenated targets of all nodes.
+		"""
+		starts = offsets[nodes]
+		lengths = offsets[nodes + 1] - starts
+
+		total_length = int(lengths.sum())
+		if total_length == 0:
+			return targets[:0]
+
+		# Position of each output element in targets: start of its range plus its offset inside the range
+		range_output_starts = np.cumsum(lengths) - lengths
+		positions = np.repeat(starts - range_output_starts, lengths) + np.arange(total_length)
+
+		return targets[positions]
+
+	def _category_indexes(self, category_ids: Iterable[int]) -> np.ndarray:
+		"""
+		Maps category ids to category indexes. Ids of categories that are not part of the graph are dropped.
+		"""
+		category_ids = np.asarray(list(category_ids), dtype=np.int64)
+		if len(self.category_ids) == 0 or len(category_ids) == 0:
+			return np.zeros(0, dtype=np.int64)
+
+		indexes = np.minimum(np.searchsorted(self.category_ids, category_ids), len(self.category_ids) - 1)
+		return np.unique(indexes[self.category_ids[indexes] == category_ids])
+
+	def category_closure(self, root_category_ids: Iterable[int]) -> np.ndarray:
+		"""
+		Returns the given categories and all their direct and indirect subcategories. Cycles in the category graph
+		are handled, every category is visited once.
+
+		:param root_category_ids: Category ids
+		:return: Sorted array of category ids
+		"""
+		visited = np.zeros(len(self.category_ids), dtype=bool)
+
+		frontier = self._category_indexes(root_category_ids)
+		visited[frontier] = True
+
+		while len(frontier) > 0:
+			children = np.unique(self._gather(self.subcategory_offsets, self.subcategory_targets, frontier))
+			frontier = children[~visited[children]]
+			visited[frontier] = True
+
+		return self.category_ids[visited]
+
+	def articles_in_categories(self, category_ids: Iterable[int]) -> np.ndarray:
+		"""
+		Returns articles directly contained in the given categories.
+
+		:param category_ids: Category ids
+		:return: Sorted array of unique article ids
+		"""
+		return np.unique(self._gather(self.article_offsets, self.article_targets, self._category_indexes(category_ids)))
+
+	def articles_in_category_tree(self, root_category_ids: Iterable[int]) -> np.ndarray:
+		"""
+		Returns articles contained in the given categories or any of their subcategories.
+
+		:param root_category_ids: Category ids
+		:return: Sorted array of unique article ids
+		"""
+		return self.articles_in_categories(self.category_closure(root_category_ids))
@@ -1,14 +1,82 @@
 import sqlite3
 import gzip
+import heapq
 import multiprocessing as mp
 import os
-from typing import List, Dict
+import numpy as np
+from typing import List, Dict, Iterator, Optional
 
-from ..data import DataDescriptor, ExampleWriter
+from ..data import DataDescriptor, ExampleWriter, NormalizedExampleWriter
+from ..storage import Storage
 from ..token import Token
+from .bulk import BulkWriter, fetch_array
 from .utils import normalize_section_title
 
 
+class PossibleSenses:
+	"""
+	Possible senses of all sense groups in compressed sparse row form: the senses of group g are
+	sense_ids[offsets[g]:offsets[g + 1]]. Both arrays live in shared memory (multiprocessing.RawArray), so forked worker
+	processes read them without copies or pickling.
+	"""
+
+	def __init__(self, offsets: np.ndarray, sense_ids: np.ndarray):
+		"""
+		:param offsets: Array of shape [number of groups + 1]
+		:param sense_ids: Array of shape [number of group senses], sorted ascending within each group
+		"""
+		self.shared_offsets = mp.RawArray("q", len(offsets))
+		self.shared_sense_ids = mp.RawArray("i", max(len(sense_ids), 1))
+
+		self._create_views()
+		self.offsets[:] = offsets
+		self.sense_ids[:len(sense_ids)] = sense_ids
+		self.sense_ids = self.sense_ids[:len(sense_ids)]
+
+	def _create_views(self):
+		self.offsets = np.frombuffer(self.shared_offsets, dtype=np.int64)
+		self.sense_ids = np.frombuffer(self.shared_sense_ids, dtype=np.int32)[:len(self.shared_sense_ids)]
+
+	def __getstate__(self):
+		return {"shared_offsets": self.shared_offsets, "shared_sense_ids": self.shared_sense_ids, "sense_count": len(self.sense_ids)}
+
+	def __setstate__(self, state):
+		self.shared_offsets = state["shared_offsets"]
+		self.shared_sense_ids = state["shared_sense_ids"]
+		self._create_views()
+		self.sense_ids = self.sense_ids[:state["sense_count"]]
+
+	@staticmethod
+	def load(conn) -> "PossibleSenses":
+		"""
+		Builds the arrays from the sense_group_senses table in a single pass.
+		"""
+		rows = fetch_array(conn, "select sense_group, id from sense_group_senses order by sense_group asc, id asc", 2)
+
+		group_count = int(rows[:, 0].max()) + 1 if len(rows) > 0 else 0
+
+		offsets = np.zeros(group_count + 1, dtype=np.int64)
+		np.cumsum(np.bincount(rows[:, 0], minlength=group_count), out=offsets[1:])
+
+		return PossibleSenses(offsets, rows[:, 1].astype(np.int32))
+
+	def __len__(self) -> int:
+		return len(self.offsets) - 1
+
+	def __getitem__(self, group_id: int) -> List[int]:
+		if group_id < 0 or group_id >= len(self):
+			return []
+
+		return self.sense_ids[self.offsets[group_id]:self.offsets[group_id + 1]].tolist()
+
+	def rows(self) -> Iterator[tuple]:
+		"""
+		Returns (group id, sense id) pairs.
+		"""
+		group_ids = np.repeat(np.arange(len(self), dtype=np.int64), np.diff(self.offsets))
+		return zip(group_ids.tolist(), self.sense_ids.tolist())
+
+
 class ExampleExporter:
 
 	@staticmethod
@@ -18,50 +86,62 @@ class ExampleExporter:
 			file_count: int,
 			output_path: str,
 			data_descriptors: Dict[str, DataDescriptor],
-			subset_names: Dict[int, str]
+			subset_names: Dict[int, str],
+			storage: str = "sqlite",
+			normalized: bool = False,
+			compression_type: str = "GZIP",
+			compression_level: Optional[int] = None
 	):
+		"""
+		:param storage: Engine for reading the database. One of Storage.NAMES. 'additional_data.sqlite3' is always
+			written with sqlite.
+		:param normalized: Write examples with `NormalizedExampleWriter`, which stores the tokens of each paragraph or
+			sentence only once, instead of TFRecord files.
+		:param compression_type: Compression of TFRecord files. See `ExampleWriter`.
+		:param compression_level: zlib compression level of TFRecord files. See `ExampleWriter`.
+		"""
 		os.makedirs(output_path, exist_ok=True)
 
-		in_conn = sqlite3.connect(db_path)
-		c_in = in_conn.cursor()
+		in_storage = Storage.create(storage, db_path)
+		in_conn = in_storage.connect(read_only=True)
 
-		possible_senses = {}
-		for row in c_in.execute("select sense_group, id from sense_group_senses order by sense_group asc, id asc"):
-			sense_group, sense = row
-			possible_senses[sense_group] = possible_senses.get(sense_group, []) + [sense]
+		possible_senses = PossibleSenses.load(in_conn)
 
 		out_db_path = os.path.join(output_path, "additional_data.sqlite3")
 		if os.path.exists(out_db_path):
 			print("Not writing 'additional_data.sqlite3' because file already exists!")
 		else:
 			out_conn = sqlite3.connect(out_db_path)
-			c_out = out_conn.cursor()
+			writer = BulkWriter(out_conn)
 
-			c_out.execute("""
+			writer.execute("""
 			create table "senses" (
 				"id" INTEGER PRIMARY KEY,
 				"url" TEXT
 			)
 			""")
 
-			c_out.execute("""
+			writer.execute("""
 			create table "group_titles" (
 				"id" INTEGER,
 				"title" TEXT
 			)
 			""")
 
-			c_out.execute("""
+			writer.execute("""
 			create table "possible_senses" (
 				"group_id" INTEGER,
 				"sense_id" INTEGER
 			)
 			""")
 
-			result_cursor = c_in.execute("select id, group_title from sense_groups")
-			c_out.executemany("insert into group_titles values (?, ?)", result_cursor)
+			writer.execute("""create index "group_titles_title_index" on "group_titles" ("title")""")
+			writer.execute("""create index "possible_senses_group_index" on "possible_senses" ("group_id")""")
 
-			result_cursor = c_in.execute("""
+			result_cursor = Storage.query(in_conn, "select id, group_title from sense_groups")
+			writer.insert("insert into group_titles values (?, ?)", list(result_cursor))
+
+			result_cursor = Storage.query(in_conn, """
 			select
 				G.id,
 				alternative_group_title
@@ -71,7 +151,7 @@ class ExampleExporter:
 			where
 				G.group_title = A.group_title
 			""")
-			c_out.executemany("insert into group_titles values (?, ?)", result_cursor)
+			writer.insert("insert into group_titles values (?, ?)", list(result_cursor))
 
 			query = """
 			select SGS.id, A.title, X.title
@@ -81,20 +161,18 @@ class ExampleExporter:
 			where SGS.sense = S.id
 			"""
 
-			for row in c_in.execute(query):
+			for row in Storage.query(in_conn, query):
 				label, article_title, article_section = row
 
 				article_url = "https://en.wikipedia.org/wiki/" + article_title
 				if article_section is not None:
 					article_url += "#" + normalize_section_title(article_section)
 
-				c_out.execute("insert into senses values (?,?)", (label, article_url))
+				writer.insert("insert into senses values (?,?)", [(label, article_url)])
 
-			for group_id, possible_senses_for_group in possible_senses.items():
-				values = zip([group_id] * len(possible_senses_for_group), possible_senses_for_group)
-				c_out.executemany("insert into possible_senses values (?,?)", values)
+			writer.insert("insert into possible_senses values (?,?)", list(possible_senses.rows()))
 
-			out_conn.commit()
+			writer.close()
 			out_conn.close()
 
 		in_conn.close()
@@ -128,7 +206,10 @@ class ExampleExporter:
 						os.path.join(output_path, name, subset_name),
 						subset_name,
 						data_descriptor,
-						queue
+						queue,
+						normalized,
+						compression_type,
+						compression_level
 					)
 				)
 				writer_process.start()
@@ -142,16 +223,16 @@ class ExampleExporter:
 			if len(subset_queues_sentences) > 0:
 				writer_queues_sentences[subset_index] = subset_queues_sentences
 
+		# Lets every worker stream its shard of the data table in paragraph order
+		index_conn = sqlite3.connect(db_path)
+		index_conn.execute("create index if not exists data_paragraph_index on data (article_id, section_index, paragraph_index)")
+		index_conn.commit()
+		index_conn.close()
+
 		reader_and_worker_processes = []
-		paragraph_queues = []
-		db_queues = []
 
 		for i in range(file_count):
 			paragraph_queue = mp.Queue(20000)
-			paragraph_queues.append(paragraph_queue)
-
-			db_queue = mp.Queue(10000)
-			db_queues.append(db_queue)
 
 			# files only contain tokens for articles with article_id % file_count == i
 			path = os.path.join(tokens_path, "tokens_{:d}.gz".format(i))
@@ -165,11 +246,14 @@ class ExampleExporter:
 			worker_process = mp.Process(
 				target=ExampleExporter.worker_task,
 				args=(
-					db_queue,
+					in_storage,
+					i,
+					file_count,
 					paragraph_queue,
 					writer_queues_paragraphs,
 					writer_queues_sentences,
-					possible_senses
+					possible_senses,
+					normalized
 				)
 			)
 			worker_process.start()
@@ -177,11 +261,6 @@ class ExampleExporter:
 
 			print("Worker PID", worker_process.pid)
 
-		sql_process = mp.Process(target=ExampleExporter.db_task, args=(db_path, db_queues))
-		sql_process.start()
-
-		print("DB PID", sql_process.pid)
-
 		for p in reader_and_worker_processes:
 			p.join()
 
@@ -189,13 +268,19 @@ class ExampleExporter:
 			for q in queues:
 				q.put(None)
 
-		sql_process.join()
-
 		for p in writer_processes:
 			p.join()
 
 	@staticmethod
-	def writer_task(path: str, file_prefix: str, data_descriptor: DataDescriptor, input_queue: mp.Queue):
+	def writer_task(
+			path: str,
+			file_prefix: str,
+			data_descriptor: DataDescriptor,
+			input_queue: mp.Queue,
+			normalized: bool = False,
+			compression_type: str = "GZIP",
+			compression_level: Optional[int] = None
+	):
 		def tuple_to_token(t):
 			return Token(
 				start=t[0],
@@ -207,12 +292,22 @@ class ExampleExporter:
 				after=t[6]
 			)
 
-		writer = ExampleWriter(
-			path=path,
-			file_prefix=file_prefix,
-			data_descriptor=data_descriptor,
-			number_of_workers=6
-		)
+		if normalized:
+			writer = NormalizedExampleWriter(
+				path=path,
+				file_prefix=file_prefix,
+				data_descriptor=data_descriptor,
+				number_of_workers=6
+			)
+		else:
+			writer = ExampleWriter(
+				path=path,
+				file_prefix=file_prefix,
+				data_descriptor=data_descriptor,
+				number_of_workers=6,
+				compression_type=compression_type,
+				compression_level=compression_level
+			)
 
 		with writer:
 			while True:
@@ -220,132 +315,228 @@ class ExampleExporter:
 				if example is None:
 					break
 
-				tokens, possible_senses_for_example, sense_group_sense_id = example
+				tokens, possible_senses_for_example, sense_group_sense_id, segment_key, group_id = example
 
-				if len(tokens) == 0 or len(possible_senses_for_example) == 0:
+				if (tokens is not None and len(tokens) == 0) or len(possible_senses_for_example) == 0:
 					print("Skipped empty example:", example)
 					continue
 
-				tokens = list(map(tuple_to_token, tokens))
+				if tokens is not None:
+					tokens = list(map(tuple_to_token, tokens))
+
+				if normalized:
+					writer.write(tokens, possible_senses_for_example, sense_group_sense_id, segment_key, group_id)
+				else:
+					writer.write(tokens, possible_senses_for_example, sense_group_sense_id, group_id)
+
+	# Data rows of one shard, ordered like the paragraphs in the tokens files
+	SHARD_SQL = """
+		select
+			D.article_id,
+			D.section_index,
+			D.paragraph_index,
+			D.sentence_index,
+			SGS.sense_group,
+			D.sense_group_sense_id,
+			D.dataset
+		from
+			data D,
+			sense_group_senses SGS
+		where
+			D.sense_group_sense_id = SGS.id
+			and D.article_id % ? = ?
+		order by
+			D.article_id asc,
+			D.section_index asc,
+			D.paragraph_index asc
+	"""
 
-				writer.write(tokens, possible_senses_for_example, sense_group_sense_id)
+	# Data rows of a single paragraph
+	PARAGRAPH_SQL = """
+		select
+			D.article_id,
+			D.section_index,
+			D.paragraph_index,
+			D.sentence_index,
+			SGS.sense_group,
+			D.sense_group_sense_id,
+			D.dataset
+		from
+			data D,
+			sense_group_senses SGS
+		where
+			D.sense_group_sense_id = SGS.id
+			and D.article_id = ?
+			and D.section_index = ?
+			and D.paragraph_index = ?
+	"""
 
 	@staticmethod
 	def worker_task(
-			db_queue: mp.Queue,
+			storage: Storage,
+			shard_index: int,
+			shard_count: int,
 			paragraph_queue: mp.Queue,
 			paragraph_writer_queues: Dict[int, List[mp.Queue]],
 			sentence_writer_queues: Dict[int, List[mp.Queue]],
-			possible_senses: Dict[int, List[int]]
+			possible_senses: PossibleSenses,
+			normalized: bool = False,
+			reorder_window_size: int = 10000
 	):
-		buffer = {}
-		max_paragraph_key_in_buffer = (-1, -1, -1)
-		buffer_complete = False
-
-		while True:
-			paragraph = paragraph_queue.get()
-			if paragraph is None:
-				break
+		"""
+		Merge-joins the paragraphs of one tokens file with the rows of the data table for the same articles.
 
-			p_key, p_sentences = paragraph
+		The worker streams its shard of the data table in (article_id, section_index, paragraph_index) order from its
+		own read-only connection. Paragraphs from the tokens file are almost, but not strictly, in the same order, so
+		they pass through a min-heap of at most `reorder_window_size` paragraphs. Paragraphs that arrive too late for
+		the merge are looked up individually. Memory is bounded by the window size.
+		"""
+		conn = storage.connect(read_only=True)
+		rows = Storage.query(conn, ExampleExporter.SHARD_SQL, (shard_count, shard_index))
+		lookup_conn = None  # separate connection, so lookups do not interrupt the stream
 
-			if not buffer_complete:
-				while max_paragraph_key_in_buffer <= p_key:
-					example_info = db_queue.get()
-					if example_info is None:
-						buffer_complete = True
-						break
+		next_row = next(rows, None)
+		last_merged_key = (-1, -1, -1)
 
-					# (article_id, section_index, paragraph_index, sentence_index, group_id, sense_group_sense_id, dataset)
+		window = []  # heap of (paragraph key, sequence number, sentences)
+		sequence_number = 0
 
-					paragraph_key = example_info[0:3]  # (article_id, section_index, paragraph_index)
+		paragraph_count = 0
+		late_paragraph_count = 0
+		unmatched_row_count = 0
 
-					if paragraph_key not in buffer:
-						buffer[paragraph_key] = []
+		reading_done = False
 
-					buffer[paragraph_key].append(example_info[3:7])
-					max_paragraph_key_in_buffer = paragraph_key
+		while True:
+			if not reading_done:
+				paragraph = paragraph_queue.get()
 
-			example_info_list = buffer.get(p_key, None)
-			if example_info_list is None:
-				continue
+				if paragraph is not None:
+					p_key, p_sentences = paragraph
+					heapq.heappush(window, (p_key, sequence_number, p_sentences))
+					sequence_number += 1
 
-			all_tokens = []
-			for sentence in p_sentences:
-				all_tokens.extend(sentence)
+					if len(window) <= reorder_window_size:
+						continue
+				else:
+					reading_done = True  # drain the window
 
-			for example_info in example_info_list:
-				sentence_index, group_id, sense_group_sense_id, dataset = example_info
+			if len(window) == 0:
+				break
 
-				possible_senses_for_group = possible_senses[group_id]
+			p_key, _, p_sentences = heapq.heappop(window)
+			paragraph_count += 1
+
+			if p_key < last_merged_key:
+				# Arrived after the merge passed its position
+				late_paragraph_count += 1
+
+				if lookup_conn is None:
+					lookup_conn = storage.connect(read_only=True)
+
+				example_infos = [row[3:7] for row in Storage.query(lookup_conn, ExampleExporter.PARAGRAPH_SQL, p_key)]
+			else:
+				last_merged_key = p_key
+
+				while next_row is not None and next_row[0:3] < p_key:
+					unmatched_row_count += 1  # might still be found by a lookup for a late paragraph
+					next_row = next(rows, None)
+
+				example_infos = []
+				while next_row is not None and next_row[0:3] == p_key:
+					# (sentence_index, group_id, sense_group_sense_id, dataset)
+					example_infos.append(next_row[3:7])
+					next_row = next(rows, None)
+
+			if len(example_infos) > 0:
+				ExampleExporter.write_examples(
+					p_key,
+					p_sentences,
+					example_infos,
+					paragraph_writer_queues,
+					sentence_writer_queues,
+					possible_senses,
+					normalized
+				)
 
-				for q in paragraph_writer_queues.get(dataset, []):
-					q.put((all_tokens, possible_senses_for_group, sense_group_sense_id))
+			if paragraph_count % 100000 == 0:
+				print("[Shard {:d}] {:,d} paragraphs".format(shard_index, paragraph_count))
 
-				if sentence_index is None:
-					for sentence in p_sentences:
-						for q in sentence_writer_queues.get(dataset, []):
-							q.put((sentence, possible_senses_for_group, sense_group_sense_id))
-				else:
-					for q in sentence_writer_queues.get(dataset, []):
-						q.put((p_sentences[sentence_index], possible_senses_for_group, sense_group_sense_id))
+		while next_row is not None:
+			unmatched_row_count += 1
+			next_row = next(rows, None)
 
-			del buffer[p_key]
+		conn.close()
+		if lookup_conn is not None:
+			lookup_conn.close()
 
-		if len(buffer) > 0:
-			print("Did not find {:d} paragraphs!".format(len(buffer)))
-			for p_key, example_info in buffer.items():
-				print(p_key, example_info)
+		print("[Shard {:d}] Done. {:,d} paragraphs, {:,d} late paragraphs, {:,d} rows skipped by merge".format(
+			shard_index,
+			paragraph_count,
+			late_paragraph_count,
+			unmatched_row_count
+		))
 
 	@staticmethod
-	def db_task(db_path: str, output_queues: List[mp.Queue]):
-		queue_count = len(output_queues)
+	def write_examples(
+			p_key: tuple,
+			p_sentences: List[list],
+			example_infos: List[tuple],
+			paragraph_writer_queues: Dict[int, List[mp.Queue]],
+			sentence_writer_queues: Dict[int, List[mp.Queue]],
+			possible_senses: PossibleSenses,
+			normalized: bool = False
+	):
+		"""
+		Puts (tokens, possible senses, sense, segment key, group id) tuples on the writer queues. The segment key is
+		(article_id, section_index, paragraph_index, sentence_index or -1 for the whole paragraph).
 
-		conn = sqlite3.connect(db_path)
-		c = conn.cursor()
+		All data rows of a paragraph are written in a single call, so in normalized mode the tokens of each segment are
+		sent to each queue only once and None is sent for repetitions. Examples without tokens or possible senses are
+		skipped.
+		"""
+		all_tokens = []
+		for sentence in p_sentences:
+			all_tokens.extend(sentence)
 
-		c.execute("select count(*) from data")
-		total_paragraph_count = c.fetchone()[0]
+		sent_segments = set()  # (queue index, segment key)
 
-		sql = """
-		select
-			D.article_id,
-			D.section_index,
-			D.paragraph_index,
-			D.sentence_index,
-			SGS.sense_group,
-			D.sense_group_sense_id,
-			D.dataset
-		from
-			data D,
-			sense_group_senses SGS
-		where
-			D.sense_group_sense_id = SGS.id
-		order by
-			D.article_id asc,
-			D.section_index asc,
-			D.paragraph_index asc
-		"""
+		def put(q: mp.Queue, tokens: list, segment_key: tuple, possible_senses_for_group: List[int], sense: int, group_id: int):
+			# Skipped here rather than by the writer, so a segment is only marked as sent if its tokens are written
+			if len(tokens) == 0 or len(possible_senses_for_group) == 0:
+				print("Skipped empty example:", segment_key, group_id, sense)
+				return
 
-		count = 0
-		for row in c.execute(sql):
-			output_queues[row[0] % queue_count].put(row)
+			if normalized:
+				if (id(q), segment_key) in sent_segments:
+					tokens = None
+				else:
+					sent_segments.add((id(q), segment_key))
 
-			count += 1
+			q.put((tokens, possible_senses_for_group, sense, segment_key, group_id))
 
-			if count % 100 == 1:
-				print("Progress: {:.6f}% ({:,d}/{:,d})".format(
-					count / total_paragraph_count * 100.0,
-					count,
-					total_paragraph_count
-				), end="\r")
+		for example_info in example_infos:
+			sentence_index, group_id, sense_group_sense_id, dataset = example_info
 
-		conn.close()
+			possible_senses_for_group = possible_senses[group_id]
 
-		for q in output_queues:
-			q.put(None)
+			for q in paragraph_writer_queues.get(dataset, []):
+				put(q, all_tokens, p_key + (-1,), possible_senses_for_group, sense_group_sense_id, group_id)
 
-		print("Waiting for workers to finish...")
+			if sentence_index is None:
+				for i, sentence in enumerate(p_sentences):
+					for q in sentence_writer_queues.get(dataset, []):
+						put(q, sentence, p_key + (i,), possible_senses_for_group, sense_group_sense_id, group_id)
+			else:
+				for q in sentence_writer_queues.get(dataset, []):
+					put(
+						q,
+						p_sentences[sentence_index],
+						p_key + (sentence_index,),
+						possible_senses_for_group,
+						sense_group_sense_id,
+						group_id
+					)
 
 	@staticmethod
 	def data_reader_task(tokens_path: str, output_queue: mp.Queue):
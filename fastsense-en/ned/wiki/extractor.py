@@ -1,9 +1,11 @@
 import datetime
+import hashlib
 import multiprocessing as mp
 import re
 import time
 import html
 import mwparserfromhell as mwp
+from typing import Dict, Optional
 
 from .utils import normalize_page_title, normalize_section_title
 from .reader import WikiDumpReader
@@ -21,13 +23,24 @@ class Page:
 
 class WikiExtractor:
 
-	def __init__(self, dump_path: str, namespaces: set = {0}):
+	def __init__(self, dump_path: str, namespaces: set = {0}, known_content_hashes: Optional[Dict[int, int]] = None):
 		"""
 		:param dump_path: Path to *-pages-articles.xml.bz2
 		:param namespaces: Set of allowed namespaces
+		:param known_content_hashes: Content hashes of pages from a previous run (page id -> hash). If set, only added
+			and changed pages are extracted and pages missing from the dump are reported as deleted.
 		"""
 		self.dump_path = dump_path
 		self.namespaces = namespaces
+		self.known_content_hashes = known_content_hashes
+
+	@staticmethod
+	def content_hash(page_title: str, page_text: str) -> int:
+		"""
+		Returns signed 64 bit hash of page title and text, so it fits into an sqlite INTEGER column.
+		"""
+		digest = hashlib.sha1((page_title + "\n" + page_text).encode("utf8")).digest()
+		return int.from_bytes(digest[:8], byteorder="big", signed=True)
 
 	@staticmethod
 	def print_progress(progress: mp.Value, is_done: mp.Value):
@@ -38,7 +51,15 @@ class WikiExtractor:
 		print("")
 		print("Done!")
 
-	def read_pages(self, page_queue: mp.Queue, number_of_workers: int, progress: mp.Value):
+	def read_pages(self, page_queue: mp.Queue, number_of_workers: int, progress: mp.Value, revision_queue: Optional[mp.Queue] = None):
+		known_content_hashes = self.known_content_hashes
+		if known_content_hashes is not None and len(known_content_hashes) > 0:
+			seen_page_ids = bytearray(max(known_content_hashes.keys()) + 1)
+		else:
+			seen_page_ids = bytearray()
+
+		revision_buffer = []
+
 		with WikiDumpReader(self.dump_path) as wiki_reader:
 			while True:
 				page = wiki_reader.next_page()
@@ -60,6 +81,21 @@ class WikiExtractor:
 				page_title = page.title
 				page_text = page.revisions[0].text.text
 
+				if revision_queue is not None:
+					content_hash = self.content_hash(page_title, page_text)
+
+					if known_content_hashes is not None:
+						if page_id < len(seen_page_ids):
+							seen_page_ids[page_id] = 1
+
+						if known_content_hashes.get(page_id, None) == content_hash:
+							continue  # Unchanged since previous run
+
+					revision_buffer.append((page_id, page.revisions[0].id, content_hash))
+					if len(revision_buffer) >= 1000:
+						revision_queue.put(revision_buffer)
+						revision_buffer = []
+
 				redirect_match = re.match(r"^[ ]*?#REDIRECT[ ]*?\[\[(.*?)\]\]", page_text, re.IGNORECASE)
 				if redirect_match is not None:
 					redirect_link = redirect_match.group(1)
@@ -84,6 +120,21 @@ class WikiExtractor:
 			for _ in range(number_of_workers):
 				page_queue.put(None)  # End of data marker
 
+		if revision_queue is not None:
+			if known_content_hashes is not None:
+				for page_id in known_content_hashes.keys():
+					if not seen_page_ids[page_id]:
+						revision_buffer.append((page_id, None, None))  # Deleted page
+
+						if len(revision_buffer) >= 1000:
+							revision_queue.put(revision_buffer)
+							revision_buffer = []
+
+			if len(revision_buffer) > 0:
+				revision_queue.put(revision_buffer)
+
+			revision_queue.put(None)  # End of data marker
+
 	def parse_page(self, page_queue: mp.Queue, parsed_page_queue: mp.Queue):
 		parser = WikitextParser()
 
@@ -131,12 +182,15 @@ class WikiExtractor:
 
 		parsed_page_queue.put(None)  # End of data marker
 
-	def extract_paragraphs(self, page_output_queue: mp.Queue, number_of_workers: int = 4, print_progress: bool = True):
+	def extract_paragraphs(self, page_output_queue: mp.Queue, number_of_workers: int = 4, print_progress: bool = True, revision_output_queue: Optional[mp.Queue] = None):
 		"""
 		Extracts paragraphs and links from Wikipedia dump.
 		:param page_output_queue: Multiprocessing Queue. Will be filled with Page objects. None is inserted as end marker by each worker.
 		:param number_of_workers: Number of threads used for parsing pages.
 		:param print_progress: Show progress indicator
+		:param revision_output_queue: Optional multiprocessing Queue. Will be filled with lists of (page id, revision id,
+			content hash) tuples for every extracted page. Deleted pages have revision id and hash None. None is
+			inserted as end marker.
 		:return: Duration of operation in seconds
 		"""
 
@@ -147,7 +201,7 @@ class WikiExtractor:
 
 		page_queue = mp.Queue(1000)
 
-		data_reader_process = mp.Process(target=self.read_pages, args=(page_queue, number_of_workers, progress))
+		data_reader_process = mp.Process(target=self.read_pages, args=(page_queue, number_of_workers, progress, revision_output_queue))
 		data_reader_process.start()
 
 		worker_processes = []
@@ -0,0 +1,106 @@
+import datetime
+import hashlib
+import os
+import sqlite3
+from typing import List, Optional
+
+
+class StageManifest:
+	"""
+	Keeps track of completed stages of a WikiConverter run inside the database, so an interrupted run can be resumed
+	without recomputing expensive stages.
+
+	A stage counts as completed if it has a completion marker, was run with the same inputs, and its outputs (tables and
+	files) still match the fingerprint taken when it finished.
+	"""
+
+	def __init__(self, db_path: str):
+		self.db_path = db_path
+
+		conn = sqlite3.connect(db_path)
+		conn.execute("""
+			CREATE TABLE IF NOT EXISTS "stage_manifest" (
+				"stage" TEXT PRIMARY KEY,
+				"input_fingerprint" TEXT,
+				"output_fingerprint" TEXT,
+				"completed_at" TEXT
+			)
+		""")
+		conn.commit()
+		conn.close()
+
+	@staticmethod
+	def file_fingerprint(path: str) -> str:
+		"""
+		Fingerprint of an input or output file based on its absolute path, size and modification time.
+		"""
+		if not os.path.exists(path):
+			return "{}:missing".format(os.path.abspath(path))
+
+		stat = os.stat(path)
+		return "{}:{:d}:{:d}".format(os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+	def output_fingerprint(self, tables: List[str], files: List[str]) -> str:
+		"""
+		Fingerprint of stage outputs based on row counts of tables and sizes of files.
+		"""
+		conn = sqlite3.connect(self.db_path)
+		c = conn.cursor()
+
+		parts = []
+		for table in tables:
+			c.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+			if c.fetchone() is None:
+				parts.append(table + ":missing")
+			else:
+				c.execute("SELECT count(*) FROM \"{}\"".format(table))
+				parts.append("{}:{:d}".format(table, c.fetchone()[0]))
+
+		conn.close()
+
+		for path in files:
+			parts.append(self.file_fingerprint(path))
+
+		return hashlib.sha1("\n".join(parts).encode("utf8")).hexdigest()
+
+	def completed_at(self, stage: str, input_fingerprint: str, tables: List[str], files: List[str]) -> Optional[str]:
+		"""
+		Returns completion time of stage or None if the stage has to be (re-)computed.
+		"""
+		conn = sqlite3.connect(self.db_path)
+		row = conn.execute(
+			"SELECT input_fingerprint, output_fingerprint, completed_at FROM stage_manifest WHERE stage = ?",
+			(stage,)
+		).fetchone()
+		conn.close()
+
+		if row is None:
+			return None
+
+		stored_input_fingerprint, stored_output_fingerprint, completed_at = row
+		if stored_input_fingerprint != input_fingerprint:
+			return None
+
+		if stored_output_fingerprint != self.output_fingerprint(tables, files):
+			print("Outputs of stage '{}' changed since it was completed.".format(stage))
+			return None
+
+		return completed_at
+
+	def mark_completed(self, stage: str, input_fingerprint: str, tables: List[str], files: List[str]):
+		output_fingerprint = self.output_fingerprint(tables, files)
+		completed_at = datetime.datetime.now().isoformat(sep=" ", timespec="seconds")
+
+		conn = sqlite3.connect(self.db_path)
+		conn.execute(
+			"INSERT OR REPLACE INTO stage_manifest VALUES (?,?,?,?)",
+			(stage, input_fingerprint, output_fingerprint, completed_at)
+		)
+		conn.commit()
+		conn.close()
+
+	def invalidate(self, stages: List[str]):
+		conn = sqlite3.connect(self.db_path)
+		conn.executemany("DELETE FROM stage_manifest WHERE stage = ?", [(stage,) for stage in stages])
+		conn.commit()
+		conn.close()
@@ -1,22 +1,248 @@
 import multiprocessing as mp
 import sqlite3
 import gzip
-import re
 import os
-from typing import List
-
+import shutil
+import time
+import traceback
+import numpy as np
+from typing import List, Dict, Optional, Set
+
+from .bulk import BulkWriter, fetch_array
+from .categories import CategoryGraph
 from .extractor import WikiExtractor
+from .manifest import StageManifest
+from .sections import SectionTree
+from .sqldump import map_insert_values
 from .utils import normalize_page_title, group_title
+from .workers import WorkerError, receive, join_processes
 from ..corenlp import CoreNlpBridge
+from ..storage import Storage, SqliteStorage
 
 
 class WikiConverter:
 
+	STAGES = ["extract", "paragraph_counts", "disambig_flags", "count_links", "find_senses", "divide_data"]
+
+	# Number of distinct linking paragraphs per link target in a range of linked article ids
+	TOTAL_COUNTS_SQL = """
+		select
+			linked_article_id,
+			linked_section_index,
+			count(*) as count
+		from
+			(
+				select distinct
+					article_id,
+					section_index,
+					paragraph_index,
+					sentence_index,
+					linked_article_id,
+					linked_section_index
+				from
+					temp_links
+				where
+					linked_article_id >= ? and linked_article_id < ?
+			)
+		group by
+			linked_article_id,
+			linked_section_index
+	"""
+
+	# Number of distinct linking paragraphs per link target and group title in a range of linked article ids
+	MATCHING_COUNTS_SQL = """
+		select
+			group_title,
+			linked_article_id,
+			linked_section_index,
+			count(*) as count
+		from
+			temp_links
+		where
+			linked_article_id >= ? and linked_article_id < ?
+		group by
+			group_title,
+			linked_article_id,
+			linked_section_index
+	"""
+
+	@staticmethod
+	def run(
+			dump_path: str,
+			page_table_path: str,
+			categorylinks_table_path: str,
+			db_path: str,
+			output_path: str,
+			output_file_count: int,
+			corenlp_classpath: str,
+			test_set_sizes: List[float],
+			print_progress: bool = True,
+			incremental: bool = False,
+			from_stage: Optional[str] = None,
+			only_stage: Optional[str] = None,
+			storage: str = "sqlite"
+	):
+		"""
+		Runs all stages in order. Stages completed by a previous run with the same inputs are skipped.
+
+		:param from_stage: Recompute this stage and all following stages. Earlier stages are not run.
+		:param only_stage: Recompute only this stage. Following stages are marked as outdated.
+		:param storage: Engine for aggregation queries. One of Storage.NAMES. The database is always a sqlite file.
+		"""
+		assert from_stage is None or only_stage is None
+		assert from_stage is None or from_stage in WikiConverter.STAGES
+		assert only_stage is None or only_stage in WikiConverter.STAGES
+
+		db_dir = os.path.dirname(db_path)
+		if db_dir != "":
+			os.makedirs(db_dir, exist_ok=True)
+
+		links_path = os.path.join(output_path, "links.gz")
+		tokens_paths = [os.path.join(output_path, "tokens_" + str(i) + ".gz") for i in range(output_file_count)]
+
+		def extract():
+			known_content_hashes = None
+			if incremental:
+				known_content_hashes = WikiConverter.load_content_hashes(db_path)
+				if len(known_content_hashes) == 0:
+					print("No page revisions found in existing database. Falling back to full run.")
+					known_content_hashes = None
+
+			if known_content_hashes is not None:
+				delta_db_path = db_path + ".delta"
+				delta_output_path = os.path.join(output_path, "delta")
+
+				if os.path.exists(delta_db_path):
+					os.remove(delta_db_path)
+				if os.path.exists(delta_output_path):
+					shutil.rmtree(delta_output_path)
+
+				print("Extracting changed pages ({:,d} known pages)...".format(len(known_content_hashes)))
+				WikiConverter.extract(dump_path, delta_db_path, delta_output_path, output_file_count, corenlp_classpath, print_progress, known_content_hashes)
+				del known_content_hashes
+
+				WikiConverter.update_total_paragraph_counts(delta_db_path)
+				WikiConverter.merge_delta(db_path, output_path, delta_db_path, delta_output_path, output_file_count)
+
+				os.remove(delta_db_path)
+				shutil.rmtree(delta_output_path)
+			else:
+				WikiConverter.extract(dump_path, db_path, output_path, output_file_count, corenlp_classpath, print_progress)
+
+		def update_total_paragraph_counts():
+			if WikiConverter.has_table(db_path, "temp_sections"):
+				WikiConverter.update_total_paragraph_counts(db_path)
+			else:
+				print("Sections are already up to date.")  # Updated during incremental extraction or before a crash
+
+		stages = [
+			# (name, function, input fingerprint, output tables, output files)
+			(
+				"extract",
+				extract,
+				"\n".join([StageManifest.file_fingerprint(dump_path), str(output_file_count)]),
+				["articles", "section_ids", "page_revisions"],
+				tokens_paths + [links_path]
+			),
+			(
+				"paragraph_counts",
+				update_total_paragraph_counts,
+				"",
+				["sections"],
+				[]
+			),
+			(
+				"disambig_flags",
+				lambda: WikiConverter.update_disambig_page_flags(db_path, page_table_path, categorylinks_table_path),
+				"\n".join([StageManifest.file_fingerprint(page_table_path), StageManifest.file_fingerprint(categorylinks_table_path)]),
+				["categories", "subcategories", "article_categories"],
+				[]
+			),
+			(
+				"count_links",
+				lambda: WikiConverter.count_links(db_path, links_path),
+				"",
+				["links"],
+				[]
+			),
+			(
+				"find_senses",
+				lambda: WikiConverter.find_senses(db_path, storage=storage),
+				"",
+				["grouped_links", "raw_senses", "sense_groups", "senses", "sense_group_senses", "alternative_group_titles"],
+				[]
+			),
+			(
+				"divide_data",
+				lambda: WikiConverter.divide_data(db_path, test_set_sizes=test_set_sizes),
+				",".join(map(str, test_set_sizes)),
+				["data"],
+				[]
+			)
+		]
+
+		manifest = StageManifest(db_path)
+
+		if from_stage is not None:
+			manifest.invalidate(WikiConverter.STAGES[WikiConverter.STAGES.index(from_stage):])
+		elif only_stage is not None:
+			manifest.invalidate(WikiConverter.STAGES[WikiConverter.STAGES.index(only_stage):])
+
+		for stage_index, (stage, stage_function, input_fingerprint, output_tables, output_files) in enumerate(stages):
+			if only_stage is not None and stage != only_stage:
+				continue
+
+			if from_stage is not None and stage_index < WikiConverter.STAGES.index(from_stage):
+				continue
+
+			completed_at = manifest.completed_at(stage, input_fingerprint, output_tables, output_files)
+			if completed_at is not None:
+				print("Skipping stage '{}' (completed at {}).".format(stage, completed_at))
+				continue
+
+			print("Running stage '{}'...".format(stage))
+
+			# Following stages depend on the outputs of this stage
+			manifest.invalidate(WikiConverter.STAGES[stage_index:])
+			stage_function()
+			manifest.mark_completed(stage, input_fingerprint, output_tables, output_files)
+
 	@staticmethod
-	def run(dump_path: str, page_table_path: str, categorylinks_table_path: str, db_path: str, output_path: str, output_file_count: int, corenlp_classpath: str, test_set_sizes: List[float], print_progress: bool = True):
-		os.makedirs(os.path.dirname(db_path), exist_ok=True)
+	def has_table(db_path: str, table_name: str) -> bool:
+		conn = sqlite3.connect(db_path)
+		row = conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = ?", (table_name,)).fetchone()
+		conn.close()
+
+		return row is not None
+
+	@staticmethod
+	def is_new_database(db_path: str) -> bool:
+		"""
+		Returns whether the database does not exist yet or only contains the stage manifest of the current run.
+		"""
+		if not os.path.exists(db_path):
+			return True
+
+		conn = sqlite3.connect(db_path)
+		rows = conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name != 'stage_manifest'").fetchall()
+		conn.close()
+
+		return len(rows) == 0
+
+	@staticmethod
+	def extract(dump_path: str, db_path: str, output_path: str, output_file_count: int, corenlp_classpath: str, print_progress: bool = True, known_content_hashes: Optional[Dict[int, int]] = None):
+		"""
+		Extracts articles, sections, links, and tokens from the dump. If known_content_hashes is set, only pages that
+		were added or changed since the previous run are extracted, and deleted pages are written to 'deleted_pages'.
+		"""
+		db_dir = os.path.dirname(db_path)
+		if db_dir != "":
+			os.makedirs(db_dir, exist_ok=True)
 		os.makedirs(output_path, exist_ok=True)
 
+		# A crash without journal can corrupt the whole file, which is only acceptable if nothing else is stored in it
+		disable_journal = WikiConverter.is_new_database(db_path)
+
 		number_of_workers = 6
 
 		page_queue = mp.Queue(1000)
@@ -53,6 +279,21 @@ class WikiConverter:
 			"id_string" TEXT
 		)
 		""")
+		sql_queue.put("DROP TABLE IF EXISTS 'page_revisions'")
+		sql_queue.put("""
+		CREATE TABLE "page_revisions" (
+			"article_id" INTEGER PRIMARY KEY,
+			"revision_id" INTEGER,
+			"content_hash" INTEGER
+		)
+		""")
+		if known_content_hashes is not None:
+			sql_queue.put("DROP TABLE IF EXISTS 'deleted_pages'")
+			sql_queue.put("""
+			CREATE TABLE "deleted_pages" (
+				"article_id" INTEGER PRIMARY KEY
+			)
+			""")
 
 		tokens_queues = []
 		data_processes = []
@@ -75,7 +316,7 @@ class WikiConverter:
 			tokenize_process.start()
 			processes.append(tokenize_process)
 
-		sql_process = mp.Process(target=WikiConverter.db_task, args=(db_path, sql_queue))
+		sql_process = mp.Process(target=WikiConverter.db_task, args=(db_path, sql_queue, disable_journal))
 		sql_process.start()
 
 		links_path = os.path.join(output_path, "links.gz")
@@ -85,13 +326,20 @@ class WikiConverter:
 		count_process = mp.Process(target=WikiConverter.count_task, args=(sql_queue, count_queue))
 		count_process.start()
 
-		extractor = WikiExtractor(dump_path=dump_path)
+		revision_queue = mp.Queue(1000)
+		revision_process = mp.Process(target=WikiConverter.revision_task, args=(sql_queue, revision_queue))
+		revision_process.start()
+
+		extractor = WikiExtractor(dump_path=dump_path, known_content_hashes=known_content_hashes)
 		extractor.extract_paragraphs(
 			page_output_queue=page_queue,
 			number_of_workers=number_of_workers,
-			print_progress=print_progress
+			print_progress=print_progress,
+			revision_output_queue=revision_queue
 		)
 
+		revision_process.join()
+
 		for process in processes:
 			process.join()
 
@@ -110,11 +358,101 @@ class WikiConverter:
 		sql_queue.put(None)
 		sql_process.join()
 
-		WikiConverter.update_total_paragraph_counts(db_path)
-		WikiConverter.update_disambig_page_flags(db_path, page_table_path, categorylinks_table_path)
-		WikiConverter.count_links(db_path, links_path)
-		WikiConverter.find_senses(db_path)
-		WikiConverter.divide_data(db_path, test_set_sizes=test_set_sizes)
+	@staticmethod
+	def load_content_hashes(db_path: str) -> Dict[int, int]:
+		"""
+		Loads content hashes of all pages extracted by a previous run. Returns an empty dict for databases created
+		before page revisions were tracked.
+		"""
+		content_hashes = {}
+		if not os.path.exists(db_path) or not WikiConverter.has_table(db_path, "page_revisions"):
+			return content_hashes
+
+		conn = sqlite3.connect(db_path)
+		for article_id, content_hash in conn.execute("SELECT article_id, content_hash FROM page_revisions"):
+			content_hashes[article_id] = content_hash
+		conn.close()
+
+		return content_hashes
+
+	@staticmethod
+	def merge_delta(db_path: str, output_path: str, delta_db_path: str, delta_output_path: str, output_file_count: int):
+		"""
+		Replaces rows and intermediate file lines of changed and deleted pages with the output of an incremental
+		extraction. Tables derived from links are rebuilt by the following steps anyway.
+		"""
+		conn = sqlite3.connect(db_path)
+		conn.execute("ATTACH DATABASE ? AS delta", (delta_db_path,))
+
+		stale_article_ids = set()
+		for row in conn.execute("SELECT article_id FROM delta.page_revisions UNION SELECT article_id FROM delta.deleted_pages"):
+			stale_article_ids.add(row[0])
+
+		print("Merging {:,d} changed or deleted pages into database...".format(len(stale_article_ids)))
+
+		conn.executescript("""
+			CREATE TEMP TABLE stale_articles AS
+			SELECT article_id FROM delta.page_revisions
+			UNION SELECT article_id FROM delta.deleted_pages;
+			
+			CREATE UNIQUE INDEX temp.stale_articles_index ON stale_articles (article_id);
+			
+			DELETE FROM articles WHERE id IN (SELECT article_id FROM stale_articles);
+			DELETE FROM sections WHERE article_id IN (SELECT article_id FROM stale_articles);
+			DELETE FROM section_ids WHERE article_id IN (SELECT article_id FROM stale_articles);
+			DELETE FROM page_revisions WHERE article_id IN (SELECT article_id FROM stale_articles);
+			
+			INSERT INTO articles SELECT * FROM delta.articles;
+			INSERT INTO sections SELECT * FROM delta.sections;
+			INSERT INTO section_ids SELECT * FROM delta.section_ids;
+			INSERT INTO page_revisions SELECT * FROM delta.page_revisions;
+			
+			DROP TABLE stale_articles;
+		""")
+
+		conn.commit()
+		conn.execute("DETACH DATABASE delta")
+		conn.close()
+
+		file_names = ["tokens_" + str(i) + ".gz" for i in range(output_file_count)] + ["links.gz"]
+		for file_name in file_names:
+			print("Merging {}...".format(file_name))
+			WikiConverter.merge_intermediate_file(
+				os.path.join(output_path, file_name),
+				os.path.join(delta_output_path, file_name),
+				stale_article_ids
+			)
+
+	@staticmethod
+	def merge_intermediate_file(path: str, delta_path: str, stale_article_ids: Set[int]):
+		"""
+		Merges a tokens or links file with its incremental counterpart. Lines of stale articles are dropped. Lines from
+		the delta file are inserted in front of the first line with a larger article id, so the (roughly ascending)
+		article order that ExampleExporter relies on is kept.
+		"""
+		temp_path = path + ".tmp"
+
+		with gzip.open(path, "rb") as f, gzip.open(delta_path, "rb") as delta_f, gzip.open(temp_path, "wb") as out_f:
+			delta_line = delta_f.readline()
+			delta_article_id = int(delta_line[:delta_line.index(b"\t")]) if len(delta_line) > 0 else None
+
+			for line in f:
+				article_id = int(line[:line.index(b"\t")])
+				if article_id in stale_article_ids:
+					continue
+
+				while delta_article_id is not None and delta_article_id < article_id:
+					out_f.write(delta_line)
+					delta_line = delta_f.readline()
+					delta_article_id = int(delta_line[:delta_line.index(b"\t")]) if len(delta_line) > 0 else None
+
+				out_f.write(line)
+
+			while len(delta_line) > 0:
+				out_f.write(delta_line)
+				delta_line = delta_f.readline()
+
+		os.replace(temp_path, path)
 
 	@staticmethod
 	def update_total_paragraph_counts(db_path: str):
@@ -198,7 +536,7 @@ class WikiConverter:
 		conn.close()
 
 	@staticmethod
-	def update_disambig_page_flags(db_path: str, page_table_path: str, categorylinks_table_path: str):
+	def update_disambig_page_flags(db_path: str, page_table_path: str, categorylinks_table_path: str, number_of_workers: int = 6):
 		conn = sqlite3.connect(db_path)
 		conn.executescript("""
 			DROP TABLE IF EXISTS "categories";
@@ -223,86 +561,48 @@ class WikiConverter:
 		c = conn.cursor()
 
 		# Import categories
-		with gzip.open(page_table_path, "rt", encoding="utf8", errors="replace") as f:
-			line_prefix = "INSERT INTO `page` VALUES "
+		category_ids = {}  # title -> id
 
+		with BulkWriter(conn, disable_journal=False, print_report=False) as writer:
 			i = 0
-			for line in f:
-				if line.startswith(line_prefix):
-					line = line[len(line_prefix):]
-					values = re.findall(r"\(([0-9]+),(-?[0-9]+),'(.*?)(?<!(?<!(?<!\\)\\)\\)',.*?\)[,;]", line)
-					for page_id, page_ns, page_title in values:
-						page_ns = int(page_ns)
-						if page_ns != 14:  # Namespace 14 is for categories
-							continue
-
-						page_id = int(page_id)
-						page_title = page_title.replace("\\'", "'")
-						params = (page_id, page_title)
-
-						c.execute("INSERT INTO categories (id, title) VALUES (?,?)", params)
+			for category_rows in map_insert_values(page_table_path, "page", WikiConverter.filter_category_pages, number_of_workers=number_of_workers):
+				writer.insert("INSERT INTO categories (id, title) VALUES (?,?)", category_rows)
+				category_ids.update((title, page_id) for page_id, title in category_rows)
 
 				i += 1
-				print("Importing categories: Line {:d}...".format(i), end="\r")
+				print("Importing categories: Statement {:d}...".format(i), end="\r")
 
-		conn.executescript("""
-			CREATE UNIQUE INDEX "category_titles" ON "categories" ("title");
-		""")
-		conn.commit()
+			writer.execute("""CREATE UNIQUE INDEX "category_titles" ON "categories" ("title")""")
 
-		print("Importing categories: Line {:d}... Done!".format(i))
+		print("Importing categories: Statement {:d}... Done! ({:,d} categories)".format(i, len(category_ids)))
 
 		# Import category links
-		with gzip.open(categorylinks_table_path, "rt", encoding="utf8", errors="replace") as f:
-			line_prefix = "INSERT INTO `categorylinks` VALUES "
+		print("Loading article ids...")
+		article_ids = set(row[0] for row in c.execute("SELECT id FROM articles"))
 
+		with BulkWriter(conn, disable_journal=False) as writer:
 			i = 0
-			for line in f:
-				if not line.startswith(line_prefix):
-					continue
-
-				line = line[len(line_prefix):]
-				values = re.findall(
-					r"\(([0-9]+),'(.*?)(?<!(?<!(?<!\\)\\)\\)','.*?(?<!(?<!(?<!\\)\\)\\)','.*?(?<!(?<!(?<!\\)\\)\\)','.*?(?<!(?<!(?<!\\)\\)\\)','.*?(?<!(?<!(?<!\\)\\)\\)','(.*?)(?<!(?<!(?<!\\)\\)\\)'\)[,;]",
-					line,
-					flags=re.DOTALL
-				)
-
-				for from_id, target_title, link_type in values:
-					if link_type != "page" and link_type != "subcat":
-						continue
-
-					from_id = int(from_id)
-					target_title = target_title.replace("\\'", "'")
-
-					c.execute("SELECT id FROM categories WHERE title = ?", (target_title,))
-					target_id_row = c.fetchone()
-					if target_id_row is None:
-						continue
-
-					target_id = target_id_row[0]
-
-					if link_type == "page":
-						c.execute("SELECT id FROM articles WHERE id = ?", (from_id,))
-						if c.fetchone() is None:
-							continue
-
-						params = (from_id, target_id)
-						c.execute("INSERT INTO article_categories (article_id, category_id) VALUES (?,?)", params)
-					elif link_type == "subcat":
-						params = (target_id, from_id)
-						c.execute("INSERT INTO subcategories (category_id, subcategory_id) VALUES (?,?)", params)
+			results = map_insert_values(
+				categorylinks_table_path,
+				"categorylinks",
+				WikiConverter.filter_category_links,
+				map_args=(category_ids, article_ids),
+				number_of_workers=number_of_workers
+			)
+			for article_category_rows, subcategory_rows in results:
+				writer.insert("INSERT INTO article_categories (article_id, category_id) VALUES (?,?)", article_category_rows)
+				writer.insert("INSERT INTO subcategories (category_id, subcategory_id) VALUES (?,?)", subcategory_rows)
 
 				i += 1
-				print("Importing category links: Line {:d}...".format(i), end="\r")
+				print("Importing category links: Statement {:d}...".format(i), end="\r")
 
-		conn.executescript("""
-			CREATE INDEX "categories_category_index" ON "article_categories" ("category_id");
-			CREATE INDEX "subcategories_index" ON "subcategories" ("category_id");
-		""")
-		conn.commit()
+			print("Importing category links: Statement {:d}... Done!".format(i))
 
-		print("Importing category links: Line {:d}... Done!".format(i))
+			writer.execute("""CREATE INDEX "categories_category_index" ON "article_categories" ("category_id")""")
+			writer.execute("""CREATE INDEX "subcategories_index" ON "subcategories" ("category_id")""")
+
+		del category_ids
+		del article_ids
 
 		# Update disambig page flag in articles table
 		print("Updating disambiguation page flags in articles table...")
@@ -310,24 +610,56 @@ class WikiConverter:
 		c.execute("UPDATE articles SET is_disambig = 0")
 
 		c.execute("SELECT id FROM categories WHERE title = 'Disambiguation_pages'")
-		disambig_page_ids = set()
-		category_ids = {c.fetchone()[0]}
-		while len(category_ids) > 0:
-			category_id = category_ids.pop()
-			for row in c.execute("SELECT subcategory_id FROM subcategories WHERE category_id = ?", (category_id,)):
-				category_ids.add(row[0])
+		root_category_id = c.fetchone()[0]
 
-			for row in c.execute("SELECT article_id FROM article_categories WHERE category_id = ?", (category_id,)):
-				disambig_page_ids.add(row[0])
+		# Traverse the category tree in memory instead of querying subcategories and articles per category
+		category_graph = CategoryGraph.load(conn)
+		disambig_page_ids = category_graph.articles_in_category_tree([root_category_id])
+		print("Found {:,d} disambiguation pages.".format(len(disambig_page_ids)))
 
-		for disambig_page_id in disambig_page_ids:
-			c.execute("UPDATE articles SET is_disambig = 1 WHERE id = ?", (disambig_page_id,))
+		c.execute("DROP TABLE IF EXISTS temp.disambig_page_ids")
+		c.execute("CREATE TEMP TABLE disambig_page_ids (id INTEGER PRIMARY KEY)")
+		c.executemany("INSERT INTO temp.disambig_page_ids VALUES (?)", ((int(page_id),) for page_id in disambig_page_ids))
+		c.execute("UPDATE articles SET is_disambig = 1 WHERE id IN (SELECT id FROM temp.disambig_page_ids)")
+		c.execute("DROP TABLE temp.disambig_page_ids")
 
 		conn.commit()
 		conn.close()
 
 	@staticmethod
-	def count_links(db_path: str, links_path: str):
+	def filter_category_pages(rows: List[tuple]) -> List[tuple]:
+		"""
+		Returns (id, title) of category pages in rows of the page table.
+		"""
+		return [(row[0], row[2]) for row in rows if row[1] == 14]  # Namespace 14 is for categories
+
+	@staticmethod
+	def filter_category_links(rows: List[tuple], category_ids: Dict[str, int], article_ids: Set[int]) -> (List[tuple], List[tuple]):
+		"""
+		Returns (article id, category id) and (category id, subcategory id) pairs in rows of the categorylinks table.
+		Links to unknown categories or from unknown articles are skipped.
+		"""
+		article_category_rows = []
+		subcategory_rows = []
+
+		# (cl_from, cl_to, cl_sortkey, cl_timestamp, cl_sortkey_prefix, cl_collation, cl_type)
+		for row in rows:
+			from_id, target_title, link_type = row[0], row[1], row[-1]
+
+			target_id = category_ids.get(target_title, None)
+			if target_id is None:
+				continue
+
+			if link_type == "page":
+				if from_id in article_ids:
+					article_category_rows.append((from_id, target_id))
+			elif link_type == "subcat":
+				subcategory_rows.append((target_id, from_id))
+
+		return article_category_rows, subcategory_rows
+
+	@staticmethod
+	def count_links(db_path: str, links_path: str, number_of_workers: int = 6):
 		conn = sqlite3.connect(db_path)
 
 		print("Creating links table...")
@@ -351,7 +683,7 @@ class WikiConverter:
 		c = conn.cursor()
 
 		print("Loading metadata for articles...")
-		articles = {}  # title -> (id, is_disambig)
+		articles = {}  # title -> id
 		disambig_articles = set()
 		for row in c.execute("SELECT id, title, is_disambig FROM articles WHERE redirect_article_title is NULL"):
 			article_id, title, is_disambig = row
@@ -364,462 +696,700 @@ class WikiConverter:
 			title, redirect_article_title, redirect_section_id = row
 			redirects[title] = (redirect_article_title, redirect_section_id)
 
-		sections = {}  # id string -> section index
+		sections = {}  # (article id, id string) -> section index
 		for row in c.execute("SELECT article_id, id_string, section_index FROM section_ids"):
 			article_id, id_string, section_index = row
 			sections[(article_id, id_string)] = section_index
 
 		print("Resolving multi-redirects...")
-		for _ in range(3):
-			for redirect_title, destination in redirects.items():
-				dest_article_title, dest_section_id = destination
-
-				if dest_article_title in redirects:
-					print("Found multi-redirect:", redirect_title, destination)
-					new_dest = redirects[dest_article_title]
-					redirects[redirect_title] = (
-					new_dest[0], new_dest[1] if dest_section_id is None else dest_section_id)
+		redirects = WikiConverter.resolve_redirects(redirects)
 
 		print("Resolving links...")
 
-		resolved_links = []
-		last_disambig_page_article_id = None
+		# Workers are forked after loading the lookup maps, so they share them copy-on-write
+		line_queue = mp.Queue(number_of_workers * 4)
+		link_queue = mp.Queue(number_of_workers * 4)
+
+		reader_process = mp.Process(target=WikiConverter.link_reader_task, args=(links_path, line_queue, number_of_workers))
+		reader_process.start()
+
+		worker_processes = []
+		for _ in range(number_of_workers):
+			worker_process = mp.Process(
+				target=WikiConverter.link_resolver_task,
+				args=(line_queue, link_queue, articles, redirects, sections, disambig_articles)
+			)
+			worker_process.start()
+			worker_processes.append(worker_process)
+
+		processes = [reader_process] + worker_processes
+
+		try:
+			with BulkWriter(conn, batch_size=200000, disable_journal=False) as writer:
+				running_workers = number_of_workers
+				while running_workers > 0:
+					resolved_links = receive(link_queue, processes)
+					if resolved_links is None:
+						running_workers -= 1
+						continue
+
+					writer.insert("INSERT INTO links VALUES (?,?,?,?,?,?,?,?,?,?,?)", resolved_links)
+		except BaseException:
+			join_processes(processes, terminate=True)
+			raise
+
+		join_processes(processes)
+
+		conn.close()
+
+	@staticmethod
+	def resolve_redirects(redirects: Dict[str, tuple]) -> Dict[str, tuple]:
+		"""
+		Follows chains of redirects to their final article. Every redirect is visited once: resolved destinations are
+		memoized and reused by all chains passing through them. Redirects that end in a cycle are dropped.
+
+		The section id of a redirect takes precedence over the section ids of redirects later in its chain.
+
+		:param redirects: title -> (redirect article title, redirect section id)
+		:return: title -> (final article title, section id)
+		"""
+		resolved = {}  # title -> destination or None for cycles
+		multi_redirect_count = 0
+
+		for title in redirects:
+			if title in resolved:
+				continue
+
+			# Follow chain until a non-redirect, an already resolved redirect, or a cycle is reached
+			chain = []
+			chain_titles = set()
+			current_title = title
+			while current_title in redirects and current_title not in resolved and current_title not in chain_titles:
+				chain.append(current_title)
+				chain_titles.add(current_title)
+				current_title = redirects[current_title][0]
+
+			if current_title in chain_titles:
+				destination = None
+			elif current_title in resolved:
+				destination = resolved[current_title]
+			else:
+				destination = (current_title, None)
+
+			# Resolve chain backwards
+			for chain_title in reversed(chain):
+				if destination is not None:
+					section_id = redirects[chain_title][1]
+					destination = (destination[0], destination[1] if section_id is None else section_id)
+
+					if destination[0] != redirects[chain_title][0]:
+						multi_redirect_count += 1
+
+				resolved[chain_title] = destination
+
+		resolved = {title: destination for title, destination in resolved.items() if destination is not None}
+		print("Found {:,d} multi-redirects and {:,d} redirects ending in cycles.".format(multi_redirect_count, len(redirects) - len(resolved)))
+
+		return resolved
+
+	@staticmethod
+	def link_reader_task(links_path: str, line_queue: mp.Queue, number_of_workers: int, batch_size: int = 20000):
+		lines = []
 
 		with gzip.open(links_path, "rt", encoding="utf8") as f:
 			for line in f:
-				if len(resolved_links) >= 200:
-					c.executemany("INSERT INTO links VALUES (?,?,?,?,?,?,?,?,?,?,?)", resolved_links)
-					resolved_links = []
+				lines.append(line)
 
-				line = line[:-1]  # remove \n
-				line = line.split("\t")
+				if len(lines) >= batch_size:
+					line_queue.put(lines)
+					lines = []
 
-				article_id, section_index, paragraph_index, sentence_index, start_index, end_index = list(map(int, line[0:6]))
-				linked_article, linked_section, link_title = line[6:]
+		if len(lines) > 0:
+			line_queue.put(lines)
 
-				if article_id == last_disambig_page_article_id:
-					is_on_disambig_page = True
-				else:
-					is_on_disambig_page = article_id in disambig_articles
-					if is_on_disambig_page:
-						last_disambig_page_article_id = article_id
+		for _ in range(number_of_workers):
+			line_queue.put(None)  # End of data marker
+
+	@staticmethod
+	def link_resolver_task(
+			line_queue: mp.Queue,
+			link_queue: mp.Queue,
+			articles: Dict[str, int],
+			redirects: Dict[str, tuple],
+			sections: Dict[tuple, Optional[int]],
+			disambig_articles: Set[int]
+	):
+		try:
+			while True:
+				lines = line_queue.get()
+				if lines is None:
+					break
 
-				if linked_article in redirects:
-					linked_article, redirect_linked_section = redirects[linked_article]
-					if linked_section == "":
-						linked_section = redirect_linked_section
+				resolved_links = []
 
-				if linked_article not in articles:
-					continue  # e.g. interwiki links
+				for line in lines:
+					line = line[:-1]  # remove \n
+					line = line.split("\t")
 
-				linked_article_id = articles[linked_article]
+					article_id, section_index, paragraph_index, sentence_index, start_index, end_index = list(map(int, line[0:6]))
+					linked_article, linked_section, link_title = line[6:]
 
-				if linked_section is not None and linked_section != "":
-					section_key = (linked_article_id, linked_section)
-					if section_key not in sections:
-						continue
+					if linked_article in redirects:
+						linked_article, redirect_linked_section = redirects[linked_article]
+						if linked_section == "":
+							linked_section = redirect_linked_section
 
-					linked_section_index = sections[section_key]
-					if linked_section_index is None:
+					linked_article_id = articles.get(linked_article, None)
+					if linked_article_id is None:
+						continue  # e.g. interwiki links
+
+					if linked_section is not None and linked_section != "":
+						section_key = (linked_article_id, linked_section)
+						if section_key not in sections:
+							continue
+
+						linked_section_index = sections[section_key]
+						if linked_section_index is None:
+							linked_section_index = -1
+					else:
 						linked_section_index = -1
-				else:
-					linked_section_index = -1
 
-				resolved_link = (
-					article_id,
-					section_index,
-					paragraph_index,
-					sentence_index,
-					start_index,
-					end_index,
-					linked_article_id,
-					linked_section_index,
-					link_title,
-					group_title(link_title),
-					is_on_disambig_page
-				)
-				resolved_links.append(resolved_link)
+					resolved_links.append((
+						article_id,
+						section_index,
+						paragraph_index,
+						sentence_index,
+						start_index,
+						end_index,
+						linked_article_id,
+						linked_section_index,
+						link_title,
+						group_title(link_title),  # cached per distinct title
+						article_id in disambig_articles
+					))
+
+				link_queue.put(resolved_links)
+		except Exception:
+			link_queue.put(WorkerError(traceback.format_exc()))
+		finally:
+			link_queue.put(None)  # End of data marker
 
-		if len(resolved_links) >= 1:
-			c.executemany("INSERT INTO links VALUES (?,?,?,?,?,?,?,?,?,?,?)", resolved_links)
+	@staticmethod
+	def run_steps(conn: sqlite3.Connection, steps: List[tuple]):
+		"""
+		Runs named steps and prints the duration of each step.
 
-		print("Committing db changes...")
-		conn.commit()
-		conn.close()
+		:param conn: Database connection
+		:param steps: List of (name, sql script or function) tuples
+		"""
+		total_start_time = time.time()
+
+		for name, step in steps:
+			print("  {}...".format(name), end="", flush=True)
+
+			start_time = time.time()
+			if callable(step):
+				step()
+			else:
+				conn.executescript(step)
+
+			print(" {:.1f} s".format(time.time() - start_time))
+
+		print("  Total: {:.1f} s".format(time.time() - total_start_time))
 
 	@staticmethod
-	def find_senses(db_path: str):
-		conn = sqlite3.connect(db_path)
+	def count_grouped_links(conn: sqlite3.Connection, db_path: str, number_of_workers: int, storage: Storage):
+		"""
+		Counts distinct linking paragraphs per link target in total (temp_total_counts) and per link target and group
+		title (temp_matching_counts). With more than one worker, temp_links is partitioned into ranges of
+		linked_article_id, which are counted by separate processes and merged afterwards.
+
+		The count tables are TEMP tables of the connection, so writing them does not lock the database file while the
+		workers are still reading from it. With DuckDB storage, DuckDB computes the counts with its own threads and
+		writes them to regular tables.
+		"""
+		min_article_id, max_article_id = conn.execute("select min(linked_article_id), max(linked_article_id) from temp_links").fetchone()
+
+		if storage.name != "sqlite":
+			storage_conn = storage.connect()
+			storage.execute_script(storage_conn, """
+				DROP TABLE IF EXISTS "temp_total_counts";
+				CREATE TABLE "temp_total_counts" (
+					"linked_article_id" INTEGER,
+					"linked_section_index" INTEGER,
+					"count" INTEGER
+				);
+				
+				DROP TABLE IF EXISTS "temp_matching_counts";
+				CREATE TABLE "temp_matching_counts" (
+					"group_title" TEXT,
+					"linked_article_id" INTEGER,
+					"linked_section_index" INTEGER,
+					"count" INTEGER
+				);
+			""")
+
+			if min_article_id is not None:
+				storage_conn.execute("insert into temp_total_counts " + WikiConverter.TOTAL_COUNTS_SQL, (min_article_id, max_article_id + 1))
+				storage_conn.execute("insert into temp_matching_counts " + WikiConverter.MATCHING_COUNTS_SQL, (min_article_id, max_article_id + 1))
+
+			storage_conn.close()
+
+			conn.executescript("""
+				create unique index temp_total_counts_index on temp_total_counts (linked_article_id, linked_section_index);
+			""")
+			return
 
-		print("Grouping links...")
 		conn.executescript("""
-			-- Create temp table for see also sections
-			DROP TABLE IF EXISTS "temp_see_also_sections";
-			CREATE TABLE "temp_see_also_sections" (
-				"article_id" INTEGER,
-				"section_index" INTEGER
-			);
-			
-			-- Find section indexes for 'see also' sections and child sections on disambiguation pages
-			with
-			root_sections as (select S.article_id, S.section_index, S.parent_index from sections S, articles A where S.article_id = A.id and A.is_disambig = 1 and lower(S.title) = 'see also'),
-			child_sections_l1 as (select A.article_id, A.section_index, A.parent_index from sections A, root_sections B where A.article_id = B.article_id and A.parent_index = B.section_index),
-			child_sections_l2 as (select A.article_id, A.section_index, A.parent_index from sections A, child_sections_l1 B where A.article_id = B.article_id and A.parent_index = B.section_index),
-			child_sections_l3 as (select A.article_id, A.section_index, A.parent_index from sections A, child_sections_l2 B where A.article_id = B.article_id and A.parent_index = B.section_index)
-			insert into temp_see_also_sections
-			select article_id, section_index from root_sections
-			union select article_id, section_index from child_sections_l1
-			union select article_id, section_index from child_sections_l2
-			union select article_id, section_index from child_sections_l3;
-			
-			-- Create temp table for links on disambiguation pages
-			DROP TABLE IF EXISTS "temp_disambig_links";
-			CREATE TABLE "temp_disambig_links" (
-				"article_id" INTEGER,
-				"group_title" TEXT,
+			DROP TABLE IF EXISTS main."temp_total_counts";
+			DROP TABLE IF EXISTS main."temp_matching_counts";
+			DROP TABLE IF EXISTS temp."temp_total_counts";
+			CREATE TEMP TABLE "temp_total_counts" (
 				"linked_article_id" INTEGER,
 				"linked_section_index" INTEGER,
-				"link_title" TEXT,
-				"ignored" INTEGER
+				"count" INTEGER
 			);
 			
-			-- Find links on disambiguation pages
-			insert into temp_disambig_links
-			select
-				L.article_id,
-				A.group_title,
-				L.linked_article_id,
-				L.linked_section_index,
-				L.link_title,
-				case when S.section_index is not null then 1 else not instr(lower(L.link_title), A.group_title) end
-			from links L, articles A
-			left join temp_see_also_sections S
-			on L.article_id = S.article_id and L.section_index = S.section_index
-			where A.is_disambig = 1 and L.article_id = A.id;
-			
-			-- drop temp see also sections table
-			drop table temp_see_also_sections;
-			
-			-- Create temp table for links
-			DROP TABLE IF EXISTS "temp_links";
-			CREATE TABLE "temp_links" (
-				"article_id" INTEGER,
-				"section_index" INTEGER,
-				"paragraph_index" INTEGER,
-				"sentence_index" INTEGER,
+			DROP TABLE IF EXISTS temp."temp_matching_counts";
+			CREATE TEMP TABLE "temp_matching_counts" (
+				"group_title" TEXT,
 				"linked_article_id" INTEGER,
 				"linked_section_index" INTEGER,
-				"group_title" TEXT
-			);
-			
-			insert into temp_links
-			select distinct
-				article_id,
-				section_index,
-				paragraph_index,
-				sentence_index,
-				linked_article_id,
-				linked_section_index,
-				group_title
-			from
-				links
-			where
-				is_on_disambig_page = 0;
-			
-			-- create temp table for grouped links
-			DROP TABLE IF EXISTS "temp_grouped_links";
-			CREATE TABLE "temp_grouped_links" (
-				"group_title" TEXT,
-				"article_id" INTEGER,
-				"section_index" INTEGER,
-				"is_on_disambig_page" INTEGER,  -- 0 = no, 1 = yes, 2 = yes, but ignored
-				"article_paragraph_count" INTEGER,
-				"linked_count_matching_title" INTEGER,
-				"linked_count_other_title" INTEGER
+				"count" INTEGER
 			);
-			
-			-- Add link counts
-			with total_counts as (
+		""")
+
+		if min_article_id is not None:
+			if number_of_workers <= 1:
+				conn.execute("insert into temp_total_counts " + WikiConverter.TOTAL_COUNTS_SQL, (min_article_id, max_article_id + 1))
+				conn.execute("insert into temp_matching_counts " + WikiConverter.MATCHING_COUNTS_SQL, (min_article_id, max_article_id + 1))
+			else:
+				range_size = (max_article_id + 1 - min_article_id + number_of_workers - 1) // number_of_workers
+				count_queue = mp.Queue(number_of_workers * 4)
+
+				worker_processes = []
+				for i in range(number_of_workers):
+					worker_process = mp.Process(
+						target=WikiConverter.count_grouped_links_task,
+						args=(db_path, min_article_id + i * range_size, min_article_id + (i + 1) * range_size, count_queue)
+					)
+					worker_process.start()
+					worker_processes.append(worker_process)
+
+				try:
+					running_workers = number_of_workers
+					while running_workers > 0:
+						message = receive(count_queue, worker_processes)
+						if message is None:
+							running_workers -= 1
+							continue
+
+						conn.executemany(*message)
+				except BaseException:
+					join_processes(worker_processes, terminate=True)
+					raise
+
+				join_processes(worker_processes)
+
+		conn.executescript("""
+			create unique index temp_total_counts_index on temp_total_counts (linked_article_id, linked_section_index);
+		""")
+
+	@staticmethod
+	def count_grouped_links_task(db_path: str, start_article_id: int, end_article_id: int, count_queue: mp.Queue):
+		queries = [
+			(WikiConverter.TOTAL_COUNTS_SQL, "insert into temp_total_counts values (?,?,?)"),
+			(WikiConverter.MATCHING_COUNTS_SQL, "insert into temp_matching_counts values (?,?,?,?)")
+		]
+
+		try:
+			conn = SqliteStorage(db_path).connect(read_only=True)
+
+			for select_sql, insert_sql in queries:
+				cursor = conn.execute(select_sql, (start_article_id, end_article_id))
+				while True:
+					rows = cursor.fetchmany(50000)
+					if len(rows) == 0:
+						break
+
+					count_queue.put((insert_sql, rows))
+
+			conn.close()
+		except Exception:
+			count_queue.put(WorkerError(traceback.format_exc()))
+		finally:
+			count_queue.put(None)  # End of data marker
+
+	@staticmethod
+	def find_senses(db_path: str, number_of_workers: int = 4, storage: str = "sqlite"):
+		"""
+		:param number_of_workers: Number of processes for counting links with sqlite storage
+		:param storage: Engine for aggregation steps. One of Storage.NAMES. Indexes and all other steps use sqlite.
+		"""
+		conn = sqlite3.connect(db_path)
+		analytic_storage = Storage.create(storage, db_path)
+
+		def analytic_step(script: str):
+			def run():
+				storage_conn = analytic_storage.connect()
+				analytic_storage.execute_script(storage_conn, script)
+				storage_conn.close()
+
+			return run
+
+		print("Grouping links...")
+		WikiConverter.run_steps(conn, [
+			("Indexing sections", """
+				create index if not exists sections_index on sections (article_id, section_index);
+				create index if not exists sections_parent_index on sections (article_id, parent_index);
+			"""),
+			("Indexing links on disambiguation pages", """
+				create index if not exists links_disambig_index on links (article_id) where is_on_disambig_page = 1;
+			"""),
+			("Finding 'see also' sections", """
+				-- Create temp table for see also sections
+				DROP TABLE IF EXISTS "temp_see_also_sections";
+				CREATE TABLE "temp_see_also_sections" (
+					"article_id" INTEGER,
+					"section_index" INTEGER
+				);
+				
+				-- Find section indexes for 'see also' sections and child sections on disambiguation pages
+				with
+				root_sections as (select S.article_id, S.section_index, S.parent_index from sections S, articles A where S.article_id = A.id and A.is_disambig = 1 and lower(S.title) = 'see also'),
+				child_sections_l1 as (select A.article_id, A.section_index, A.parent_index from sections A, root_sections B where A.article_id = B.article_id and A.parent_index = B.section_index),
+				child_sections_l2 as (select A.article_id, A.section_index, A.parent_index from sections A, child_sections_l1 B where A.article_id = B.article_id and A.parent_index = B.section_index),
+				child_sections_l3 as (select A.article_id, A.section_index, A.parent_index from sections A, child_sections_l2 B where A.article_id = B.article_id and A.parent_index = B.section_index)
+				insert into temp_see_also_sections
+				select article_id, section_index from root_sections
+				union select article_id, section_index from child_sections_l1
+				union select article_id, section_index from child_sections_l2
+				union select article_id, section_index from child_sections_l3;
+				
+				create unique index temp_see_also_sections_index on temp_see_also_sections (article_id, section_index);
+			"""),
+			("Finding links on disambiguation pages", """
+				-- Create temp table for links on disambiguation pages
+				DROP TABLE IF EXISTS "temp_disambig_links";
+				CREATE TABLE "temp_disambig_links" (
+					"article_id" INTEGER,
+					"group_title" TEXT,
+					"linked_article_id" INTEGER,
+					"linked_section_index" INTEGER,
+					"link_title" TEXT,
+					"ignored" INTEGER
+				);
+				
+				-- Find links on disambiguation pages
+				insert into temp_disambig_links
 				select
+					L.article_id,
+					A.group_title,
+					L.linked_article_id,
+					L.linked_section_index,
+					L.link_title,
+					case when S.section_index is not null then 1 else not instr(lower(L.link_title), A.group_title) end
+				from links L, articles A
+				left join temp_see_also_sections S
+				on L.article_id = S.article_id and L.section_index = S.section_index
+				where A.is_disambig = 1 and L.article_id = A.id and L.is_on_disambig_page = 1;
+				
+				-- drop temp see also sections table
+				drop table temp_see_also_sections;
+			"""),
+			("Collecting distinct links", analytic_step("""
+				-- Create temp table for links
+				DROP TABLE IF EXISTS "temp_links";
+				CREATE TABLE "temp_links" (
+					"article_id" INTEGER,
+					"section_index" INTEGER,
+					"paragraph_index" INTEGER,
+					"sentence_index" INTEGER,
+					"linked_article_id" INTEGER,
+					"linked_section_index" INTEGER,
+					"group_title" TEXT
+				);
+				
+				insert into temp_links
+				select distinct
+					article_id,
+					section_index,
+					paragraph_index,
+					sentence_index,
 					linked_article_id,
 					linked_section_index,
-					count(*) as count
+					group_title
 				from
-					(
-						select
-							*
-						from
-							temp_links
-						group by
-							article_id,
-							section_index,
-							paragraph_index,
-							sentence_index,
-							linked_article_id,
-							linked_section_index
-					)
-				group by
-					linked_article_id,
-					linked_section_index
-			),
-			matching_counts as (
+					links
+				where
+					is_on_disambig_page = 0;
+			""")),
+			("Indexing distinct links", """
+				create index temp_links_index on temp_links (linked_article_id, linked_section_index, group_title);
+			"""),
+			("Counting links", lambda: WikiConverter.count_grouped_links(conn, db_path, number_of_workers, analytic_storage)),
+			("Merging link counts", """
+				-- create temp table for grouped links
+				DROP TABLE IF EXISTS "temp_grouped_links";
+				CREATE TABLE "temp_grouped_links" (
+					"group_title" TEXT,
+					"article_id" INTEGER,
+					"section_index" INTEGER,
+					"is_on_disambig_page" INTEGER,  -- 0 = no, 1 = yes, 2 = yes, but ignored
+					"article_paragraph_count" INTEGER,
+					"linked_count_matching_title" INTEGER,
+					"linked_count_other_title" INTEGER
+				);
+				
+				-- Add link counts
+				insert into temp_grouped_links
 				select
+					M.group_title,
+					M.linked_article_id,
+					M.linked_section_index,
+					0,
+					0,
+					M.count,
+					T.count - M.count
+				from
+					temp_matching_counts M
+				left join temp_total_counts T on
+					M.linked_article_id = T.linked_article_id
+					and M.linked_section_index = T.linked_section_index;
+				
+				-- Drop temp tables for links
+				drop table temp_links;
+				drop table temp_total_counts;
+				drop table temp_matching_counts;
+				
+				-- insert links from disambig pages
+				insert into temp_grouped_links
+				select distinct
 					group_title,
 					linked_article_id,
 					linked_section_index,
-					count(*) as count
+					1,
+					0,
+					0,
+					0
 				from
-					temp_links
-				group by
-					group_title,
-					linked_article_id,
-					linked_section_index
-			)
-			insert into temp_grouped_links
-			select
-				M.group_title,
-				M.linked_article_id,
-				M.linked_section_index,
-				0,
-				0,
-				M.count,
-				T.count - M.count
-			from
-				matching_counts M
-			left join total_counts T on
-				M.linked_article_id = T.linked_article_id
-				and M.linked_section_index = T.linked_section_index;
-			
-			-- Drop temp table for links
-			drop table temp_links;
-			
-			-- insert links from disambig pages
-			insert into temp_grouped_links
-			select distinct
-				group_title,
-				linked_article_id,
-				linked_section_index,
-				1,
-				0,
-				0,
-				0
-			from
-				temp_disambig_links
-			where
-				ignored = 0;
-			
-			-- add article counts
-			with article_paragraph_counts as (
+					temp_disambig_links
+				where
+					ignored = 0;
+			"""),
+			("Adding paragraph counts", """
+				-- add article counts
+				with article_paragraph_counts as (
+					select
+						article_id,
+						sum(paragraph_count) as count
+					from
+						sections
+					group by
+						article_id
+				),
+				temp_article_groups as (
+					select distinct
+						group_title,
+						article_id,
+						section_index
+					from
+						temp_grouped_links
+					where
+						section_index = -1
+				)
+				insert into temp_grouped_links
 				select
-					article_id,
-					sum(paragraph_count) as count
+					A.group_title,
+					A.article_id,
+					A.section_index,
+					0,
+					C.count,
+					0,
+					0
 				from
-					sections
-				group by
-					article_id
-			),
-			temp_article_groups as (
-				select distinct
-					group_title,
-					article_id,
-					section_index
+					temp_article_groups A,
+					article_paragraph_counts C
+				where
+					A.article_id = C.article_id;
+				
+				-- add section counts
+				with temp_section_groups as (
+					select distinct
+						group_title,
+						article_id,
+						section_index
+					from
+						temp_grouped_links
+					where
+						section_index >= 0
+				)
+				insert into temp_grouped_links
+				select
+					S.group_title,
+					S.article_id,
+					S.section_index,
+					0,
+					C.total_paragraph_count,
+					0,
+					0
 				from
-					temp_grouped_links
+					temp_section_groups S,
+					sections C
 				where
-					section_index = -1
-			)
-			insert into temp_grouped_links
-			select
-				A.group_title,
-				A.article_id,
-				A.section_index,
-				0,
-				C.count,
-				0,
-				0
-			from
-				temp_article_groups A,
-				article_paragraph_counts C
-			where
-				A.article_id = C.article_id;
-			
-			-- add section counts
-			with temp_section_groups as (
-				select distinct
+					S.article_id = C.article_id
+					and S.section_index = C.section_index;
+			"""),
+			("Merging grouped links", """
+				-- create table for grouped links and insert merged rows from temp table
+				DROP TABLE IF EXISTS "grouped_links";
+				CREATE TABLE "grouped_links" (
+					"group_title" TEXT,
+					"article_id" INTEGER,
+					"section_index" INTEGER,
+					"is_on_disambig_page" INTEGER,
+					"article_paragraph_count" INTEGER,
+					"linked_count_matching_title" INTEGER,
+					"linked_count_other_title" INTEGER
+				);
+				
+				insert into grouped_links
+				select
 					group_title,
 					article_id,
-					section_index
+					section_index,
+					max(is_on_disambig_page),
+					max(article_paragraph_count),
+					max(linked_count_matching_title),
+					max(linked_count_other_title)
 				from
 					temp_grouped_links
-				where
-					section_index >= 0
-			)
-			insert into temp_grouped_links
-			select
-				S.group_title,
-				S.article_id,
-				S.section_index,
-				0,
-				C.total_paragraph_count,
-				0,
-				0
-			from
-				temp_section_groups S,
-				sections C
-			where
-				S.article_id = C.article_id
-				and S.section_index = C.section_index;
-			
-			-- create table for grouped links and insert merged rows from temp table
-			DROP TABLE IF EXISTS "grouped_links";
-			CREATE TABLE "grouped_links" (
+				group by
+					group_title,
+					article_id,
+					section_index;
+				
+				-- drop temp tables
+				drop table temp_disambig_links;
+				drop table temp_grouped_links;
+			""")
+		])
+
+		print("Finding senses...")
+		WikiConverter.run_steps(conn, [
+			("Looking for senses", """
+				DROP TABLE IF EXISTS "raw_senses";
+				CREATE TABLE "raw_senses" (
 				"group_title" TEXT,
 				"article_id" INTEGER,
 				"section_index" INTEGER,
-				"is_on_disambig_page" INTEGER,
-				"article_paragraph_count" INTEGER,
 				"linked_count_matching_title" INTEGER,
-				"linked_count_other_title" INTEGER
-			);
-			
-			insert into grouped_links
-			select
-				group_title,
-				article_id,
-				section_index,
-				max(is_on_disambig_page),
-				max(article_paragraph_count),
-				max(linked_count_matching_title),
-				max(linked_count_other_title)
-			from
-				temp_grouped_links
-			group by
-				group_title,
-				article_id,
-				section_index;
-			
-			-- drop temp tables
-			drop table temp_disambig_links;
-			drop table temp_grouped_links;
-		""")
-
-		print("Looking for senses...")
-		conn.executescript("""
-			DROP TABLE IF EXISTS "raw_senses";
-			CREATE TABLE "raw_senses" (
-			"group_title" TEXT,
-			"article_id" INTEGER,
-			"section_index" INTEGER,
-			"linked_count_matching_title" INTEGER,
-			"linked_count_other_title" INTEGER,
-			"article_paragraph_count" INTEGER
-			);
-			
-			with disambig_group_titles as (
-				select distinct group_title
-				from articles
-				where is_disambig = 1
-			)
-			insert into raw_senses
-			select
-				group_title,
-				article_id,
-				section_index,
-				linked_count_matching_title,
-				linked_count_other_title,
-				article_paragraph_count
-			from grouped_links
-			where
-				group_title in disambig_group_titles
-				and article_paragraph_count + linked_count_matching_title + linked_count_other_title >= 14 -- at least 14 examples
-				and (is_on_disambig_page = 1 or linked_count_matching_title >= 5);  -- not ignored on disambig. page or linked at least 5 times using group title
-			
-			create unique index if not exists raw_senses_index on raw_senses (group_title, article_id, section_index);
-		""")
-
-		print("Building list of groups and senses...")
-		conn.executescript("""
-			DROP TABLE IF EXISTS "sense_groups";
-			CREATE TABLE "sense_groups" (
-				"id" INTEGER PRIMARY KEY AUTOINCREMENT,
-				"group_title" TEXT
-			);
-			
-			insert into sense_groups (group_title)
-			select group_title
-			from raw_senses
-			group by group_title
-			order by sum(article_paragraph_count + linked_count_matching_title + linked_count_other_title) desc;
-			
-			update sense_groups set id = id - 1;  -- offset id by -1 to make it start at 0
-			
-			DROP TABLE IF EXISTS "senses";
-			CREATE TABLE "senses" (
-				"id" INTEGER PRIMARY KEY AUTOINCREMENT,
-				"article_id" INTEGER,
-				"section_index" INTEGER
-			);
-			
-			insert into senses (article_id, section_index)
-			select article_id, section_index
-			from raw_senses
-			group by article_id, section_index
-			order by sum(article_paragraph_count + linked_count_matching_title + linked_count_other_title) desc;
-			
-			update senses set id = id - 1;  -- offset id by -1 to make it start at 0
-			
-			DROP TABLE IF EXISTS "sense_group_senses";
-			CREATE TABLE "sense_group_senses" (
-				"id" INTEGER PRIMARY KEY,
-				"sense_group" INTEGER,
-				"sense" INTEGER
-			);
-			
-			insert into sense_group_senses (sense_group, sense)
-			select
-				G.id,
-				S.id
-			from raw_senses R, sense_groups G, senses S
-			where R.group_title = G.group_title and R.article_id = S.article_id and R.section_index = S.section_index
-			order by article_paragraph_count + linked_count_matching_title + linked_count_other_title desc;
-			
-			update sense_group_senses set id = id - 1;  -- offset id by -1 to make it start at 0
-		""")
-
-		print("Looking for alternative group titles using redirects to disambig pages...")
-		conn.executescript("""
-			-- Find alternative group titles using redirects
-			DROP TABLE IF EXISTS "alternative_group_titles";
-			CREATE TABLE "alternative_group_titles" (
-				"group_title" TEXT,
-				"alternative_group_title" TEXT
-			);
-			
-			insert into alternative_group_titles
-			select
-				A.group_title,
-				R.group_title
-			from
-				articles R,
-				articles A
-			where
-				R.redirect_article_title is not null
-				and R.redirect_article_title = A.title
-				and A.is_disambig = 1
-				and R.group_title != A.group_title
-			group by R.group_title;
-			
-			-- Delete alternative titles that are used for multiple groups or match actual groups.
-			delete from alternative_group_titles
-			where alternative_group_title in (
-				select alternative_group_title
-				from alternative_group_titles
-				group by alternative_group_title having count(*) > 1
-			)
-			or alternative_group_title in (
-				select distinct group_title from sense_groups
-			);
-		""")
+				"linked_count_other_title" INTEGER,
+				"article_paragraph_count" INTEGER
+				);
+				
+				with disambig_group_titles as (
+					select distinct group_title
+					from articles
+					where is_disambig = 1
+				)
+				insert into raw_senses
+				select
+					group_title,
+					article_id,
+					section_index,
+					linked_count_matching_title,
+					linked_count_other_title,
+					article_paragraph_count
+				from grouped_links
+				where
+					group_title in disambig_group_titles
+					and article_paragraph_count + linked_count_matching_title + linked_count_other_title >= 14 -- at least 14 examples
+					and (is_on_disambig_page = 1 or linked_count_matching_title >= 5);  -- not ignored on disambig. page or linked at least 5 times using group title
+				
+				create unique index if not exists raw_senses_index on raw_senses (group_title, article_id, section_index);
+			"""),
+			("Building list of groups and senses", """
+				DROP TABLE IF EXISTS "sense_groups";
+				CREATE TABLE "sense_groups" (
+					"id" INTEGER PRIMARY KEY AUTOINCREMENT,
+					"group_title" TEXT
+				);
+				
+				insert into sense_groups (group_title)
+				select group_title
+				from raw_senses
+				group by group_title
+				order by sum(article_paragraph_count + linked_count_matching_title + linked_count_other_title) desc;
+				
+				update sense_groups set id = id - 1;  -- offset id by -1 to make it start at 0
+				
+				DROP TABLE IF EXISTS "senses";
+				CREATE TABLE "senses" (
+					"id" INTEGER PRIMARY KEY AUTOINCREMENT,
+					"article_id" INTEGER,
+					"section_index" INTEGER
+				);
+				
+				insert into senses (article_id, section_index)
+				select article_id, section_index
+				from raw_senses
+				group by article_id, section_index
+				order by sum(article_paragraph_count + linked_count_matching_title + linked_count_other_title) desc;
+				
+				update senses set id = id - 1;  -- offset id by -1 to make it start at 0
+				
+				DROP TABLE IF EXISTS "sense_group_senses";
+				CREATE TABLE "sense_group_senses" (
+					"id" INTEGER PRIMARY KEY,
+					"sense_group" INTEGER,
+					"sense" INTEGER
+				);
+				
+				insert into sense_group_senses (sense_group, sense)
+				select
+					G.id,
+					S.id
+				from raw_senses R, sense_groups G, senses S
+				where R.group_title = G.group_title and R.article_id = S.article_id and R.section_index = S.section_index
+				order by article_paragraph_count + linked_count_matching_title + linked_count_other_title desc;
+				
+				update sense_group_senses set id = id - 1;  -- offset id by -1 to make it start at 0
+			"""),
+			("Looking for alternative group titles using redirects to disambig pages", """
+				-- Find alternative group titles using redirects
+				DROP TABLE IF EXISTS "alternative_group_titles";
+				CREATE TABLE "alternative_group_titles" (
+					"group_title" TEXT,
+					"alternative_group_title" TEXT
+				);
+				
+				insert into alternative_group_titles
+				select
+					A.group_title,
+					R.group_title
+				from
+					articles R,
+					articles A
+				where
+					R.redirect_article_title is not null
+					and R.redirect_article_title = A.title
+					and A.is_disambig = 1
+					and R.group_title != A.group_title
+				group by R.group_title;
+				
+				-- Delete alternative titles that are used for multiple groups or match actual groups.
+				delete from alternative_group_titles
+				where alternative_group_title in (
+					select alternative_group_title
+					from alternative_group_titles
+					group by alternative_group_title having count(*) > 1
+				)
+				or alternative_group_title in (
+					select distinct group_title from sense_groups
+				);
+			""")
+		])
 
 		print("Committing changes...")
 
@@ -827,7 +1397,7 @@ class WikiConverter:
 		conn.close()
 
 	@staticmethod
-	def divide_data(db_path: str, test_set_sizes: List[float]):
+	def divide_data(db_path: str, test_set_sizes: List[float], seed: int = 42):
 		conn = sqlite3.connect(db_path)
 		c = conn.cursor()
 
@@ -843,10 +1413,8 @@ class WikiConverter:
 				"dataset" INTEGER
 			);
 			
-			create unique index if not exists data_index on data (sense_group_sense_id, article_id, section_index, paragraph_index, sentence_index);
-			
 			-- Link paragraphs
-			insert or ignore into data
+			insert into data
 			select distinct
 				L.article_id,
 				L.section_index,
@@ -866,213 +1434,159 @@ class WikiConverter:
 				and SGS.id is not null;
 		""")
 
-		# Load sections into RAM for fast access
-		sections = {}  # article_id -> [(subsection_index, subsection_parent, paragraph_count)]
+		# Paragraphs of sense sections and their subsections
+		section_tree = SectionTree.load(conn)
 
-		sql = """
-			select
-				article_id,
-				section_index,
-				ifnull(parent_index, -1),
-				paragraph_count
-			from sections
-			order by article_id, section_index
-		"""
+		raw_senses = fetch_array(
+			conn,
+			"""
+				select distinct
+					R.article_id,
+					R.section_index,
+					SGS.id
+				from raw_senses R
+				left join sense_groups G on G.group_title = R.group_title
+				left join senses S on S.article_id = R.article_id and S.section_index = R.section_index
+				left join sense_group_senses SGS on SGS.sense_group = G.id and SGS.sense = S.id
+				where SGS.id is not null
+			""",
+			3
+		)
 
-		current_article_id = None
-		current_article_sections = []
-		for article_id, subsection_index, subsection_parent, paragraph_count in c.execute(sql):
-			if article_id != current_article_id:
-				if len(current_article_sections) > 0:
-					sections[current_article_id] = current_article_sections
-					current_article_sections = []
-				current_article_id = article_id
+		total_p_count = 0
 
-			current_article_sections.append((subsection_index, subsection_parent, paragraph_count))
+		with BulkWriter(conn, disable_journal=False, print_report=False) as writer:
+			for chunk_start in range(0, len(raw_senses), 100000):
+				chunk = raw_senses[chunk_start:chunk_start + 100000]
 
-		if len(current_article_sections) > 0:
-			sections[current_article_id] = current_article_sections
-			del current_article_sections
+				sense_indexes, section_indexes, paragraph_indexes = section_tree.paragraphs(chunk[:, 0], chunk[:, 1])
 
-		sql = """
-			select
-				R.article_id,
-				R.section_index,
-				SGS.id
-			from raw_senses R
-			left join sense_groups G on G.group_title = R.group_title
-			left join senses S on S.article_id = R.article_id and S.section_index = R.section_index
-			left join sense_group_senses SGS on SGS.sense_group = G.id and SGS.sense = S.id
-		"""
-
-		total_p_count = 0
-
-		cached_article_id = None
-		cached_article_sections = []
+				writer.insert(
+					"insert into data values (?,?,?,null,?,null)",
+					list(zip(
+						chunk[sense_indexes, 0].tolist(),
+						section_indexes.tolist(),
+						paragraph_indexes.tolist(),
+						chunk[sense_indexes, 2].tolist()
+					))
+				)
 
-		insert_buffer = []
+				total_p_count += len(sense_indexes)
+				print("Paragraph Count: {:,d}".format(total_p_count), end="\r")
 
-		c2 = conn.cursor()
-		for article_id, section_index, sgs_id in c2.execute(sql):
-			if cached_article_id != article_id:
-				cached_article_id = article_id
-				cached_article_sections = sections.get(article_id, [])
-
-			parent_sections = {section_index}
-			for subsection_index, subsection_parent, paragraph_count in cached_article_sections:
-				if subsection_parent in parent_sections:
-					parent_sections.add(subsection_index)
-				elif subsection_index not in parent_sections:
-					continue
+			print("")
 
-				for paragraph_index in range(paragraph_count):
-					insert_buffer.append(
-						(
-							article_id,
-							subsection_index,
-							paragraph_index,
-							None,
-							sgs_id,
-							None
-						)
-					)
+			# Links and sections are unique by construction. Created after loading to keep inserts fast.
+			writer.execute("create unique index if not exists data_index on data (sense_group_sense_id, article_id, section_index, paragraph_index, sentence_index)")
 
-			if len(insert_buffer) >= 500:
-				c.executemany("insert or ignore into data values (?,?,?,?,?,?)", insert_buffer)
-				insert_buffer = []
+		del section_tree
 
-			total_p_count += len(insert_buffer)
-			print("Paragraph Count: {:,d}".format(total_p_count), end="\r")
+		print("Dividing data into test sets...")
 
-		if len(insert_buffer) >= 1:
-			c.executemany("insert into data values (?,?,?,?,?,?)", insert_buffer)
+		data = fetch_array(
+			conn,
+			"""
+				select
+					rowid,
+					sense_group_sense_id,
+					article_id,
+					section_index,
+					paragraph_index,
+					ifnull(sentence_index, -1)
+				from
+					data
+			""",
+			6
+		)
 
-		del sections
+		datasets = WikiConverter.assign_datasets(data[:, 1], data[:, 2:6], test_set_sizes, seed=seed)
 
-		conn.commit()
+		# Write back datasets in one statement. Train set (0) is the default.
+		c.execute("DROP TABLE IF EXISTS temp.data_datasets")
+		c.execute("CREATE TEMP TABLE data_datasets (id INTEGER PRIMARY KEY, dataset INTEGER)")
 
-		print("Calculating number of examples in test sets...")
+		test_rows = np.flatnonzero(datasets > 0)
+		c.executemany(
+			"INSERT INTO temp.data_datasets VALUES (?,?)",
+			zip(data[test_rows, 0].tolist(), datasets[test_rows].tolist())
+		)
 
-		assert sum(test_set_sizes) < 1.0
-		test_set_counts = {}  # sgs_id -> [(count1, count2, ...)]
+		c.execute("update data set dataset = 0")
+		c.execute("""
+			update data
+			set dataset = (select T.dataset from temp.data_datasets T where T.id = data.rowid)
+			where rowid in (select id from temp.data_datasets)
+		""")
+		c.execute("DROP TABLE temp.data_datasets")
+		c.execute("create index if not exists data_dataset_index on data (dataset)")
 
-		sql = """
-			select
-				sense_group_sense_id,
-				count(*)
-			from
-				data
-			group by
-				sense_group_sense_id
-		"""
-		for sgs_id, count in c.execute(sql):
-			assert count >= 14
-			test_set_counts[sgs_id] = tuple(map(lambda p: int(round(count * p)), test_set_sizes))
+		print("Cleaning up and committing changes...")
+		conn.executescript("vacuum;")
 
-		print("Dividing data into test sets...")
+		conn.commit()
+		conn.close()
 
-		sql = """
-			select
-				article_id,
-				section_index,
-				paragraph_index,
-				sentence_index
-			from
-				data
-			where
-				sense_group_sense_id = ?
-			order by
-				random()
+	@staticmethod
+	def assign_datasets(sense_ids: np.ndarray, paragraph_ids: np.ndarray, test_set_sizes: List[float], seed: int = 42) -> np.ndarray:
 		"""
-
-		sql2 = """
-			update
-				data
-			set
-				dataset = ?
-			where
-				sense_group_sense_id = ?
-				and article_id = ?
-				and section_index = ?
-				and paragraph_index = ?
-				and ifnull(sentence_index, -1) = ?
+		Stratified split of examples into test sets and train set. Every sense gets its share of examples in each test
+		set. A paragraph is assigned to one data set only, even if it is an example for multiple senses, so no text of
+		a test set appears in the train set.
+
+		Senses are processed in descending order. Examples whose paragraph was already assigned by a previous sense keep
+		that data set and count towards the targets. Remaining targets are filled with randomly chosen unassigned
+		paragraphs, all other unassigned paragraphs go to the train set.
+
+		:param sense_ids: Array of shape [n] with sense group sense id of each example
+		:param paragraph_ids: Array of shape [n, k] with columns identifying the paragraph (or sentence) of each example
+		:param test_set_sizes: Fraction of examples in each test set
+		:param seed: Seed for random number generator. Same inputs and seed produce the same split.
+		:return: Array of shape [n] with data set of each example. 0 is the train set, i+1 is test set i.
 		"""
+		assert sum(test_set_sizes) < 1.0
 
-		update_buffer = []
-
-		paragraphs_already_in_datasets = []
-		for _ in range(len(test_set_sizes) + 1):  # train set is last item
-			paragraphs_already_in_datasets.append(set())
-
-		for sgs_id, test_counts in sorted(test_set_counts.items(), key=lambda x: x[0], reverse=True):
-			all_test_paragraphs = []
-			for _ in range(len(test_counts)):
-				all_test_paragraphs.append([])
+		if len(sense_ids) == 0:
+			return np.zeros(0, dtype=np.int8)
 
-			for art_id, sec_idx, par_idx, sen_idx in c.execute(sql, (sgs_id,)):
-				paragraph_id = (art_id, sec_idx, par_idx, sen_idx if sen_idx is not None else -1)
+		random_state = np.random.RandomState(seed)
 
-				existing_in_set_index = None
-				for i in range(len(paragraphs_already_in_datasets)):
-					if paragraph_id in paragraphs_already_in_datasets[i]:
-						existing_in_set_index = i
-						break
+		_, example_paragraphs = np.unique(paragraph_ids, axis=0, return_inverse=True)
+		example_paragraphs = example_paragraphs.reshape(-1)
+		paragraph_datasets = np.full(example_paragraphs.max() + 1, -1, dtype=np.int8)  # -1: not assigned yet
 
-				if existing_in_set_index is not None:
-					if existing_in_set_index < len(all_test_paragraphs):
-						all_test_paragraphs[existing_in_set_index].append(paragraph_id)
-					continue
+		order = np.argsort(sense_ids, kind="stable")
+		sorted_sense_ids = sense_ids[order]
+		unique_sense_ids, sense_starts, sense_counts = np.unique(sorted_sense_ids, return_index=True, return_counts=True)
 
-				need_more = False
-				for test_paragraphs, target_count in zip(all_test_paragraphs, test_counts):
-					if len(test_paragraphs) < target_count:
-						need_more = True
-						break
+		missing_count = 0
 
-				if not need_more:
-					paragraphs_already_in_datasets[-1].add(paragraph_id)
-					continue
-
-				# Paragraph not yet in any data sets. Add to first free
-				for test_paragraphs, target_count, paragraphs_in_set in zip(all_test_paragraphs, test_counts, paragraphs_already_in_datasets[:-1]):
-					if len(test_paragraphs) < target_count:
-						test_paragraphs.append(paragraph_id)
-						paragraphs_in_set.add(paragraph_id)
-						break
+		for sense_id, sense_start, sense_count in zip(unique_sense_ids[::-1], sense_starts[::-1], sense_counts[::-1]):
+			assert sense_count >= 14
 
-			if sum(map(len, all_test_paragraphs)) < sum(test_counts):
-				print("Warning: Did not reach target example count for sgs id", sgs_id)
+			paragraphs = example_paragraphs[order[sense_start:sense_start + sense_count]]
+			datasets = paragraph_datasets[paragraphs]
 
-			for i in range(len(all_test_paragraphs)):
-				dataset_index = i + 1
-				test_paragraphs = all_test_paragraphs[i]
+			unassigned_paragraphs = paragraphs[datasets < 0]
+			unassigned_paragraphs = unassigned_paragraphs[random_state.permutation(len(unassigned_paragraphs))]
 
-				for art_id, sec_idx, par_idx, sen_idx in test_paragraphs:
-					update_buffer.append(
-						(
-							dataset_index,
-							sgs_id,
-							art_id,
-							sec_idx,
-							par_idx,
-							sen_idx
-						)
-					)
+			offset = 0
+			for i, test_set_size in enumerate(test_set_sizes):
+				target_count = int(round(sense_count * test_set_size))
+				need_count = max(target_count - int(np.count_nonzero(datasets == i + 1)), 0)
 
-				if len(update_buffer) >= 5000:
-					c.executemany(sql2, update_buffer)
-					update_buffer = []
+				new_paragraphs = unassigned_paragraphs[offset:offset + need_count]
+				paragraph_datasets[new_paragraphs] = i + 1
+				offset += len(new_paragraphs)
 
-		if len(update_buffer) >= 1:
-			c.executemany(sql2, update_buffer)
+				if len(new_paragraphs) < need_count:
+					missing_count += 1
 
-		c.execute("update data set dataset = 0 where dataset is null")
+			paragraph_datasets[unassigned_paragraphs[offset:]] = 0
 
-		print("Cleaning up and committing changes...")
-		conn.executescript("vacuum;")
+		if missing_count > 0:
+			print("Warning: Did not reach target example count of {:,d} test sets".format(missing_count))
 
-		conn.commit()
-		conn.close()
+		return paragraph_datasets[example_paragraphs]
 
 	@staticmethod
 	def worker_task(page_queue: mp.Queue, sql_queue: mp.Queue, paragraph_queue: mp.Queue):
@@ -1229,6 +1743,22 @@ class WikiConverter:
 
 				tokens_queues[page_id % number_of_tokens_queues].put(token_infos)
 
+	@staticmethod
+	def revision_task(sql_queue: mp.Queue, revision_queue: mp.Queue):
+		while True:
+			revisions = revision_queue.get()
+			if revisions is None:
+				break
+
+			page_revisions = [revision for revision in revisions if revision[1] is not None]
+			deleted_pages = [(revision[0],) for revision in revisions if revision[1] is None]
+
+			if len(page_revisions) > 0:
+				sql_queue.put(("insert into 'page_revisions' values (?,?,?)", page_revisions))
+
+			if len(deleted_pages) > 0:
+				sql_queue.put(("insert into 'deleted_pages' values (?)", deleted_pages))
+
 	@staticmethod
 	def count_task(sql_queue: mp.Queue, count_queue: mp.Queue):
 		section_counts = {}  # (article_id, section_index) -> count
@@ -1267,25 +1797,21 @@ class WikiConverter:
 		""")
 
 	@staticmethod
-	def db_task(db_path: str, sql_queue: mp.Queue):
+	def db_task(db_path: str, sql_queue: mp.Queue, disable_journal: bool = True):
 		conn = sqlite3.connect(db_path)
-		c = conn.cursor()
 
-		while True:
-			sql = sql_queue.get()
-			if sql is None:
-				break
+		with BulkWriter(conn, disable_journal=disable_journal) as writer:
+			while True:
+				sql = sql_queue.get()
+				if sql is None:
+					break
 
-			if isinstance(sql, str):
-				c.execute(sql)
-			else:
-				sql, values = sql
-				if len(values) == 1:
-					c.execute(sql, values[0])
+				if isinstance(sql, str):
+					writer.execute(sql)
 				else:
-					c.executemany(sql, values)
+					sql, values = sql
+					writer.insert(sql, values)
 
-		conn.commit()
 		conn.close()
 
 	@staticmethod
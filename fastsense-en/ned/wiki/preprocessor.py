@@ -1,18 +1,39 @@
 import re
+from collections import OrderedDict
+from functools import lru_cache
 
 from .utils import normalize_page_title
 
+TEMPLATE_NAME_PATTERN = re.compile(r"^{{\s*(.*?)\s*((\|)|(}}))", flags=re.DOTALL)
+
+_NOT_CACHED = object()
+
+
+@lru_cache(maxsize=65536)
+def _normalize_template_name(raw_name):
+	return normalize_page_title(raw_name.strip())
+
 
 class Template:
 	def __init__(self, wikitext):
 		self.wikitext = wikitext
+		self._name = None
+		self._name_parsed = False
+
+	@property
+	def name(self):
+		"""Normalized template name. Parsed on first access, because cached expansions don't need it."""
+		if not self._name_parsed:
+			name_match = TEMPLATE_NAME_PATTERN.match(self.wikitext)
+			if name_match is not None:
+				self._name = _normalize_template_name(name_match.group(1))
+			else:
+				print("[Warning] Could not parse template name!")
+				self._name = None
 
-		name_match = re.match(r"^{{\s*(.*?)\s*((\|)|(}}))", wikitext, flags=re.DOTALL)
-		if name_match is not None:
-			self.name = normalize_page_title(name_match.group(1).strip())
-		else:
-			print("[Warning] Could not parse template name!")
-			self.name = None
+			self._name_parsed = True
+
+		return self._name
 
 
 class Table:
@@ -23,8 +44,14 @@ class Table:
 class WikitextPreprocessor:
 	"""Simplifies wikitext before parsing. Expands templates, removes tables, and simplifies lists."""
 
-	def __init__(self, template_functions: dict):
+	def __init__(self, template_functions: dict, template_cache_size: int = 100000):
+		"""
+		:param template_functions: Maps normalized template names to replacement strings or expansion functions.
+		:param template_cache_size: Maximum number of expanded templates kept per preprocessor (LRU). 0 disables the cache.
+		"""
 		self.template_functions = template_functions
+		self.template_cache_size = template_cache_size
+		self.template_cache = OrderedDict()  # template wikitext -> expanded text (None for unknown templates)
 
 	def tokenize(self, page_text: str, table_mode=False):
 		page_text = re.sub(
@@ -114,19 +141,44 @@ class WikitextPreprocessor:
 		tokens = self.tokenize(text, table_mode=True)
 		return [token for token in tokens if not isinstance(token, Table)]
 
+	def expand_template(self, template: Template):
+		"""
+		Expands a single template. Results are cached by template wikitext, because identical invocations (e.g.
+		{{nbsp}} or {{convert|...}}) repeat very often across the dump.
+
+		:param template: Template token
+		:return: Expanded text or None if the template is unknown
+		"""
+
+		cache = self.template_cache
+		expanded_text = cache.get(template.wikitext, _NOT_CACHED)
+		if expanded_text is not _NOT_CACHED:
+			cache.move_to_end(template.wikitext)
+			return expanded_text
+
+		template_function = self.template_functions.get(template.name, None)
+		if template_function is None or isinstance(template_function, str):
+			expanded_text = template_function
+		else:
+			expanded_text = template_function(template)
+
+		if self.template_cache_size > 0:
+			cache[template.wikitext] = expanded_text
+			if len(cache) > self.template_cache_size:
+				cache.popitem(last=False)
+
+		return expanded_text
+
 	def expand_templates(self, tokens: list, unknown_templates_replacement: str = " "):
 		output = []
 
 		for token in tokens:
 			if isinstance(token, Template):
-				template_function = self.template_functions.get(token.name, None)
-				if template_function is None:
-					if unknown_templates_replacement != "":
-						token = unknown_templates_replacement
-				elif isinstance(template_function, str):
-					token = template_function
-				else:
-					token = template_function(token)
+				expanded_text = self.expand_template(token)
+				if expanded_text is not None:
+					token = expanded_text
+				elif unknown_templates_replacement != "":
+					token = unknown_templates_replacement
 
 			output.append(token)
 
@@ -0,0 +1,176 @@
+import sqlite3
+import numpy as np
+
+from .bulk import fetch_array
+
+
+class SectionTree:
+	"""
+	Section trees of all articles, loaded from the 'sections' table, with a descendant-interval index.
+
+	Sections are numbered in document order, so the sections of an article form a pre-order traversal of its section
+	tree. After sorting by (article id, section index), a section and all its direct and indirect subsections occupy
+	a contiguous range of positions, which ends at the next section with the same or a lower depth. Looking up all
+	sections or paragraphs below a section is a range lookup instead of a tree walk.
+	"""
+
+	SECTION_INDEX_BITS = 20  # for combined (article id, section index) keys
+
+	def __init__(self, sections: np.ndarray):
+		"""
+		:param sections: Array of shape [n, 4] with (article id, section index, parent index or -1, paragraph count)
+			rows, sorted by article id and section index
+		"""
+		self.article_ids = sections[:, 0]
+		self.section_indexes = sections[:, 1]
+		self.paragraph_counts = sections[:, 3]
+
+		self.keys = self._keys(self.article_ids, self.section_indexes)
+
+		# Range of positions of each article
+		self.unique_article_ids, article_starts, article_counts = np.unique(
+			self.article_ids,
+			return_index=True,
+			return_counts=True
+		)
+		self.article_starts = article_starts
+		self.article_ends = article_starts + article_counts
+
+		# Position of parent section or -1
+		parent_keys = self._keys(self.article_ids, sections[:, 2])
+		self.parent_positions = self._find(self.keys, parent_keys)
+		self.parent_positions[sections[:, 2] < 0] = -1
+
+		self.depths = self._depths(self.parent_positions)
+		self.subtree_ends = self._subtree_ends(self.depths, np.repeat(self.article_ends, article_counts))
+
+		# First paragraph row of each section in a flat list of all paragraphs
+		self.paragraph_offsets = np.zeros(len(sections) + 1, dtype=np.int64)
+		np.cumsum(self.paragraph_counts, out=self.paragraph_offsets[1:])
+
+	@staticmethod
+	def load(conn: sqlite3.Connection) -> "SectionTree":
+		sections = fetch_array(
+			conn,
+			"""
+				select
+					article_id,
+					section_index,
+					ifnull(parent_index, -1),
+					ifnull(paragraph_count, 0)
+				from sections
+				order by article_id, section_index
+			""",
+			4
+		)
+
+		return SectionTree(sections)
+
+	@classmethod
+	def _keys(cls, article_ids: np.ndarray, section_indexes: np.ndarray) -> np.ndarray:
+		return (article_ids.astype(np.int64) << cls.SECTION_INDEX_BITS) + section_indexes
+
+	@staticmethod
+	def _find(sorted_keys: np.ndarray, keys: np.ndarray) -> np.ndarray:
+		"""
+		Returns positions of keys in sorted_keys or -1 if missing.
+		"""
+		if len(sorted_keys) == 0:
+			return np.full(len(keys), -1, dtype=np.int64)
+
+		positions = np.minimum(np.searchsorted(sorted_keys, keys), len(sorted_keys) - 1)
+		return np.where(sorted_keys[positions] == keys, positions, -1)
+
+	@staticmethod
+	def _depths(parent_positions: np.ndarray) -> np.ndarray:
+		"""
+		Depth of each section (0 for top-level sections), computed by pointer jumping in O(log(max depth)) steps.
+		"""
+		depths = (parent_positions >= 0).astype(np.int64)
+		ancestors = parent_positions.copy()
+
+		for _ in range(64):  # protection against cycles in malformed trees
+			has_ancestor = ancestors >= 0
+			if not has_ancestor.any():
+				break
+
+			next_ancestors = np.where(has_ancestor, ancestors, 0)
+			depths = depths + np.where(has_ancestor, depths[next_ancestors], 0)
+			ancestors = np.where(has_ancestor, ancestors[next_ancestors], -1)
+
+		return depths
+
+	@staticmethod
+	def _subtree_ends(depths: np.ndarray, article_ends: np.ndarray) -> np.ndarray:
+		"""
+		End position (exclusive) of the subtree of each section: the next position with the same or a lower depth,
+		but not beyond the end of the article.
+		"""
+		positions = np.arange(len(depths))
+		subtree_ends = article_ends.copy()
+
+		for depth in np.unique(depths):
+			boundaries = np.flatnonzero(depths <= depth)
+			sections = np.flatnonzero(depths == depth)
+
+			next_boundary_indexes = np.searchsorted(boundaries, positions[sections], side="right")
+			next_boundaries = np.append(boundaries, len(depths))[next_boundary_indexes]
+
+			subtree_ends[sections] = np.minimum(next_boundaries, article_ends[sections])
+
+		return subtree_ends
+
+	@staticmethod
+	def _expand_ranges(starts: np.ndarray, ends: np.ndarray) -> (np.ndarray, np.ndarray):
+		"""
+		Returns all values in the ranges [start, end) and the index of the range each value belongs to.
+		"""
+		lengths = np.maximum(ends - starts, 0)
+		total_length = int(lengths.sum())
+
+		range_indexes = np.repeat(np.arange(len(starts)), lengths)
+		range_output_starts = np.cumsum(lengths) - lengths
+		values = np.arange(total_length) - np.repeat(range_output_starts - starts, lengths)
+
+		return values, range_indexes
+
+	def section_ranges(self, article_ids: np.ndarray, section_indexes: np.ndarray) -> (np.ndarray, np.ndarray):
+		"""
+		Returns position ranges of the given sections and their subsections. Section index -1 stands for the whole
+		article. Unknown sections result in empty ranges.
+		"""
+		if len(self.keys) == 0:
+			return np.zeros(len(article_ids), dtype=np.int64), np.zeros(len(article_ids), dtype=np.int64)
+
+		starts = self._find(self.keys, self._keys(article_ids, section_indexes))
+		ends = np.where(starts >= 0, self.subtree_ends[np.maximum(starts, 0)], -1)
+
+		article_positions = self._find(self.unique_article_ids, article_ids)
+		is_article = (section_indexes < 0) & (article_positions >= 0)
+		starts = np.where(is_article, self.article_starts[np.maximum(article_positions, 0)], starts)
+		ends = np.where(is_article, self.article_ends[np.maximum(article_positions, 0)], ends)
+
+		return starts, ends
+
+	def paragraphs(self, article_ids: np.ndarray, section_indexes: np.ndarray) -> (np.ndarray, np.ndarray, np.ndarray):
+		"""
+		Returns all paragraphs in the given sections and their subsections.
+
+		:param article_ids: Array of shape [n]
+		:param section_indexes: Array of shape [n]. -1 stands for the whole article.
+		:return: Tuple of arrays (index of input section, section index, paragraph index), one item per paragraph.
+		"""
+		starts, ends = self.section_ranges(article_ids, section_indexes)
+
+		# Sections to paragraph ranges
+		positions, input_indexes = self._expand_ranges(starts, ends)
+
+		# Paragraph ranges to paragraphs
+		paragraph_rows, position_indexes = self._expand_ranges(
+			self.paragraph_offsets[positions],
+			self.paragraph_offsets[positions + 1]
+		)
+		paragraph_positions = positions[position_indexes]
+		paragraph_indexes = paragraph_rows - self.paragraph_offsets[paragraph_positions]
+
+		return input_indexes[position_indexes], self.section_indexes[paragraph_positions], paragraph_indexes
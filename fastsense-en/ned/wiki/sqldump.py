@@ -0,0 +1,199 @@
+import gzip
+import multiprocessing as mp
+import re
+import traceback
+from typing import Any, Callable, Iterator, List
+
+from .workers import WorkerError, receive, join_processes
+
+# Escape sequences in MySQL string literals. \% and \_ keep their backslash.
+MYSQL_ESCAPES = {
+	"0": "\0",
+	"b": "\b",
+	"n": "\n",
+	"r": "\r",
+	"t": "\t",
+	"Z": "\x1a",
+	"\\": "\\",
+	"'": "'",
+	"\"": "\"",
+	"%": "\\%",
+	"_": "\\_"
+}
+
+STRING_SPECIAL_CHARS_PATTERN = re.compile(r"['\\]")
+UNQUOTED_VALUE_END_PATTERN = re.compile(r"[,)]")
+INTEGER_PATTERN = re.compile(r"^-?[0-9]+$")
+
+
+def _convert_unquoted_value(value: str):
+	value = value.strip()
+
+	if value == "NULL":
+		return None
+	elif INTEGER_PATTERN.match(value) is not None:
+		return int(value)
+
+	try:
+		return float(value)
+	except ValueError:
+		return value
+
+
+def parse_values(values: str) -> List[tuple]:
+	"""
+	Parses the values of a MySQL INSERT statement, e.g. "(1,0,'Title',NULL),(2,0,'Other',1.5);".
+
+	This is a small hand-written state machine. Strings are scanned with str.find-like searches for the next quote or
+	backslash, so there is no backtracking, no matter how many escaped quotes a value contains.
+
+	:param values: Everything after "INSERT INTO `table` VALUES "
+	:return: List of rows. Strings are unescaped, integers and floats are converted, and NULL becomes None.
+	"""
+
+	rows = []
+	row = None
+
+	i = 0
+	length = len(values)
+
+	while i < length:
+		char = values[i]
+
+		if char == "(":
+			row = []
+			i += 1
+		elif char == "'":
+			i += 1
+
+			# Fast path for strings without escape sequences
+			quote_index = values.find("'", i)
+			if quote_index >= 0 and values.find("\\", i, quote_index) < 0 and values[quote_index + 1:quote_index + 2] != "'":
+				row.append(values[i:quote_index])
+				i = quote_index + 1
+				continue
+
+			parts = []
+
+			while True:
+				special_char_match = STRING_SPECIAL_CHARS_PATTERN.search(values, i)
+				if special_char_match is None:
+					raise ValueError("Unterminated string at position {:d}".format(i))
+
+				j = special_char_match.start()
+				parts.append(values[i:j])
+
+				if values[j] == "\\":
+					escaped_char = values[j + 1:j + 2]
+					parts.append(MYSQL_ESCAPES.get(escaped_char, escaped_char))
+					i = j + 2
+				elif values[j + 1:j + 2] == "'":  # Quote escaped by doubling
+					parts.append("'")
+					i = j + 2
+				else:
+					i = j + 1
+					break
+
+			row.append("".join(parts))
+		elif char == ")":
+			rows.append(tuple(row))
+			row = None
+			i += 1
+		elif char == "," or char.isspace():
+			i += 1
+		elif char == ";":
+			break
+		else:
+			value_end_match = UNQUOTED_VALUE_END_PATTERN.search(values, i)
+			j = value_end_match.start() if value_end_match is not None else length
+
+			row.append(_convert_unquoted_value(values[i:j]))
+			i = j
+
+	return rows
+
+
+def read_insert_values(path: str, table_name: str) -> Iterator[str]:
+	"""
+	Streams the values of all INSERT statements for a table from a gzip-compressed MySQL dump.
+
+	:param path: Path to gzip-compressed SQL dump, e.g. enwiki-*-categorylinks.sql.gz
+	:param table_name: Name of the table
+	:return: Iterator over the values part of each INSERT statement. Use `parse_values` to get the rows.
+	"""
+
+	line_prefix = "INSERT INTO `" + table_name + "` VALUES "
+
+	with gzip.open(path, "rt", encoding="utf8", errors="replace") as f:
+		for line in f:
+			if line.startswith(line_prefix):
+				yield line[len(line_prefix):]
+
+
+def _read_values_task(path: str, table_name: str, values_queue: mp.Queue, number_of_workers: int):
+	for values in read_insert_values(path, table_name):
+		values_queue.put(values)
+
+	for _ in range(number_of_workers):
+		values_queue.put(None)  # End of data marker
+
+
+def _map_values_task(values_queue: mp.Queue, result_queue: mp.Queue, map_function: Callable, map_args: tuple):
+	try:
+		while True:
+			values = values_queue.get()
+			if values is None:
+				break
+
+			result_queue.put(map_function(parse_values(values), *map_args))
+	except Exception:
+		result_queue.put(WorkerError(traceback.format_exc()))
+	finally:
+		result_queue.put(None)  # End of data marker
+
+
+def map_insert_values(path: str, table_name: str, map_function: Callable[..., Any], map_args: tuple = (), number_of_workers: int = 4) -> Iterator[Any]:
+	"""
+	Parses the INSERT statements of a table in parallel. One process decompresses the dump and distributes the
+	statements to worker processes, which parse them and apply `map_function` (e.g. to filter rows).
+
+	Worker processes are forked, so large read-only objects in `map_args` (e.g. sets of ids) are shared copy-on-write
+	instead of being pickled.
+
+	:param path: Path to gzip-compressed SQL dump
+	:param table_name: Name of the table
+	:param map_function: Called as map_function(rows, *map_args) for the rows of each INSERT statement
+	:param map_args: Additional arguments for map_function
+	:param number_of_workers: Number of parsing processes
+	:return: Iterator over the results of map_function in arbitrary order
+	:raises WorkerError: If reading the dump or map_function failed in a worker process
+	"""
+
+	values_queue = mp.Queue(number_of_workers * 4)
+	result_queue = mp.Queue(number_of_workers * 4)
+
+	reader_process = mp.Process(target=_read_values_task, args=(path, table_name, values_queue, number_of_workers))
+	reader_process.start()
+
+	worker_processes = []
+	for _ in range(number_of_workers):
+		worker_process = mp.Process(target=_map_values_task, args=(values_queue, result_queue, map_function, map_args))
+		worker_process.start()
+		worker_processes.append(worker_process)
+
+	processes = [reader_process] + worker_processes
+
+	try:
+		running_workers = number_of_workers
+		while running_workers > 0:
+			result = receive(result_queue, processes)
+			if result is None:
+				running_workers -= 1
+				continue
+
+			yield result
+	except BaseException:
+		join_processes(processes, terminate=True)
+		raise
+
+	join_processes(processes)
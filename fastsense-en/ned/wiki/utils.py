@@ -2,59 +2,121 @@
 
 import urllib.parse
 import re
+from functools import lru_cache
+from typing import Iterable, List, Optional
 import mwparserfromhell as mwp
 
+# Cache sizes cover the frequent head of Wikipedia's title distribution. A few hundred MB at most when full.
+PAGE_TITLE_CACHE_SIZE = 1 << 20
+SECTION_TITLE_CACHE_SIZE = 1 << 18
+GROUP_TITLE_CACHE_SIZE = 1 << 20
 
-def normalize_page_title(title):
-	if title is None:
-		return None
-	
+GROUP_TITLE_PATTERN = re.compile(r"^(.*) \(.*?\)$")
+NO_ARTICLE_GROUP_TITLE_PATTERN = re.compile(r"^((a)|(an)|(the)) (.*)$")
+
+
+def _strip_code(title):
 	if isinstance(title, mwp.wikicode.Wikicode):
-		title = title.strip_code()
-	
+		return title.strip_code()
+
+	return title
+
+
+@lru_cache(maxsize=PAGE_TITLE_CACHE_SIZE)
+def _normalize_page_title(title: str) -> str:
 	title = title.strip()
-	
+
 	if len(title) > 0:
 		title = title.replace(" ", "_")
-		
+
 		if title[0] != "ß":
 			title = title[0].upper() + title[1:]
-	
+
 	return title
 
 
-def normalize_section_title(title):
-	if title is None:
-		return None
-	
-	if isinstance(title, mwp.wikicode.Wikicode):
-		title = title.strip_code()
-	
+@lru_cache(maxsize=SECTION_TITLE_CACHE_SIZE)
+def _normalize_section_title(title: str) -> str:
 	title = title.replace(" ", "_")
 	title = urllib.parse.quote(title, safe=":")
 	title = title.replace("%", ".")
 	return title
 
 
-def group_title(title):
-	if title is None:
-		return None
-	elif len(title) == 0:
+@lru_cache(maxsize=GROUP_TITLE_CACHE_SIZE)
+def _group_title(title: str) -> str:
+	if len(title) == 0:
 		return ""
-	
+
 	title = title.replace("_", " ")
 	title = title.lower()
-	
-	group_title_match = re.match(r"^(.*) \(.*?\)$", title)
+
+	group_title_match = GROUP_TITLE_PATTERN.match(title)
 	if group_title_match is not None:
 		group_title = group_title_match.group(1)
 	else:
 		group_title = title
-	
-	no_article_group_title_match = re.match(r"^((a)|(an)|(the)) (.*)$", group_title)
+
+	no_article_group_title_match = NO_ARTICLE_GROUP_TITLE_PATTERN.match(group_title)
 	if no_article_group_title_match is not None:
 		no_article_group_title = no_article_group_title_match.group(5)
 	else:
 		no_article_group_title = group_title
-	
+
 	return no_article_group_title
+
+
+def normalize_page_title(title):
+	if title is None:
+		return None
+
+	return _normalize_page_title(_strip_code(title))
+
+
+def normalize_section_title(title):
+	if title is None:
+		return None
+
+	return _normalize_section_title(_strip_code(title))
+
+
+def group_title(title):
+	if title is None:
+		return None
+
+	return _group_title(title)
+
+
+def normalize_page_titles(titles: Iterable) -> List[Optional[str]]:
+	"""
+	Normalizes a batch of page titles. Each distinct title is normalized once.
+	"""
+	return _map_distinct(normalize_page_title, titles)
+
+
+def group_titles(titles: Iterable[Optional[str]]) -> List[Optional[str]]:
+	"""
+	Returns group titles for a batch of titles. Each distinct title is processed once.
+	"""
+	return _map_distinct(group_title, titles)
+
+
+def _map_distinct(function, titles: Iterable) -> list:
+	titles = list(titles)
+
+	results = dict.fromkeys(titles)
+	for title in results:
+		results[title] = function(title)
+
+	return [results[title] for title in titles]
+
+
+def cache_info() -> dict:
+	"""
+	Returns hit/miss statistics of the title caches.
+	"""
+	return {
+		"page_title": _normalize_page_title.cache_info(),
+		"section_title": _normalize_section_title.cache_info(),
+		"group_title": _group_title.cache_info()
+	}
@@ -0,0 +1,55 @@
+import multiprocessing as mp
+import queue
+from typing import Any, List
+
+
+class WorkerError(Exception):
+	"""
+	Raised in the main process when a worker process failed. The message contains the traceback of the worker.
+	"""
+
+
+def receive(message_queue: mp.Queue, processes: List[mp.Process], timeout: float = 10.0) -> Any:
+	"""
+	Gets the next message sent by worker processes.
+
+	Workers forward exceptions by sending a `WorkerError`, which is raised here. Processes that exit with an error
+	without sending one (e.g. killed by the OOM killer) are detected by checking exit codes every `timeout` seconds.
+
+	:param message_queue: Queue the workers send to
+	:param processes: Processes that must not fail while waiting, including processes feeding the workers
+	:param timeout: Interval in seconds for checking exit codes
+	"""
+	while True:
+		try:
+			message = message_queue.get(timeout=timeout)
+		except queue.Empty:
+			for p in processes:
+				if p.exitcode not in (None, 0):
+					raise WorkerError("Process {} exited with code {:d}".format(p.name, p.exitcode))
+
+			continue
+
+		if isinstance(message, WorkerError):
+			raise message
+
+		return message
+
+
+def join_processes(processes: List[mp.Process], terminate: bool = False):
+	"""
+	Waits for processes to exit and raises `WorkerError` if one of them failed.
+
+	:param processes: Processes to join
+	:param terminate: Terminates processes that are still running instead, e.g. after another process failed
+	"""
+	for p in processes:
+		if terminate and p.is_alive():
+			p.terminate()
+
+		p.join()
+
+	if not terminate:
+		for p in processes:
+			if p.exitcode != 0:
+				raise WorkerError("Process {} exited with code {:d}".format(p.name, p.exitcode))
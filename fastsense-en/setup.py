@@ -18,7 +18,9 @@ setup(
 			'ned = ned.cli_interactive:main',
 			'ned-wiki-prepare = ned.cli_wiki:prepare',
 			'ned-wiki-export = ned.cli_wiki:export',
-			'ned-train = ned.cli_train:train'
+			'ned-train = ned.cli_train:train',
+			'ned-bench-titles = ned.cli_bench:titles',
+			'ned-bench-input = ned.cli_bench:input_pipeline'
 		]
 	}
 )
@@ -0,0 +1,87 @@
+import os
+import tempfile
+import unittest
+import tensorflow as tf
+from ned.data import DataDescriptor, NormalizedExampleWriter, NormalizedExampleReader, DatasetMetadata
+from ned.token import Token
+
+
+class NormalizedExampleReaderTest(unittest.TestCase):
+	"""
+	Writes examples with `NormalizedExampleWriter` and parses the examples of `NormalizedExampleReader` with
+	`tf.train.Example`.
+	"""
+
+	def setUp(self):
+		self.temp_dir = tempfile.TemporaryDirectory()
+		self.path = os.path.join(self.temp_dir.name, "train")
+
+		data_descriptor = DataDescriptor(
+			n_gram_size=1,
+			caseless=False,
+			ignore_punctuation=True,
+			add_pos_tags=False,
+			uses_lemma=False,
+			uses_sentences=False
+		)
+
+		# (tokens, possible senses, sense), large values need multi-byte varints
+		self.expected_examples = []
+
+		with NormalizedExampleWriter(self.path, "train", data_descriptor, number_of_workers=2) as writer:
+			for segment_index in range(50):
+				segment_key = (segment_index * 1000, segment_index % 3, 0, -1)
+
+				if segment_index % 10 == 0:
+					tokens = [Token(0, 1, ".")]  # empty after removing punctuation
+				else:
+					tokens = [Token(i, i + 1, "w{:d}ä".format(segment_index * i)) for i in range(segment_index % 7 + 1)]
+
+				for example_index in range(3):
+					group_id = (segment_index + example_index) % 5 * 100000
+					possible_senses = [group_id, group_id + 1, 2 ** 40 + group_id]
+					sense = possible_senses[example_index]
+
+					writer.write(tokens if example_index == 0 else None, possible_senses, sense, segment_key, group_id)
+
+					if segment_index % 10 != 0:
+						token_values = tuple(t.value.encode("utf8") for t in tokens)
+						self.expected_examples.append((token_values, tuple(possible_senses), sense))
+
+		self.db_path = NormalizedExampleWriter.database_path(self.path, "train")
+
+	def tearDown(self):
+		self.temp_dir.cleanup()
+
+	@staticmethod
+	def _parse(serialized_example: bytes) -> tuple:
+		feature = tf.train.Example.FromString(serialized_example).features.feature
+
+		return (
+			tuple(feature["tokens"].bytes_list.value),
+			tuple(feature["possible_senses"].int64_list.value),
+			feature["sense"].int64_list.value[0]
+		)
+
+	def test_serialized_examples(self):
+		reader = NormalizedExampleReader(self.db_path, chunk_size=7)
+		examples = list(map(self._parse, reader.serialized_examples()))
+
+		self.assertEqual(sorted(examples), sorted(self.expected_examples))
+
+	def test_serialized_batches(self):
+		reader = NormalizedExampleReader(self.db_path, chunk_size=7)
+		batches = list(reader.serialized_batches(batch_size=16, epochs=2, shuffle=True, seed=0))
+
+		self.assertTrue(all(len(batch) == 16 for batch in batches[:-1]))
+		examples = [self._parse(e) for batch in batches for e in batch]
+		self.assertEqual(sorted(examples), sorted(self.expected_examples * 2))
+
+	def test_metadata(self):
+		metadata = DatasetMetadata.load(DatasetMetadata.file_path(self.path, "train"))
+
+		self.assertEqual(metadata.example_count, len(self.expected_examples))
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,134 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import tensorflow as tf
+from ned.native import NativeExamples, NativeTrainer
+
+
+class NativeTrainerTest(unittest.TestCase):
+	"""
+	Compares the gradients of `NativeTrainer._step` with finite differences of its loss.
+	"""
+
+	PARAMS = {
+		"hash_bucket_size": 20,
+		"embedding_size": 4,
+		"use_sqrtn_combiner": False,
+		"clip_gradients": False,
+		"learning_rate": 1.0,
+		"decay_rate": 1.0,
+		"decay_steps": 100000
+	}
+
+	def setUp(self):
+		self.temp_dir = tempfile.TemporaryDirectory()
+		self.model_dir = os.path.join(self.temp_dir.name, "model")
+
+		self.examples = NativeExamples(
+			token_offsets=np.array([0, 3, 5, 9]),
+			token_ids=np.array([1, 2, 1, 3, 4, 5, 5, 6, 7]),
+			possible_sense_offsets=np.array([0, 2, 5, 7]),
+			possible_senses=np.array([0, 1, 1, 2, 3, 4, 5]),
+			senses=np.array([1, 3, 5])
+		)
+
+	def tearDown(self):
+		self.temp_dir.cleanup()
+
+	def _create_trainer(self, **params) -> NativeTrainer:
+		trainer_params = dict(self.PARAMS)
+		trainer_params.update(params)
+		trainer = NativeTrainer(self.model_dir, number_of_senses=6, params=trainer_params, seed=0)
+
+		# Non-zero biases, so their gradients matter
+		trainer.out_biases = np.random.RandomState(1).randn(6).astype(np.float32)
+
+		return trainer
+
+	def _loss(self, embeddings: np.ndarray, out_weights_transposed: np.ndarray, out_biases: np.ndarray) -> float:
+		trainer = self._create_trainer(learning_rate=0.0)
+		trainer.embeddings = embeddings.copy()
+		trainer.out_weights_transposed = out_weights_transposed.copy()
+		trainer.out_biases = out_biases.copy()
+		return trainer._step(self.examples.batch(np.arange(len(self.examples))))
+
+	def _numeric_gradient(self, variables: list, index: int, row: int, epsilon: float = 1e-2) -> np.ndarray:
+		gradient = np.zeros(variables[index].shape[1:], dtype=np.float64)
+
+		for column in np.ndindex(*gradient.shape):
+			plus = [v.copy() for v in variables]
+			plus[index][(row,) + column] += epsilon
+			minus = [v.copy() for v in variables]
+			minus[index][(row,) + column] -= epsilon
+			gradient[column] = (self._loss(*plus) - self._loss(*minus)) / (2.0 * epsilon)
+
+		return gradient
+
+	def test_gradients(self):
+		trainer = self._create_trainer()
+		variables = [trainer.embeddings.copy(), trainer.out_weights_transposed.copy(), trainer.out_biases.copy()]
+
+		trainer._step(self.examples.batch(np.arange(len(self.examples))))
+
+		# With learning rate 1 and without clipping, the update is the negative gradient
+		gradients = [
+			variables[0] - trainer.embeddings,
+			variables[1] - trainer.out_weights_transposed,
+			variables[2] - trainer.out_biases
+		]
+
+		for index, rows in [(0, range(20)), (1, range(6)), (2, range(6))]:
+			for row in rows:
+				np.testing.assert_allclose(
+					gradients[index][row],
+					self._numeric_gradient(variables, index, row),
+					rtol=1e-2,
+					atol=1e-3
+				)
+
+	def test_clipped_rows(self):
+		trainer = self._create_trainer(clip_gradients=True, learning_rate=100.0)
+		embeddings = trainer.embeddings.copy()
+
+		trainer._step(self.examples.batch(np.arange(len(self.examples))))
+
+		row_norms = np.linalg.norm(embeddings - trainer.embeddings, axis=1)
+		self.assertTrue(np.all(row_norms <= 100.0 + 1e-3))
+		self.assertTrue(np.all(row_norms[[0] + list(range(8, 20))] == 0.0))
+
+	def test_load_skips_empty_examples(self):
+		def serialize(tokens: list, possible_senses: list, sense: int) -> bytes:
+			example = tf.train.Example()
+			feature = example.features.feature
+			feature["tokens"].bytes_list.value.extend(tokens)
+			feature["possible_senses"].int64_list.value.extend(possible_senses)
+			feature["sense"].int64_list.value.append(sense)
+			return example.SerializeToString()
+
+		examples = NativeExamples.load(
+			[
+				serialize([b"a", b"b"], [0, 1], 1),
+				serialize([], [2, 3], 2),
+				serialize([b"c"], [], 4),
+				serialize([b"d"], [4, 5], 5)
+			],
+			hash_bucket_size=20
+		)
+
+		self.assertEqual(len(examples), 2)
+		np.testing.assert_array_equal(examples.senses, [1, 5])
+		np.testing.assert_array_equal(examples.token_offsets, [0, 2, 3])
+		np.testing.assert_array_equal(examples.possible_senses, [0, 1, 4, 5])
+
+		loss = self._create_trainer()._step(examples.batch(np.arange(len(examples))))
+		self.assertTrue(np.isfinite(loss))
+
+	def test_unsupported_params(self):
+		for params in [{"hidden_layer_sizes": [10]}, {"optimizer": "adagrad"}, {"dropout_keep_prob": 0.5}]:
+			with self.assertRaises(ValueError):
+				self._create_trainer(**params)
+
+
+if __name__ == "__main__":
+	unittest.main()
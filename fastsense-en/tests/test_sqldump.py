@@ -0,0 +1,57 @@
+import random
+import unittest
+from ned.wiki.sqldump import parse_values
+
+
+class ParseValuesTest(unittest.TestCase):
+	"""
+	Parses values escaped like mysqldump does and compares them with the original rows.
+	"""
+
+	MYSQLDUMP_ESCAPES = {
+		"\0": "\\0",
+		"\n": "\\n",
+		"\r": "\\r",
+		"\x1a": "\\Z",
+		"\\": "\\\\",
+		"'": "\\'",
+		"\"": "\\\""
+	}
+
+	@staticmethod
+	def _format_value(value) -> str:
+		if value is None:
+			return "NULL"
+		elif isinstance(value, str):
+			return "'" + "".join(ParseValuesTest.MYSQLDUMP_ESCAPES.get(c, c) for c in value) + "'"
+		else:
+			return repr(value)
+
+	@staticmethod
+	def _format_rows(rows: list) -> str:
+		return ",".join("(" + ",".join(map(ParseValuesTest._format_value, row)) + ")" for row in rows) + ";"
+
+	def test_round_trip(self):
+		random_state = random.Random(0)
+		characters = "ab '\"\\\n\r\t\0\x1a%_,();äß日"
+
+		rows = []
+		for i in range(1000):
+			text = "".join(random_state.choice(characters) for _ in range(random_state.randrange(0, 20)))
+			rows.append((i, -i, text, None, i / 8.0, ""))
+
+		self.assertEqual(parse_values(self._format_rows(rows)), rows)
+
+	def test_escape_sequences(self):
+		self.assertEqual(parse_values("('a\\tb\\bc\\%d\\_e\\x');"), [("a\tb\bc\\%d\\_ex",)])
+
+	def test_doubled_quotes(self):
+		self.assertEqual(parse_values("('it''s',''''),('',NULL);"), [("it's", "'"), ("", None)])
+
+	def test_unterminated_string(self):
+		with self.assertRaises(ValueError):
+			parse_values("(1,'abc")
+
+
+if __name__ == "__main__":
+	unittest.main()